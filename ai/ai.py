@@ -42,6 +42,8 @@ import tyro
 from tensordict import TensorDict, TensorDictBase
 # from torch.utils.tensorboard import SummaryWriter
 from env import ActionType, PARAM1_LENGTH, PARAM2_LENGTH
+from encode import LAYOUT, SCHEMA_HASH, SIZE_ENCODED, check_schema_hash
+from encode import FEATURES_PER_ENTITY, NUM_GLOBAL_FEATURES, NUM_GLOBAL_TOKENS, NUM_TOKENS, TOKEN_ENTITIES, TOKEN_ENTITY_OFFSETS, TOKEN_FIELDS
 
 
 @dataclass
@@ -96,6 +98,12 @@ class Args:
     """the maximum norm for the gradient clipping"""
     target_kl: float | None = None
     """the target KL divergence threshold"""
+    save_path: str | None = None
+    """where to save the agent after training"""
+    load_path: str | None = None
+    """checkpoint to start training from, it has to match the current observation layout"""
+    token_observations: bool = False
+    """if toggled, the runs are observed as tokens (see encode_tokens) instead of the dense encoding"""
 
     # to be filled in runtime
     batch_size: int = 0
@@ -118,12 +126,47 @@ def network_head(in_size: int, out_size: int, std):
         layer_init(nn.Linear(in_size//2, out_size), std=std)
     )
 
+# fields with one row per card, joker or item, every row is embedded by weights shared
+# across the rows of its field, the remaining deck is summed since its order means nothing
+ROW_FIELDS = ("hand_cards", "jokers", "consumables", "shop_cards", "pack_items")
+POOLED_FIELDS = ("deck_cards_left",)
+ROW_EMBEDDING_SIZE = 32
+# token observations embed every token id, an entity row is the sum of its token
+# embeddings together with its features, the remaining deck is summed like above
+TOKEN_EMBEDDING_SIZE = 16
+POOLED_ENTITIES = ("deck_cards_left",)
+
 class Agent(nn.Module):
-    def __init__(self, envs):
+    def __init__(self, token_observations: bool = False):
         HIDDEN_SIZE = 1024
         super().__init__()
+        self.token_observations = token_observations
+        if token_observations:
+            self.token_embedding = nn.Embedding(NUM_TOKENS, TOKEN_EMBEDDING_SIZE, padding_idx=0)
+            self.entity_encoder = nn.Sequential(
+                layer_init(nn.Linear(TOKEN_EMBEDDING_SIZE + FEATURES_PER_ENTITY, ROW_EMBEDDING_SIZE)), nn.SiLU()
+            )
+            input_size = (
+                sum(TOKEN_ENTITIES[name] for name in TOKEN_ENTITIES if name not in POOLED_ENTITIES) * ROW_EMBEDDING_SIZE
+                + len(POOLED_ENTITIES) * ROW_EMBEDDING_SIZE
+                # the tags and the vouchers are each summed
+                + 2 * TOKEN_EMBEDDING_SIZE
+                + NUM_GLOBAL_TOKENS * TOKEN_EMBEDDING_SIZE
+                + NUM_GLOBAL_FEATURES
+            )
+        else:
+            self.row_encoders = nn.ModuleDict({
+                name: nn.Sequential(layer_init(nn.Linear(LAYOUT[name].shape[-1], ROW_EMBEDDING_SIZE)), nn.SiLU())
+                for name in ROW_FIELDS + POOLED_FIELDS
+            })
+            self.flat_fields = [name for name in LAYOUT if name not in ROW_FIELDS + POOLED_FIELDS]
+            input_size = (
+                sum(LAYOUT[name].size for name in self.flat_fields)
+                + sum(LAYOUT[name].shape[0] * ROW_EMBEDDING_SIZE for name in ROW_FIELDS)
+                + len(POOLED_FIELDS) * ROW_EMBEDDING_SIZE
+            )
         self.shared = nn.Sequential(
-            layer_init(nn.Linear(int(envs.observation_spec["observation"].shape[-1]), HIDDEN_SIZE)),
+            layer_init(nn.Linear(input_size, HIDDEN_SIZE)),
             #nn.LayerNorm(HIDDEN_SIZE),
             nn.SiLU(),
             layer_init(nn.Linear(HIDDEN_SIZE, HIDDEN_SIZE)),
@@ -146,14 +189,54 @@ class Agent(nn.Module):
         # param2 additionally takes the chosen param1 as input
         self.param2_head = network_head(HIDDEN_SIZE + len(ActionType) + PARAM1_LENGTH, PARAM2_LENGTH, std=0.01)
 
+    def encode_observation(self, x):
+        """
+        slices the per-card and per-joker fields out of the flat observation
+        as zero-copy views and embeds them row by row
+        """
+        if self.token_observations:
+            return self.encode_tokens(x)
+        parts = [LAYOUT[name].view(x).flatten(start_dim=-len(LAYOUT[name].shape)) for name in self.flat_fields]
+        for name in ROW_FIELDS:
+            parts.append(self.row_encoders[name](LAYOUT[name].view(x)).flatten(start_dim=-2))
+        for name in POOLED_FIELDS:
+            rows = LAYOUT[name].view(x)
+            # empty slots are all zeros and left out of the sum
+            present = rows.abs().sum(dim=-1, keepdim=True) > 0
+            parts.append((self.row_encoders[name](rows) * present).sum(dim=-2))
+        return torch.cat(parts, dim=-1)
+
+    def encode_tokens(self, x):
+        """
+        embeds a token observation: every entity row from its tokens and features,
+        the tags and vouchers as bags of tokens and the global tokens slot by slot
+        """
+        entity_tokens = x["entity_tokens"].long()
+        # chips, sell values and costs are compressed like the scores
+        features = x["entity_features"].float()
+        features = features.sign() * torch.log1p(features.abs())
+        rows = self.entity_encoder(torch.cat([self.token_embedding(entity_tokens).sum(dim=-2), features], dim=-1))
+        # empty rows have no tokens and are zeroed
+        rows = rows * (entity_tokens != 0).any(dim=-1, keepdim=True)
+        parts = []
+        for name, num_entities in TOKEN_ENTITIES.items():
+            section = rows[..., TOKEN_ENTITY_OFFSETS[name]:TOKEN_ENTITY_OFFSETS[name] + num_entities, :]
+            parts.append(section.sum(dim=-2) if name in POOLED_ENTITIES else section.flatten(start_dim=-2))
+        # the padding token embeds to zeros, so only the present tags and vouchers are summed
+        parts.append(self.token_embedding(x["tag_tokens"].long()).sum(dim=-2))
+        parts.append(self.token_embedding(x["voucher_tokens"].long()).sum(dim=-2))
+        parts.append(self.token_embedding(x["global_tokens"].long()).flatten(start_dim=-2))
+        parts.append(x["global_features"])
+        return torch.cat(parts, dim=-1)
+
     def get_value(self, x):
-        hidden = self.shared(x)
+        hidden = self.shared(self.encode_observation(x))
         return self.value_head(hidden)
 
     def get_action_and_value(self, observation, snapshot_list, action: TensorDict | None = None):
         NEG_INF = -1e9
 
-        shared = self.shared(observation)
+        shared = self.shared(self.encode_observation(observation))
 
         # get and sample action type distribution, based on shared
         action_type_logits = self.action_type_head(shared)
@@ -182,8 +265,8 @@ class Agent(nn.Module):
         param1_distribution = Bernoulli(logits=masked_param1_logits)
         param1 = constrained_bernoulli(masked_param1_logits, param1_min_samples, param1_max_samples) if action is None else action["param1"]
 
-        #param2
-        legal_param2_mask, param2_min_samples, param2_max_samples = get_legal_param2(snapshot_list)
+        #param2, its legal values depend on the chosen param1
+        legal_param2_mask, param2_min_samples, param2_max_samples = get_legal_param2(snapshot_list, param1)
 
         # get and sample param2 distribution, based on shared + action type
         param2_logits = self.param2_head(torch.cat([action_shared, param1], dim=1))
@@ -209,7 +292,7 @@ class Agent(nn.Module):
             "action_type": action_type,
             "param1": param1,
             "param2": param2,
-        }, batch_size=[observation.shape[0]])
+        }, batch_size=[shared.shape[0]])
 
         return sampled_action, total_logprob, total_entropy, self.value_head(shared)
 
@@ -253,6 +336,27 @@ def constrained_bernoulli(logits: torch.Tensor, min_ones: torch.Tensor, max_ones
 
     return sample
 
+def save_checkpoint(path: str, agent: Agent, optimizer: optim.Optimizer):
+    """
+    saves the agent and optimizer together with the hash of the observation layout
+    """
+    torch.save({
+        "schema_hash": SCHEMA_HASH,
+        "agent": agent.state_dict(),
+        "optimizer": optimizer.state_dict(),
+    }, path)
+
+def load_checkpoint(path: str, agent: Agent, optimizer: optim.Optimizer | None = None):
+    """
+    loads a checkpoint written by save_checkpoint, failing
+    if it was trained on a different observation layout
+    """
+    checkpoint = torch.load(path, map_location="cpu")
+    check_schema_hash(checkpoint.get("schema_hash"))
+    agent.load_state_dict(checkpoint["agent"])
+    if optimizer is not None:
+        optimizer.load_state_dict(checkpoint["optimizer"])
+
 if __name__ == "__main__":
     args = tyro.cli(Args)
     args.batch_size = int(args.num_envs * args.num_steps)
@@ -288,31 +392,43 @@ if __name__ == "__main__":
     device = torch.device("cuda" if torch.cuda.is_available() and args.cuda else "cpu")
 
     def make_env(i):
-        return lambda seed=None if args.seed is None else args.seed + i, device=device: BalatroEnv(i, seed=seed, device=device)
+        return lambda seed=None if args.seed is None else args.seed + i, device=device: BalatroEnv(i, seed=seed, device=device, token_observations=args.token_observations)
     # env setup
     env_fns = [ make_env(i) for i in range(args.num_envs) ]
     envs = ParallelEnv(args.num_envs, env_fns)
     next = envs.reset(seed=args.seed) # reset early to initialize envs
 
-    agent = Agent(envs).to(device)
+    agent = Agent(args.token_observations).to(device)
     optimizer = optim.Adam(agent.parameters(), lr=args.learning_rate, eps=1e-5)
+    if args.load_path is not None:
+        load_checkpoint(args.load_path, agent, optimizer)
 
     # ALGO Logic: Storage setup
-    obs = torch.zeros(args.num_steps, args.num_envs, envs.observation_spec["observation"].shape[-1]).to(device)
+    if args.token_observations:
+        obs = TensorDict({
+            name: torch.from_numpy(np.zeros((args.num_steps, args.num_envs, *shape), dtype=dtype))
+            for name, (shape, dtype) in TOKEN_FIELDS.items()
+        }, batch_size=[args.num_steps, args.num_envs]).to(device)
+    else:
+        obs = torch.zeros(args.num_steps, args.num_envs, SIZE_ENCODED).to(device)
     actions = {
         "action_type": torch.zeros(args.num_steps, args.num_envs, dtype=torch.long, device=device),
-        "param1": torch.zeros(args.num_steps, args.num_envs, *envs.action_spec["param1"].shape, dtype=torch.float32, device=device),
-        "param2": torch.zeros(args.num_steps, args.num_envs, *envs.action_spec["param2"].shape, dtype=torch.float32, device=device),
+        "param1": torch.zeros(args.num_steps, args.num_envs, envs.action_spec["param1"].shape[-1], dtype=torch.float32, device=device),
+        "param2": torch.zeros(args.num_steps, args.num_envs, envs.action_spec["param2"].shape[-1], dtype=torch.float32, device=device),
     }
     logprobs = torch.zeros((args.num_steps, args.num_envs)).to(device)
     rewards = torch.zeros((args.num_steps, args.num_envs)).to(device)
     dones = torch.zeros((args.num_steps, args.num_envs)).to(device)
     values = torch.zeros((args.num_steps, args.num_envs)).to(device)
 
+    def get_observation(td):
+        # token observations stay a TensorDict of their token and feature arrays
+        return td["observation"].to(device) if args.token_observations else torch.Tensor(td["observation"]).to(device)
+
     # TRY NOT TO MODIFY: start the game
     global_step = 0
     start_time = time.time()
-    next_obs = torch.Tensor(next["observation"]).to(device)
+    next_obs = get_observation(next)
     next_done = torch.zeros(args.num_envs).to(device)
 
     iteration = 0
@@ -337,17 +453,6 @@ if __name__ == "__main__":
             # ALGO LOGIC: action logic
             with torch.no_grad():
                 env_snapshots = envs.snapshot()
-
-                # convert lists to tensors
-                for snapshot in env_snapshots:
-                    for key in ("buyable_shop_packs_mask", "buyable_shop_vouchers_mask", "buyable_shop_cards_mask"):
-                        orig = snapshot[key]
-                        LEN = len(orig)
-                        new = torch.zeros(PARAM1_LENGTH, dtype=torch.bool, device=device)
-                        if LEN > 0:
-                            new[:LEN] = torch.tensor(orig, dtype=torch.bool, device=device)
-                        snapshot[key] = new
-
                 snapshots.append(env_snapshots)
 
                 action_td, logprob, _, value = agent.get_action_and_value(next_obs, env_snapshots)
@@ -362,7 +467,7 @@ if __name__ == "__main__":
             next = td["next"]
 
             rewards[step] = next["reward"].detach().clone().view(-1)
-            next_obs, next_done = torch.Tensor(next["observation"]).to(device), torch.Tensor(next_done).to(device)
+            next_obs, next_done = get_observation(next), torch.Tensor(next_done).to(device)
 
             done_mask = next["done"].view(-1).to(torch.bool)
             if done_mask.all():
@@ -393,7 +498,7 @@ if __name__ == "__main__":
             returns = advantages + values
 
         # flatten the batch
-        b_obs = obs.reshape(-1, envs.observation_spec["observation"].shape[-1])
+        b_obs = obs.reshape(-1) if args.token_observations else obs.reshape(-1, SIZE_ENCODED)
         b_logprobs = logprobs.reshape(-1)
         b_actions = {
             "action_type": actions["action_type"].reshape(-1),
@@ -417,7 +522,7 @@ if __name__ == "__main__":
                 mb_snaps = [b_snapshots[i] for i in mb_inds]
 
                 _, newlogprob, entropy, newvalue = agent.get_action_and_value(
-                    b_obs[mb_inds],
+                    b_obs[torch.from_numpy(mb_inds)],
                     mb_snaps,
                     action = TensorDict(
                         {
@@ -491,5 +596,7 @@ if __name__ == "__main__":
         print("update_time_sec:", time.time() - update_start_time, global_step)
         # writer.add_scalar("charts/SPS", int(global_step / (time.time() - start_time)), global_step)
 
+    if args.save_path is not None:
+        save_checkpoint(args.save_path, agent, optimizer)
     envs.close()
     # writer.close()
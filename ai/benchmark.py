@@ -0,0 +1,84 @@
+import argparse
+from itertools import combinations
+import sys
+import timeit
+
+from balatro import *
+
+
+def greedy_step(run):
+    # play the best hand and buy whatever is affordable, which reaches the later antes
+    match run.state:
+        case State.SELECTING_BLIND:
+            run.select_blind()
+        case State.PLAYING_BLIND:
+            run.play_hand(run.best_plays()[0][0])
+        case State.CASHING_OUT:
+            run.cash_out()
+        case State.IN_SHOP:
+            for i in range(len(run.shop_cards)):
+                if run.check_buy_shop_card(i) is None:
+                    run.buy_shop_card(i)
+                    return
+            run.next_round()
+        case State.OPENING_PACK:
+            run.skip_pack()
+
+
+def mid_game_runs(num_runs):
+    # runs in a blind past the second ante with a few Jokers
+    runs = []
+    seed = 0
+    while len(runs) < num_runs:
+        run = Run(Deck.RED, seed=str(seed))
+        seed += 1
+        while not run.is_game_over:
+            if (
+                run.state is State.PLAYING_BLIND
+                and run.ante >= 3
+                and len(run.jokers) >= 3
+            ):
+                runs.append(run)
+                break
+            greedy_step(run)
+    return runs
+
+
+def preview_all_plays(run):
+    for num_cards in range(1, 6):
+        for card_indices in combinations(range(len(run.hand)), num_cards):
+            if run.check_play_hand(list(card_indices)) is None:
+                run.preview_play_hand(list(card_indices))
+
+
+def time_per_call(runs, f, number):
+    return sum(timeit.timeit(lambda: f(run), number=number) for run in runs) / (
+        len(runs) * number
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time clone and preview on mid-game runs"
+    )
+    parser.add_argument(
+        "--min-clones-per-second",
+        type=int,
+        default=None,
+        help="Exit with an error below this clone throughput, searches and rollouts need about 20000",
+    )
+    args = parser.parse_args()
+
+    runs = mid_game_runs(8)
+
+    clone_time = time_per_call(runs, lambda run: run.clone(), 1000)
+    print(f"clone: {clone_time * 1e6:.1f} us, {1 / clone_time:,.0f} per second")
+
+    preview_time = time_per_call(runs, preview_all_plays, 5)
+    print(f"preview of every play: {preview_time * 1e3:.1f} ms")
+
+    if (
+        args.min_clones_per_second is not None
+        and 1 / clone_time < args.min_clones_per_second
+    ):
+        sys.exit(f"clone is below {args.min_clones_per_second:,} per second")
@@ -0,0 +1,121 @@
+import dataclasses
+import random
+import sys
+import os
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from balatro import *
+
+NUM_RUNS = 24
+MAX_STEPS = 200
+
+# how often a blind is played rather than taking a random action, and the number of
+# random selections the played hand is the highest scoring of
+PLAY_CHANCE = 0.7
+PLAY_SAMPLES = 8
+# blinds are made easy enough for random play to beat, per ante
+EASY_ROUND_GOAL = 100
+
+def card_indices(run: Run, legal_action: LegalAction, rng: random.Random) -> list[int] | None:
+    """
+    picks cards in hand that satisfy the constraints of a legal action,
+    none if it takes no cards
+    """
+    if legal_action.max_cards == 0:
+        return None
+    forced = legal_action.forced_card_index
+    others = [i for i in range(len(run.hand)) if i != forced]
+    num_cards = rng.randint(legal_action.min_cards, legal_action.max_cards)
+    if forced is None:
+        return rng.sample(others, num_cards)
+    return rng.sample(others, num_cards - 1) + [forced]
+
+def play_random_action(run: Run, rng: random.Random) -> None:
+    """
+    takes a random legal action, blinds are mostly played with a good hand and their
+    goal is lowered, so random play reaches the shops and later antes
+    """
+    legal_actions = list(run.legal_actions())
+    plays = [legal_action for legal_action in legal_actions if legal_action.action is Action.PLAY_HAND]
+    legal_action = plays[0] if plays and rng.random() < PLAY_CHANCE else rng.choice(legal_actions)
+    args = list(legal_action.args)
+    if legal_action.action is Action.PLAY_HAND:
+        selections = [card_indices(run, legal_action, rng) for _ in range(PLAY_SAMPLES)]
+        args.append(max(selections, key=lambda selection: run.preview_play_hand(selection).score))
+    elif legal_action.max_cards > 0:
+        args.append(card_indices(run, legal_action, rng))
+    getattr(run, legal_action.action.value)(*args)
+    if run.round_goal is not None:
+        run._round_goal = min(run._round_goal, EASY_ROUND_GOAL * run.ante)
+
+def play_random_actions(run: Run, rng: random.Random, num_steps: int) -> list[tuple]:
+    """
+    plays up to num_steps random actions and returns the summary of the run after each one
+    """
+    summaries = []
+    for _ in range(num_steps):
+        if run.is_game_over:
+            break
+        play_random_action(run, rng)
+        summaries.append(summarize(run))
+    return summaries
+
+def _summarize_card(card: Card) -> tuple:
+    return (card.rank, card.suit, card.enhancement, card.seal, card.edition, card.extra_chips, card.is_debuffed, card.is_face_down)
+
+def _summarize_item(item: BalatroJoker | Consumable | Card) -> tuple:
+    if isinstance(item, Card):
+        return _summarize_card(item)
+    if isinstance(item, Consumable):
+        return (item.card, item.is_negative)
+    fields = []
+    for field in dataclasses.fields(item):
+        value = getattr(item, field.name)
+        if isinstance(value, Card):
+            value = _summarize_card(value)
+        elif isinstance(value, (Run, BalatroJoker)):
+            continue
+        fields.append((field.name, value))
+    return (type(item), tuple(fields))
+
+def summarize(run: Run) -> tuple:
+    """
+    the observable state of a run, equal for runs that play out the same
+    """
+    return (
+        run.state, run.money, run.ante, run.round, repr(run.round_score), repr(run.round_goal),
+        run.hands, run.discards, run.hand_size, run.joker_slots, run.consumable_slots,
+        run.blind, run.boss_blind, run.reroll_cost, run.cash_out_total, run.forced_selected_card_index,
+        run.hand and [_summarize_card(card) for card in run.hand],
+        [_summarize_card(card) for card in run.deck_cards],
+        [_summarize_card(card) for card in run.deck_cards_left],
+        [_summarize_item(joker) for joker in run.jokers],
+        [_summarize_item(consumable) for consumable in run.consumables],
+        run.shop_cards and [(_summarize_item(item), cost) for item, cost in run.shop_cards],
+        run.shop_vouchers, run.shop_packs,
+        run.pack_items and [_summarize_item(item) for item in run.pack_items],
+        sorted((poker_hand.name, info) for poker_hand, info in run.poker_hand_info.items()),
+        run.tags, sorted(voucher.name for voucher in run.vouchers),
+    )
+
+@pytest.fixture
+def random_runs() -> list[tuple[Run, random.Random]]:
+    """
+    runs from several decks and stakes played to a random step, with the random
+    number generator that keeps playing them
+    """
+    runs = []
+    for seed in range(NUM_RUNS):
+        rng = random.Random(seed)
+        if seed % 4 == 3:
+            run = ChallengeRun(rng.choice(list(Challenge)), seed=str(seed))
+        else:
+            run = Run(rng.choice([deck for deck in Deck if deck is not Deck.CHALLENGE]), stake=rng.choice(list(Stake)), seed=str(seed))
+        # enough money to buy from the shops
+        run._money += 100
+        for _ in range(rng.randrange(MAX_STEPS)):
+            if run.is_game_over:
+                break
+            play_random_action(run, rng)
+        runs.append((run, rng))
+    return runs
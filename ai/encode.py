@@ -1,9 +1,12 @@
 from typing import Dict, Any
-import torch
+from dataclasses import dataclass
+from math import log10, prod
+import hashlib
+import numpy as np
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from balatro import Tag, PokerHand, Blind, Rank, Suit, Enhancement, Seal, Edition, Tarot, Planet, Spectral, Card, BalatroJoker, Consumable, Run, Stake, State, Voucher, Pack
+from balatro import RUN_SECTIONS, BigNumber, Tag, PokerHand, Blind, Rank, Suit, Enhancement, Seal, Edition, Tarot, Planet, Spectral, Card, BalatroJoker, Consumable, Run, Stake, State, Voucher, Pack
 import balatro.jokers, balatro.classes
 
 MAX_CONSUMABLES = 20
@@ -59,261 +62,772 @@ VOUCHER_TO_INDEX: Dict[Voucher, int] = _enum_to_index(Voucher)
 PACK_TO_INDEX: Dict[Pack, int] = _enum_to_index(Pack)
 CONSUMABLE_TO_INDEX = {**_enum_to_index(Tarot), **_enum_to_index(Planet), **_enum_to_index(Spectral)}
 
-def one_hot(dict: Dict, element) -> torch.FloatTensor:
-    """
-    returns a one-hot f32 tensor with the length of the dict,
-    where only the element returned by dict[element] is 1
-    """
-    return one_hot_inner(dict, element).float()
-
-def one_hot_inner(dict: Dict, element) -> torch.FloatTensor:
-    """
-    returns a one-hot tensor with the length of the dict,
-    where only the element returned by dict[element] is 1
-    """
-    return torch.nn.functional.one_hot(torch.tensor(dict[element]), num_classes=len(dict))
-
 SIZE_ANTE_TAGS = [2, len(TAG_TO_INDEX) + len(POKERHAND_TO_INDEX)]
-def encode_ante_tags(ante_tags: list[tuple[Tag, PokerHand | None]]) -> torch.FloatTensor:
-    encoded = []
-    for i in range(2):
-        tag, hand = ante_tags[i]
-        tag_encoded = one_hot(TAG_TO_INDEX, tag)
-
-        if hand is None:
-            hand_encoded = torch.zeros(len(POKERHAND_TO_INDEX))
-        else:
-            hand_encoded = one_hot(POKERHAND_TO_INDEX, hand)
-
-        encoded.append(torch.cat([tag_encoded, hand_encoded]).unsqueeze(0))
-
-    return torch.cat(encoded)
-
-def encode_int(int: int) -> torch.FloatTensor:
-    return torch.tensor([float(int)])
-
-def encode_bool(bool: bool) -> torch.FloatTensor:
-    return torch.tensor([1.0 if bool else 0.0])
-
 SIZE_CONSUMABLE = len(CONSUMABLE_TO_INDEX) + 2
-def encode_consumable(consumable: Consumable) -> torch.FloatTensor:
-    card = one_hot(CONSUMABLE_TO_INDEX, consumable.card)
-    is_negative = encode_bool(consumable.is_negative)
-    extra_sell_value = encode_int(consumable._extra_sell_value)
-
-    return torch.cat([card, is_negative, extra_sell_value])
-
 SIZE_CONSUMABLES = [MAX_CONSUMABLES, SIZE_CONSUMABLE]
-def encode_consumables(consumables: list[Consumable]) -> torch.FloatTensor:
-    encoded = []
-    for i in range(0, MAX_CONSUMABLES):
-        if i < len(consumables):
-            consumable = consumables[i]
-            features = encode_consumable(consumable)
-            encoded.append(features.unsqueeze(0))
-        else:
-            encoded.append(torch.zeros(1, SIZE_CONSUMABLE))
-    return torch.cat(encoded)
-
 SIZE_CARD = len(RANK_TO_INDEX) + len(SUIT_TO_INDEX) + len(ENHANCEMENT_TO_INDEX) + len(SEAL_TO_INDEX) + len(EDITION_TO_INDEX) + 3
-def encode_card(card: Card) -> torch.Tensor:
-    rank = one_hot(RANK_TO_INDEX, card.rank)
-    suit = one_hot(SUIT_TO_INDEX, card.suit)
-
-    if card.enhancement is None:
-        enhancement = torch.zeros(len(ENHANCEMENT_TO_INDEX))
-    else:
-        enhancement = one_hot(ENHANCEMENT_TO_INDEX, card.enhancement)
-
-    if card.seal is None:
-        seal = torch.zeros(len(SEAL_TO_INDEX))
-    else:
-        seal = one_hot(SEAL_TO_INDEX, card.seal)
-
-    edition = one_hot(EDITION_TO_INDEX, card.edition)
-    chips = encode_int(card.chips)
-    is_debuffed = encode_bool(card.is_debuffed)
-    is_face_down = encode_bool(card.is_face_down)
-
-    return torch.cat([rank, suit, enhancement, seal, edition, chips, is_debuffed, is_face_down])
-
 SIZE_HAND_CARDS = [MAX_HAND_CARDS, SIZE_CARD]
 SIZE_DECK_CARDS = [MAX_DECK_CARDS, SIZE_CARD]
-def encode_cards(cards: list[Card], max) -> torch.Tensor:
-    encoded = []
-    for i in range(max):
-        if i < len(cards):
-            card = cards[i]
-            encoded.append(encode_card(card).unsqueeze(0))
-        else:
-            encoded.append(torch.zeros(1, SIZE_CARD))
-
-    return torch.cat(encoded)
-
 SIZE_JOKER = len(JOKERS_TO_INDEX) + len(EDITION_TO_INDEX) + 7
-def encode_joker(joker: BalatroJoker) -> torch.FloatTensor:
-    type = one_hot(JOKERS_TO_INDEX, joker.__class__)
-    edition = one_hot(EDITION_TO_INDEX, joker.edition)
-    is_eternal = encode_bool(joker.is_eternal)
-    is_perishable = encode_bool(joker.is_perishable)
-    is_rental = encode_bool(joker.is_rental)
-    is_debuffed = encode_bool(joker.is_debuffed)
-    is_flipped = encode_bool(joker.is_flipped)
-    num_perishable_rounds_left = encode_int(joker.num_perishable_rounds_left)
-    extra_sell_value = encode_int(joker._extra_sell_value)
-
-    return torch.cat([type, edition, is_eternal, is_perishable, is_rental, is_debuffed, is_flipped, num_perishable_rounds_left, extra_sell_value])
-
 SIZE_JOKERS = [MAX_JOKERS, SIZE_JOKER]
-def encode_jokers(jokers: list[BalatroJoker]) -> torch.FloatTensor:
-    encoded = []
-    for i in range(0, MAX_JOKERS):
-        if i < len(jokers):
-            joker = jokers[i]
-            features = encode_joker(joker)
-            encoded.append(features.unsqueeze(0))
-        else:
-            encoded.append(torch.zeros(1, SIZE_JOKER))
-    return torch.cat(encoded)
-
 SIZE_POKERHAND_INFO = [len(PokerHand), 2]
-def encode_poker_hand_info(info: dict[PokerHand, list[int]]) -> torch.FloatTensor:
-    encoded = torch.zeros(SIZE_POKERHAND_INFO[0], SIZE_POKERHAND_INFO[1])
-    for poker_hand in PokerHand:
-        ints = info[poker_hand]
-        index = POKERHAND_TO_INDEX[poker_hand]
-        encoded[index] = torch.tensor(ints).float()
-
-    return encoded
+SIZE_TAGS = [MAX_TAGS, len(TAG_TO_INDEX)]
+SIZE_SHOP_PACK = len(PACK_TO_INDEX)
+SIZE_SHOP_VOUCHER = len(VOUCHER_TO_INDEX)
+SIZE_SHOP_CARD = 3 + max(SIZE_JOKER, SIZE_CONSUMABLE, SIZE_CARD)
+SIZE_SHOP_PACKS = [MAX_SHOP_PACKS, SIZE_SHOP_PACK + 1]
+SIZE_SHOP_VOUCHERS = [MAX_SHOP_VOUCHERS, SIZE_SHOP_VOUCHER + 1]
+SIZE_SHOP_CARDS = [MAX_SHOP_CARDS, SIZE_SHOP_CARD + 1]
+SIZE_PACK_ITEMS = (MAX_PACK_ITEMS, SIZE_SHOP_CARD)
 
-def multi_hot(lookup: Dict, elements: set) -> torch.FloatTensor:
+@dataclass(frozen=True)
+class Field:
+    """
+    a part of the encoding, stored flat at obs[..., offset:offset + size]
+    """
+    name: str
+    offset: int
+    shape: tuple[int, ...]
+    dtype: str = "float32"
+
+    @property
+    def size(self) -> int:
+        return prod(self.shape)
+
+    def view(self, obs):
+        """
+        returns this field of an encoded (possibly batched) tensor or array
+        as a zero-copy view with shape [..., *self.shape]
+        """
+        return obs[..., self.offset:self.offset + self.size].reshape(*obs.shape[:-1], *self.shape)
+
+def _build_layout(shapes: list[tuple[str, tuple[int, ...]]]) -> Dict[str, Field]:
     """
-    returns a multi-hot Tensor with the length of the lookup Dict
+    lays the fields out one after the other, in the given order
     """
-    vec = torch.zeros(len(lookup))
-    for elem in elements:
-        vec[lookup[elem]] = 1.0
-    return vec
+    layout = {}
+    offset = 0
+    for name, shape in shapes:
+        layout[name] = Field(name, offset, shape)
+        offset += layout[name].size
+    return layout
+
+LAYOUT: Dict[str, Field] = _build_layout([
+    ("rerolled_boss_blind", (1,)),
+    ("available_money", (1,)),
+    ("discards_per_round", (1,)),
+    ("hands_per_round", (1,)),
+    ("most_played_hand", (len(POKERHAND_TO_INDEX),)),
+    ("ante", (1,)),
+    ("ante_tags", tuple(SIZE_ANTE_TAGS)),
+    ("blind", (len(BLIND_TO_INDEX),)),
+    ("blind_reward", (1,)),
+    ("boss_blind", (len(BLIND_TO_INDEX),)),
+    ("cash_out_total", (1,)),
+    ("consumable_slots", (1,)),
+    ("consumables", tuple(SIZE_CONSUMABLES)),
+    ("hand_cards", tuple(SIZE_HAND_CARDS)),
+    ("deck_cards_left", tuple(SIZE_DECK_CARDS)),
+    ("discards", (1,)),
+    ("forced_selected_card_index", (MAX_HAND_CARDS,)),
+    ("hand_size", (1,)),
+    ("hands", (1,)),
+    ("joker_slots", (1,)),
+    ("jokers", tuple(SIZE_JOKERS)),
+    ("money", (1,)),
+    ("opened_pack", (len(PACK_TO_INDEX),)),
+    ("pack_choices_left", (1,)),
+    ("pack_items", tuple(SIZE_PACK_ITEMS)),
+    ("poker_hand_info", tuple(SIZE_POKERHAND_INFO)),
+    ("reroll_cost", (1,)),
+    ("round", (1,)),
+    ("round_goal", (1,)),
+    ("round_score", (1,)),
+    ("shop_cards", tuple(SIZE_SHOP_CARDS)),
+    ("shop_vouchers", tuple(SIZE_SHOP_VOUCHERS)),
+    ("shop_packs", tuple(SIZE_SHOP_PACKS)),
+    ("stake", (len(STAKE_TO_INDEX),)),
+    ("state", (len(STATE_TO_INDEX),)),
+    ("tags", tuple(SIZE_TAGS)),
+    ("vouchers", (len(VOUCHER_TO_INDEX),)),
+])
+SIZE_ENCODED = sum(field.size for field in LAYOUT.values())
+
+# the score fields grow past the float32 range in late antes, so they are written as
+# log10(1 + x) (in the token global features too)
+LOG_SCALED_FIELDS = ("round_goal", "round_score")
+_LOG10_2 = log10(2)
+
+def _log_scale(number: int | float | BigNumber | None) -> float:
+    """
+    log10(1 + number) of a score or goal, 0 for None. past the float range it is
+    taken from the mantissa and binary exponent of the BigNumber, so it stays finite
+    """
+    if number is None:
+        return 0.0
+    if type(number) is BigNumber and number.exponent > 1000:
+        return log10(number.mantissa) + number.exponent * _LOG10_2
+    return log10(1 + float(number))
 
-SIZE_TAGS = [MAX_TAGS, len(TAG_TO_INDEX)]
-def encode_tags(tags: list[Tag]) -> torch.FloatTensor:
-    encoded = []
-    for i in range(0, MAX_TAGS):
-        if i < len(tags):
-            encoded.append(one_hot(TAG_TO_INDEX, tags[i]).unsqueeze(0))
-        else:
-            encoded.append(torch.zeros(1, len(TAG_TO_INDEX)))
-    return torch.cat(encoded)
+def _schema_hash() -> str:
+    """
+    hashes the layout and the log-scaled fields together with the order of every
+    one-hot vocabulary, so reordering an enum changes the hash as well
+    """
+    vocabularies = [TAG_TO_INDEX, POKERHAND_TO_INDEX, BLIND_TO_INDEX, RANK_TO_INDEX, SUIT_TO_INDEX,
+        ENHANCEMENT_TO_INDEX, SEAL_TO_INDEX, EDITION_TO_INDEX, STAKE_TO_INDEX, STATE_TO_INDEX,
+        VOUCHER_TO_INDEX, PACK_TO_INDEX, CONSUMABLE_TO_INDEX, JOKERS_TO_INDEX]
+    schema = [(field.name, field.offset, field.shape, field.dtype) for field in LAYOUT.values()]
+    schema.append(LOG_SCALED_FIELDS)
+    schema += [[(str(key), index) for key, index in vocabulary.items()] for vocabulary in vocabularies]
+    return hashlib.sha256(repr(schema).encode()).hexdigest()[:16]
 
-SIZE_SHOP_PACK = len(PACK_TO_INDEX)
-SIZE_SHOP_VOUCHER = len(VOUCHER_TO_INDEX)
-def encode_enum_shop_item(enum:Any, dict: Dict[Any, int]) -> torch.FloatTensor:
-    return one_hot(dict, enum)
+SCHEMA_HASH = _schema_hash()
 
-SIZE_SHOP_CARD = 3 + max(SIZE_JOKER, SIZE_CONSUMABLE, SIZE_CARD)
-def encode_shop_card(card: BalatroJoker | Consumable | Card) -> torch.FloatTensor:
-    encoded = torch.zeros(SIZE_SHOP_CARD)
-    # one_hot encode type and append encoded type with padding
+def check_schema_hash(schema_hash: str | None) -> None:
+    """
+    raises a ValueError if something encoded with schema_hash
+    (e.g. a checkpoint) doesn't match the current layout
+    """
+    if schema_hash != SCHEMA_HASH:
+        raise ValueError(f"observation schema mismatch: expected {SCHEMA_HASH}, got {schema_hash}")
+
+# offsets within a card, joker, consumable and shop card
+_CARD_SUIT = len(RANK_TO_INDEX)
+_CARD_ENHANCEMENT = _CARD_SUIT + len(SUIT_TO_INDEX)
+_CARD_SEAL = _CARD_ENHANCEMENT + len(ENHANCEMENT_TO_INDEX)
+_CARD_EDITION = _CARD_SEAL + len(SEAL_TO_INDEX)
+_CARD_CHIPS = _CARD_EDITION + len(EDITION_TO_INDEX)
+_JOKER_EDITION = len(JOKERS_TO_INDEX)
+_JOKER_FLAGS = _JOKER_EDITION + len(EDITION_TO_INDEX)
+_CONSUMABLE_FLAGS = len(CONSUMABLE_TO_INDEX)
+
+def _write_card(out: np.ndarray, offset: int, card: Card) -> None:
+    out[offset + RANK_TO_INDEX[card.rank]] = 1.0
+    out[offset + _CARD_SUIT + SUIT_TO_INDEX[card.suit]] = 1.0
+    if card.enhancement is not None:
+        out[offset + _CARD_ENHANCEMENT + ENHANCEMENT_TO_INDEX[card.enhancement]] = 1.0
+    if card.seal is not None:
+        out[offset + _CARD_SEAL + SEAL_TO_INDEX[card.seal]] = 1.0
+    out[offset + _CARD_EDITION + EDITION_TO_INDEX[card.edition]] = 1.0
+    out[offset + _CARD_CHIPS] = card.chips
+    out[offset + _CARD_CHIPS + 1] = card.is_debuffed
+    out[offset + _CARD_CHIPS + 2] = card.is_face_down
+
+def _write_joker(out: np.ndarray, offset: int, joker: BalatroJoker) -> None:
+    out[offset + JOKERS_TO_INDEX[joker.__class__]] = 1.0
+    out[offset + _JOKER_EDITION + EDITION_TO_INDEX[joker.edition]] = 1.0
+    out[offset + _JOKER_FLAGS] = joker.is_eternal
+    out[offset + _JOKER_FLAGS + 1] = joker.is_perishable
+    out[offset + _JOKER_FLAGS + 2] = joker.is_rental
+    out[offset + _JOKER_FLAGS + 3] = joker.is_debuffed
+    out[offset + _JOKER_FLAGS + 4] = joker.is_flipped
+    out[offset + _JOKER_FLAGS + 5] = joker.num_perishable_rounds_left
+    out[offset + _JOKER_FLAGS + 6] = joker._extra_sell_value
+
+def _write_consumable(out: np.ndarray, offset: int, consumable: Consumable) -> None:
+    out[offset + CONSUMABLE_TO_INDEX[consumable.card]] = 1.0
+    out[offset + _CONSUMABLE_FLAGS] = consumable.is_negative
+    out[offset + _CONSUMABLE_FLAGS + 1] = consumable._extra_sell_value
+
+def _write_shop_card(out: np.ndarray, offset: int, card: BalatroJoker | Consumable | Card) -> None:
     match card:
         case BalatroJoker():
-            encoded[0] = 1.0
-            encoded_joker = encode_joker(card)
-            encoded[3:3+SIZE_JOKER] = encoded_joker
+            out[offset] = 1.0
+            _write_joker(out, offset + 3, card)
         case Consumable():
-            encoded[1] = 1.0
-            encoded_consumable = encode_consumable(card)
-            encoded[3:3+SIZE_CONSUMABLE] = encoded_consumable
+            out[offset + 1] = 1.0
+            _write_consumable(out, offset + 3, card)
         case Card():
-            encoded[2] = 1.0
-            encoded_card = encode_card(card)
-            encoded[3:3+SIZE_CARD] = encoded_card
+            out[offset + 2] = 1.0
+            _write_card(out, offset + 3, card)
         case _:
             raise Exception("wrong type")
 
-    return encoded
+def _write_always(run: Run, out: np.ndarray) -> None:
+    """
+    writes every field that isn't tied to a run section
+    """
+    out[LAYOUT["rerolled_boss_blind"].offset] = run._rerolled_boss_blind
+    out[LAYOUT["available_money"].offset] = run._available_money
+    out[LAYOUT["discards_per_round"].offset] = run._discards_per_round
+    out[LAYOUT["hands_per_round"].offset] = run._hands_per_round
+    out[LAYOUT["most_played_hand"].offset + POKERHAND_TO_INDEX[run._most_played_hand]] = 1.0
+    out[LAYOUT["ante"].offset] = run.ante
+
+    offset = LAYOUT["ante_tags"].offset
+    for tag, hand in run.ante_tags[:SIZE_ANTE_TAGS[0]]:
+        out[offset + TAG_TO_INDEX[tag]] = 1.0
+        if hand is not None:
+            out[offset + len(TAG_TO_INDEX) + POKERHAND_TO_INDEX[hand]] = 1.0
+        offset += SIZE_ANTE_TAGS[1]
+
+    out[LAYOUT["blind"].offset + BLIND_TO_INDEX[run.blind]] = 1.0
+    out[LAYOUT["blind_reward"].offset] = run.blind_reward
+    out[LAYOUT["boss_blind"].offset + BLIND_TO_INDEX[run.boss_blind]] = 1.0
+    out[LAYOUT["cash_out_total"].offset] = 0 if run.cash_out_total is None else run.cash_out_total
+    out[LAYOUT["consumable_slots"].offset] = run.consumable_slots
+    out[LAYOUT["discards"].offset] = run.discards
+    if run.forced_selected_card_index is not None:
+        out[LAYOUT["forced_selected_card_index"].offset + run.forced_selected_card_index] = 1.0
+    out[LAYOUT["hand_size"].offset] = run.hand_size
+    out[LAYOUT["hands"].offset] = 0 if run.hands is None else run.hands
+    out[LAYOUT["joker_slots"].offset] = run.joker_slots
+    out[LAYOUT["money"].offset] = run.money
+    if run.opened_pack is not None:
+        out[LAYOUT["opened_pack"].offset + PACK_TO_INDEX[run.opened_pack]] = 1.0
+    out[LAYOUT["pack_choices_left"].offset] = 0 if run.pack_choices_left is None else run.pack_choices_left
+    out[LAYOUT["reroll_cost"].offset] = 0 if run.reroll_cost is None else run.reroll_cost
+    out[LAYOUT["round"].offset] = run.round
+    out[LAYOUT["round_goal"].offset] = _log_scale(run.round_goal)
+    out[LAYOUT["round_score"].offset] = _log_scale(run.round_score)
+
+    if run.shop_vouchers is not None:
+        offset = LAYOUT["shop_vouchers"].offset
+        for voucher, cost in run.shop_vouchers[:MAX_SHOP_VOUCHERS]:
+            out[offset + VOUCHER_TO_INDEX[voucher]] = 1.0
+            out[offset + SIZE_SHOP_VOUCHER] = cost
+            offset += SIZE_SHOP_VOUCHER + 1
+
+    if run.shop_packs is not None:
+        offset = LAYOUT["shop_packs"].offset
+        for pack, cost in run.shop_packs[:MAX_SHOP_PACKS]:
+            out[offset + PACK_TO_INDEX[pack]] = 1.0
+            out[offset + SIZE_SHOP_PACK] = cost
+            offset += SIZE_SHOP_PACK + 1
+
+    out[LAYOUT["stake"].offset + STAKE_TO_INDEX[run.stake]] = 1.0
+    out[LAYOUT["state"].offset + STATE_TO_INDEX[run.state]] = 1.0
+
+def _write_consumables(run: Run, out: np.ndarray) -> None:
+    offset = LAYOUT["consumables"].offset
+    for consumable in run.consumables[:MAX_CONSUMABLES]:
+        _write_consumable(out, offset, consumable)
+        offset += SIZE_CONSUMABLE
+
+def _write_deck_cards_left(run: Run, out: np.ndarray) -> None:
+    offset = LAYOUT["deck_cards_left"].offset
+    for card in run.deck_cards_left[:MAX_DECK_CARDS]:
+        _write_card(out, offset, card)
+        offset += SIZE_CARD
+
+def _write_hand(run: Run, out: np.ndarray) -> None:
+    if run.hand is not None:
+        offset = LAYOUT["hand_cards"].offset
+        for card in run.hand[:MAX_HAND_CARDS]:
+            _write_card(out, offset, card)
+            offset += SIZE_CARD
+
+def _write_jokers(run: Run, out: np.ndarray) -> None:
+    offset = LAYOUT["jokers"].offset
+    for joker in run.jokers[:MAX_JOKERS]:
+        _write_joker(out, offset, joker)
+        offset += SIZE_JOKER
+
+def _write_pack_items(run: Run, out: np.ndarray) -> None:
+    if run.pack_items is not None:
+        offset = LAYOUT["pack_items"].offset
+        for item in run.pack_items[:MAX_PACK_ITEMS]:
+            _write_shop_card(out, offset, item)
+            offset += SIZE_SHOP_CARD
+
+def _write_poker_hand_info(run: Run, out: np.ndarray) -> None:
+    offset = LAYOUT["poker_hand_info"].offset
+    for poker_hand, (level, num_played) in run.poker_hand_info.items():
+        out[offset + 2 * POKERHAND_TO_INDEX[poker_hand]] = level
+        out[offset + 2 * POKERHAND_TO_INDEX[poker_hand] + 1] = num_played
+
+def _write_shop_cards(run: Run, out: np.ndarray) -> None:
+    if run.shop_cards is not None:
+        offset = LAYOUT["shop_cards"].offset
+        for card, cost in run.shop_cards[:MAX_SHOP_CARDS]:
+            _write_shop_card(out, offset, card)
+            out[offset + SIZE_SHOP_CARD] = cost
+            offset += SIZE_SHOP_CARD + 1
+
+def _write_tags(run: Run, out: np.ndarray) -> None:
+    offset = LAYOUT["tags"].offset
+    for tag in run.tags[:MAX_TAGS]:
+        out[offset + TAG_TO_INDEX[tag]] = 1.0
+        offset += len(TAG_TO_INDEX)
+
+def _write_vouchers(run: Run, out: np.ndarray) -> None:
+    offset = LAYOUT["vouchers"].offset
+    for voucher in run.vouchers:
+        out[offset + VOUCHER_TO_INDEX[voucher]] = 1.0
+
+# run section -> (field it is encoded into, writer)
+_SECTIONS = {
+    "consumables": (LAYOUT["consumables"], _write_consumables),
+    "deck_cards_left": (LAYOUT["deck_cards_left"], _write_deck_cards_left),
+    "hand": (LAYOUT["hand_cards"], _write_hand),
+    "jokers": (LAYOUT["jokers"], _write_jokers),
+    "pack_items": (LAYOUT["pack_items"], _write_pack_items),
+    "poker_hand_info": (LAYOUT["poker_hand_info"], _write_poker_hand_info),
+    "shop_cards": (LAYOUT["shop_cards"], _write_shop_cards),
+    "tags": (LAYOUT["tags"], _write_tags),
+    "vouchers": (LAYOUT["vouchers"], _write_vouchers),
+}
+assert _SECTIONS.keys() == RUN_SECTIONS
+_ALWAYS_INDICES = np.concatenate([
+    np.arange(field.offset, field.offset + field.size)
+    for field in LAYOUT.values()
+    if all(field is not section_field for section_field, _ in _SECTIONS.values())
+])
+
+def _write_all(run: Run, out: np.ndarray) -> None:
+    out.fill(0.0)
+    for _, write in _SECTIONS.values():
+        write(run, out)
+    _write_always(run, out)
+
+# re-encode the whole run after every incremental encode and check the buffer against it
+check_incremental = False
+
+def encode_into(run: Run, out: np.ndarray, incremental: bool = False) -> np.ndarray:
+    """
+    writes the same encoding as encode into out, a float32 array of SIZE_ENCODED
+    (or the numpy view of a tensor), without building any intermediate tensors.
+    the whole buffer is cleared at once, so only the set entries are written.
+    with incremental, only the sections the run marked dirty since the last
+    incremental encode are re-encoded (plus the small fields), so out has to be
+    the buffer this run was last incrementally encoded into
+    """
+    if not incremental:
+        _write_all(run, out)
+        return out
+
+    dirty_sections = run.take_dirty_sections()
+    out[_ALWAYS_INDICES] = 0.0
+    for section in dirty_sections:
+        field, write = _SECTIONS[section]
+        out[field.offset:field.offset + field.size] = 0.0
+        write(run, out)
+    _write_always(run, out)
+
+    if check_incremental:
+        expected = np.empty(SIZE_ENCODED, dtype=np.float32)
+        _write_all(run, expected)
+        stale = [field.name for field in LAYOUT.values() if not np.array_equal(field.view(out), field.view(expected))]
+        assert not stale, f"Stale incremental encoding of {stale}, dirty sections were {dirty_sections}"
+    return out
 
-SIZE_SHOP_PACKS = [MAX_SHOP_PACKS, SIZE_SHOP_PACK + 1]
-SIZE_SHOP_VOUCHERS = [MAX_SHOP_VOUCHERS, SIZE_SHOP_VOUCHER + 1]
-SIZE_SHOP_CARDS = [MAX_SHOP_CARDS, SIZE_SHOP_CARD + 1]
-def encode_shop_items(items: list[tuple[Any, int]] | None, fn, element_size: int, max: int, dict: Dict[Any, int] | None = None) -> torch.FloatTensor:
-    if items is None:
-        return torch.zeros(max, element_size + 1)
-    else:
-        out = []
-        for i in range(max):
-            if i < len(items):
-                item = items[i]
-                inner_encoded = fn(item[0]) if dict is None else fn(item[0], dict)
-                int_encoded = encode_int(item[1])
-                encoded = torch.cat([inner_encoded, int_encoded]).unsqueeze(0)
-                out.append(encoded)
-            else:
-                out.append(torch.zeros(1, element_size + 1))
-        return torch.cat(out)
+# (field, value of a run) and (field, index dict or None, element of a run or None)
+# for the fields encode_batch writes as one column across the batch
+_BATCH_VALUES = [
+    ("rerolled_boss_blind", lambda run: run._rerolled_boss_blind),
+    ("available_money", lambda run: run._available_money),
+    ("discards_per_round", lambda run: run._discards_per_round),
+    ("hands_per_round", lambda run: run._hands_per_round),
+    ("ante", lambda run: run.ante),
+    ("blind_reward", lambda run: run.blind_reward),
+    ("cash_out_total", lambda run: 0 if run.cash_out_total is None else run.cash_out_total),
+    ("consumable_slots", lambda run: run.consumable_slots),
+    ("discards", lambda run: run.discards),
+    ("hand_size", lambda run: run.hand_size),
+    ("hands", lambda run: 0 if run.hands is None else run.hands),
+    ("joker_slots", lambda run: run.joker_slots),
+    ("money", lambda run: run.money),
+    ("pack_choices_left", lambda run: 0 if run.pack_choices_left is None else run.pack_choices_left),
+    ("reroll_cost", lambda run: 0 if run.reroll_cost is None else run.reroll_cost),
+    ("round", lambda run: run.round),
+    ("round_goal", lambda run: _log_scale(run.round_goal)),
+    ("round_score", lambda run: _log_scale(run.round_score)),
+]
+_BATCH_ONE_HOTS = [
+    ("most_played_hand", POKERHAND_TO_INDEX, lambda run: run._most_played_hand),
+    ("blind", BLIND_TO_INDEX, lambda run: run.blind),
+    ("boss_blind", BLIND_TO_INDEX, lambda run: run.boss_blind),
+    ("forced_selected_card_index", None, lambda run: run.forced_selected_card_index),
+    ("opened_pack", PACK_TO_INDEX, lambda run: run.opened_pack),
+    ("stake", STAKE_TO_INDEX, lambda run: run.stake),
+    ("state", STATE_TO_INDEX, lambda run: run.state),
+]
+
+def _scatter_cards(flat: np.ndarray, offsets: list[int], cards: list[Card]) -> None:
+    if not cards:
+        return
+    offsets = np.array(offsets)
+    enhancements = np.array([-1 if card.enhancement is None else ENHANCEMENT_TO_INDEX[card.enhancement] for card in cards])
+    seals = np.array([-1 if card.seal is None else SEAL_TO_INDEX[card.seal] for card in cards])
+    flat[np.concatenate([
+        offsets + [RANK_TO_INDEX[card.rank] for card in cards],
+        offsets + _CARD_SUIT + [SUIT_TO_INDEX[card.suit] for card in cards],
+        (offsets + _CARD_ENHANCEMENT + enhancements)[enhancements >= 0],
+        (offsets + _CARD_SEAL + seals)[seals >= 0],
+        offsets + _CARD_EDITION + [EDITION_TO_INDEX[card.edition] for card in cards],
+    ])] = 1.0
+    flat[offsets + _CARD_CHIPS] = [card.chips for card in cards]
+    flat[offsets + _CARD_CHIPS + 1] = [card.is_debuffed for card in cards]
+    flat[offsets + _CARD_CHIPS + 2] = [card.is_face_down for card in cards]
+
+def _scatter_jokers(flat: np.ndarray, offsets: list[int], jokers: list[BalatroJoker]) -> None:
+    if not jokers:
+        return
+    offsets = np.array(offsets)
+    flat[np.concatenate([
+        offsets + [JOKERS_TO_INDEX[joker.__class__] for joker in jokers],
+        offsets + _JOKER_EDITION + [EDITION_TO_INDEX[joker.edition] for joker in jokers],
+    ])] = 1.0
+    flat[offsets + _JOKER_FLAGS] = [joker.is_eternal for joker in jokers]
+    flat[offsets + _JOKER_FLAGS + 1] = [joker.is_perishable for joker in jokers]
+    flat[offsets + _JOKER_FLAGS + 2] = [joker.is_rental for joker in jokers]
+    flat[offsets + _JOKER_FLAGS + 3] = [joker.is_debuffed for joker in jokers]
+    flat[offsets + _JOKER_FLAGS + 4] = [joker.is_flipped for joker in jokers]
+    flat[offsets + _JOKER_FLAGS + 5] = [joker.num_perishable_rounds_left for joker in jokers]
+    flat[offsets + _JOKER_FLAGS + 6] = [joker._extra_sell_value for joker in jokers]
+
+def _scatter_consumables(flat: np.ndarray, offsets: list[int], consumables: list[Consumable]) -> None:
+    if not consumables:
+        return
+    offsets = np.array(offsets)
+    flat[offsets + [CONSUMABLE_TO_INDEX[consumable.card] for consumable in consumables]] = 1.0
+    flat[offsets + _CONSUMABLE_FLAGS] = [consumable.is_negative for consumable in consumables]
+    flat[offsets + _CONSUMABLE_FLAGS + 1] = [consumable._extra_sell_value for consumable in consumables]
+
+def encode_batch(runs: list[Run], out: np.ndarray) -> np.ndarray:
+    """
+    writes the same encoding as encode for every run into its row of out, a contiguous
+    float32 array of [len(runs), SIZE_ENCODED]. the fields of all runs are gathered
+    into flat index arrays first, then each kind of field is written for the whole
+    batch with one vectorized scatter
+    """
+    assert out.shape == (len(runs), SIZE_ENCODED)
+    out.fill(0.0)
+    flat = np.reshape(out, -1, copy=False)
+    bases = np.arange(len(runs)) * SIZE_ENCODED
+
+    for name, get in _BATCH_VALUES:
+        out[:, LAYOUT[name].offset] = [get(run) for run in runs]
+
+    ones = []
+    for name, lookup, get in _BATCH_ONE_HOTS:
+        elements = [get(run) for run in runs]
+        present = [element is not None for element in elements]
+        indices = np.array([element if lookup is None else lookup[element] for element in elements if element is not None], dtype=np.int64)
+        ones.append(bases[present] + LAYOUT[name].offset + indices)
+
+    # everything of variable length is gathered as flat offsets, items go to their scatter
+    one_offsets, value_offsets, values = [], [], []
+    card_offsets, cards = [], []
+    joker_offsets, jokers = [], []
+    consumable_offsets, consumables = [], []
+
+    def add_item(offset: int, item: BalatroJoker | Consumable | Card) -> None:
+        match item:
+            case BalatroJoker():
+                one_offsets.append(offset)
+                joker_offsets.append(offset + 3)
+                jokers.append(item)
+            case Consumable():
+                one_offsets.append(offset + 1)
+                consumable_offsets.append(offset + 3)
+                consumables.append(item)
+            case Card():
+                one_offsets.append(offset + 2)
+                card_offsets.append(offset + 3)
+                cards.append(item)
+            case _:
+                raise Exception("wrong type")
+
+    for base, run in zip(bases.tolist(), runs):
+        offset = base + LAYOUT["ante_tags"].offset
+        for tag, hand in run.ante_tags[:SIZE_ANTE_TAGS[0]]:
+            one_offsets.append(offset + TAG_TO_INDEX[tag])
+            if hand is not None:
+                one_offsets.append(offset + len(TAG_TO_INDEX) + POKERHAND_TO_INDEX[hand])
+            offset += SIZE_ANTE_TAGS[1]
+
+        offset = base + LAYOUT["consumables"].offset
+        for consumable in run.consumables[:MAX_CONSUMABLES]:
+            consumable_offsets.append(offset)
+            consumables.append(consumable)
+            offset += SIZE_CONSUMABLE
+
+        for name, run_cards, max_cards in (
+            ("hand_cards", run.hand or (), MAX_HAND_CARDS),
+            ("deck_cards_left", run.deck_cards_left, MAX_DECK_CARDS),
+        ):
+            offset = base + LAYOUT[name].offset
+            for card in run_cards[:max_cards]:
+                card_offsets.append(offset)
+                cards.append(card)
+                offset += SIZE_CARD
+
+        offset = base + LAYOUT["jokers"].offset
+        for joker in run.jokers[:MAX_JOKERS]:
+            joker_offsets.append(offset)
+            jokers.append(joker)
+            offset += SIZE_JOKER
+
+        if run.pack_items is not None:
+            offset = base + LAYOUT["pack_items"].offset
+            for item in run.pack_items[:MAX_PACK_ITEMS]:
+                add_item(offset, item)
+                offset += SIZE_SHOP_CARD
+
+        offset = base + LAYOUT["poker_hand_info"].offset
+        for poker_hand, (level, num_played) in run.poker_hand_info.items():
+            value_offsets += (offset + 2 * POKERHAND_TO_INDEX[poker_hand], offset + 2 * POKERHAND_TO_INDEX[poker_hand] + 1)
+            values += (level, num_played)
+
+        for name, shop_items, size, max_items in (
+            ("shop_cards", run.shop_cards, SIZE_SHOP_CARD, MAX_SHOP_CARDS),
+            ("shop_vouchers", run.shop_vouchers, SIZE_SHOP_VOUCHER, MAX_SHOP_VOUCHERS),
+            ("shop_packs", run.shop_packs, SIZE_SHOP_PACK, MAX_SHOP_PACKS),
+        ):
+            if shop_items is not None:
+                offset = base + LAYOUT[name].offset
+                for item, cost in shop_items[:max_items]:
+                    match item:
+                        case Voucher():
+                            one_offsets.append(offset + VOUCHER_TO_INDEX[item])
+                        case Pack():
+                            one_offsets.append(offset + PACK_TO_INDEX[item])
+                        case _:
+                            add_item(offset, item)
+                    value_offsets.append(offset + size)
+                    values.append(cost)
+                    offset += size + 1
+
+        offset = base + LAYOUT["tags"].offset
+        for tag in run.tags[:MAX_TAGS]:
+            one_offsets.append(offset + TAG_TO_INDEX[tag])
+            offset += len(TAG_TO_INDEX)
+
+        offset = base + LAYOUT["vouchers"].offset
+        one_offsets += (offset + VOUCHER_TO_INDEX[voucher] for voucher in run.vouchers)
+
+    ones.append(np.array(one_offsets, dtype=np.int64))
+    flat[np.concatenate(ones)] = 1.0
+    flat[value_offsets] = values
+    _scatter_cards(flat, card_offsets, cards)
+    _scatter_jokers(flat, joker_offsets, jokers)
+    _scatter_consumables(flat, consumable_offsets, consumables)
+    return out
 
-SIZE_PACK_ITEMS = (MAX_PACK_ITEMS, SIZE_SHOP_CARD)
-def encode_pack_items(pack_items: list[BalatroJoker | Consumable | Card]) -> torch.FloatTensor:
-    encoded = []
-    for i in range(MAX_PACK_ITEMS):
-        if i < len(pack_items):
-            item = pack_items[i]
-            encoded.append(encode_shop_card(item).unsqueeze(0))
-        else:
-            encoded.append(torch.zeros(1, SIZE_SHOP_CARD))
-    return torch.cat(encoded)
-
-
-
-SIZE_ENCODED = 18 + len(POKERHAND_TO_INDEX) + SIZE_ANTE_TAGS[0]*SIZE_ANTE_TAGS[1] + 2 * len(BLIND_TO_INDEX) + SIZE_CONSUMABLES[0]*SIZE_CONSUMABLES[1] + SIZE_HAND_CARDS[0]*SIZE_HAND_CARDS[1] + SIZE_DECK_CARDS[0]*SIZE_DECK_CARDS[1] + MAX_HAND_CARDS + SIZE_JOKERS[0]*SIZE_JOKERS[1] + len(PACK_TO_INDEX) + SIZE_PACK_ITEMS[0]*SIZE_PACK_ITEMS[1] + len(STAKE_TO_INDEX) + len(STATE_TO_INDEX) + SIZE_POKERHAND_INFO[0]*SIZE_POKERHAND_INFO[1] + SIZE_SHOP_CARDS[0]*SIZE_SHOP_CARDS[1] + SIZE_SHOP_PACKS[0]*SIZE_SHOP_PACKS[1] + SIZE_SHOP_VOUCHERS[0]*SIZE_SHOP_VOUCHERS[1] + SIZE_TAGS[0]*SIZE_TAGS[1] + len(VOUCHER_TO_INDEX)
-def encode(run: Run) -> torch.FloatTensor:
-    rerolled_boss_blind = encode_bool(run._rerolled_boss_blind)
-    available_money = encode_int(run._available_money)
-    discards_per_round = encode_int(run._discards_per_round)
-    hands_per_round = encode_int(run._hands_per_round)
-    most_played_hand = one_hot(POKERHAND_TO_INDEX, run._most_played_hand)
-    ante = encode_int(run.ante)
-    ante_tags = encode_ante_tags(run.ante_tags)
-
-    blind = one_hot(BLIND_TO_INDEX, run.blind)
-    blind_reward = encode_int(run.blind_reward)
-    boss_blind = one_hot(BLIND_TO_INDEX, run.boss_blind)
-    cash_out_total = torch.tensor([0 if run.cash_out_total is None else run.cash_out_total])
-    consumable_slots = encode_int(run.consumable_slots)
-    consumables = encode_consumables(run.consumables)
-    hand_cards = torch.zeros(SIZE_HAND_CARDS[0], SIZE_HAND_CARDS[1]) if run.hand is None else encode_cards(run.hand, MAX_HAND_CARDS)
-    deck_cards_left = encode_cards(run.deck_cards_left, MAX_DECK_CARDS)
-    discards = encode_int(run.discards)
-    forced_selected_card_index = torch.zeros(MAX_HAND_CARDS) if run.forced_selected_card_index is None else torch.nn.functional.one_hot(torch.tensor(run.forced_selected_card_index), MAX_HAND_CARDS)
-    hand_size = encode_int(run.hand_size)
-    hands = encode_int(0 if run.hands is None else run.hands)
-    joker_slots = encode_int(run.joker_slots)
-    jokers = encode_jokers(run.jokers)
-    money = encode_int(run.money)
-    opened_pack = torch.zeros(len(PACK_TO_INDEX)) if run.opened_pack is None else one_hot(PACK_TO_INDEX, run.opened_pack)
-    pack_choices_left = encode_int(0 if run.pack_choices_left is None else run.pack_choices_left)
-    pack_items = torch.zeros(SIZE_PACK_ITEMS) if run.pack_items is None else encode_pack_items(run.pack_items)
-    poker_hand_info = encode_poker_hand_info(run.poker_hand_info)
-    reroll_cost = encode_int(0 if run.reroll_cost is None else run.reroll_cost)
-    round = encode_int(run.round)
-    round_goal = torch.tensor([0 if run.round_goal is None else run.round_goal])
-    round_score = torch.tensor([run.round_score], dtype=torch.float32)
-    shop_cards = encode_shop_items(run.shop_cards, encode_shop_card, SIZE_SHOP_CARD, MAX_SHOP_CARDS)
-    shop_packs = encode_shop_items(run.shop_packs, encode_enum_shop_item, SIZE_SHOP_PACK, MAX_SHOP_PACKS, PACK_TO_INDEX)
-    shop_vouchers = encode_shop_items(run.shop_vouchers, encode_enum_shop_item, SIZE_SHOP_VOUCHER, MAX_SHOP_VOUCHERS, VOUCHER_TO_INDEX)
-    stake = one_hot(STAKE_TO_INDEX, run.stake)
-    state = one_hot(STATE_TO_INDEX, run.state)
-    tags = encode_tags(run.tags)
-    vouchers = multi_hot(VOUCHER_TO_INDEX, run.vouchers)
-
-    parts = [rerolled_boss_blind, available_money, discards_per_round, hands_per_round, most_played_hand,
-        ante, ante_tags.view(-1), blind, blind_reward, boss_blind, cash_out_total, consumable_slots,
-        consumables.view(-1), hand_cards.view(-1), deck_cards_left.view(-1),
-        discards, forced_selected_card_index, hand_size, hands, joker_slots,
-        jokers.view(-1), money, opened_pack, pack_choices_left, pack_items.view(-1),
-        poker_hand_info.view(-1), reroll_cost, round, round_goal, round_score, shop_cards.view(-1),
-        shop_vouchers.view(-1), shop_packs.view(-1), stake, state, tags.view(-1), vouchers]
-    encoded = torch.cat(parts, dim=0)
-    # print(len(encoded))
-    # print(SIZE_ENCODED)
-    assert len(encoded) == SIZE_ENCODED
-    return encoded
+def encode(run: Run) -> "torch.FloatTensor":
+    """
+    encodes the run into a fresh f32 tensor of SIZE_ENCODED,
+    see encode_into for reusing a buffer
+    """
+    # torch is only needed to wrap the numpy encodings, so the encoders work without it
+    import torch
+    return torch.from_numpy(encode_into(run, np.empty(SIZE_ENCODED, dtype=np.float32)))
+
+# token observations, a sparse alternative to the dense encoding for models with embeddings.
+# every entity (card, joker, consumable, shop item) is a row of token ids, 0 being padding,
+# and a few small ints. tags and vouchers are plain token lists, and the rest of the run
+# goes into global tokens and features
+def _token_vocabularies() -> Dict[str, Dict[Any, int]]:
+    """
+    builds a dictionary of [vocabulary name -> [element -> token id]],
+    the token ids of all vocabularies are consecutive, starting at 1
+    """
+    vocabularies = {
+        "rank": RANK_TO_INDEX,
+        "suit": SUIT_TO_INDEX,
+        "enhancement": ENHANCEMENT_TO_INDEX,
+        "seal": SEAL_TO_INDEX,
+        "edition": EDITION_TO_INDEX,
+        # is_debuffed | is_face_down << 1
+        "card_flags": _enum_to_index(range(4)),
+        "joker": JOKERS_TO_INDEX,
+        # is_eternal | is_perishable << 1 | is_rental << 2 | is_debuffed << 3 | is_flipped << 4
+        "joker_flags": _enum_to_index(range(32)),
+        # unlike CONSUMABLE_TO_INDEX, tarots, planets and spectrals don't share ids
+        "consumable": _enum_to_index([*Tarot, *Planet, *Spectral]),
+        "consumable_flags": _enum_to_index(range(2)),
+        "voucher": VOUCHER_TO_INDEX,
+        "pack": PACK_TO_INDEX,
+        "tag": TAG_TO_INDEX,
+        "poker_hand": POKERHAND_TO_INDEX,
+        "blind": BLIND_TO_INDEX,
+        "stake": STAKE_TO_INDEX,
+        "state": STATE_TO_INDEX,
+        "hand_index": _enum_to_index(range(MAX_HAND_CARDS)),
+    }
+    tokens = {}
+    next_token = 1
+    for name, vocabulary in vocabularies.items():
+        tokens[name] = {element: next_token + index for element, index in vocabulary.items()}
+        next_token += len(vocabulary)
+    return tokens
+
+TOKENS = _token_vocabularies()
+NUM_TOKENS = 1 + sum(len(vocabulary) for vocabulary in TOKENS.values())
+
+# entity rows of every section, in order
+TOKEN_ENTITIES: Dict[str, int] = {
+    "hand_cards": MAX_HAND_CARDS,
+    "deck_cards_left": MAX_DECK_CARDS,
+    "jokers": MAX_JOKERS,
+    "consumables": MAX_CONSUMABLES,
+    "pack_items": MAX_PACK_ITEMS,
+    "shop_cards": MAX_SHOP_CARDS,
+    "shop_vouchers": MAX_SHOP_VOUCHERS,
+    "shop_packs": MAX_SHOP_PACKS,
+}
+TOKEN_ENTITY_OFFSETS: Dict[str, int] = {}
+_offset = 0
+for name, num_entities in TOKEN_ENTITIES.items():
+    TOKEN_ENTITY_OFFSETS[name] = _offset
+    _offset += num_entities
+NUM_TOKEN_ENTITIES = _offset
+
+# cards take the most tokens: rank, suit, enhancement, seal, edition, flags
+TOKENS_PER_ENTITY = 6
+# chips or perishable rounds left, extra sell value, cost
+FEATURES_PER_ENTITY = 3
+# most_played_hand, blind, boss_blind, opened_pack, stake, state, forced_selected_card_index,
+# then the tag and poker hand of both ante tags
+NUM_GLOBAL_TOKENS = 7 + 2 * SIZE_ANTE_TAGS[0]
+NUM_GLOBAL_FEATURES = len(_BATCH_VALUES) + SIZE_POKERHAND_INFO[0] * SIZE_POKERHAND_INFO[1]
+
+# name -> (shape, dtype) of the arrays of a token observation
+TOKEN_FIELDS: Dict[str, tuple[tuple[int, ...], Any]] = {
+    "entity_tokens": ((NUM_TOKEN_ENTITIES, TOKENS_PER_ENTITY), np.int16),
+    "entity_features": ((NUM_TOKEN_ENTITIES, FEATURES_PER_ENTITY), np.int16),
+    "tag_tokens": ((MAX_TAGS,), np.int16),
+    "voucher_tokens": ((len(VOUCHER_TO_INDEX),), np.int16),
+    "global_tokens": ((NUM_GLOBAL_TOKENS,), np.int16),
+    "global_features": ((NUM_GLOBAL_FEATURES,), np.float32),
+}
+assert NUM_TOKENS <= np.iinfo(np.int16).max
+
+_INT16_MIN, _INT16_MAX = np.iinfo(np.int16).min, np.iinfo(np.int16).max
+
+def _clip_int16(value: int) -> int:
+    return min(max(value, _INT16_MIN), _INT16_MAX)
+
+def _write_card_tokens(tokens: np.ndarray, features: np.ndarray, row: int, card: Card) -> None:
+    tokens[row, 0] = TOKENS["rank"][card.rank]
+    tokens[row, 1] = TOKENS["suit"][card.suit]
+    if card.enhancement is not None:
+        tokens[row, 2] = TOKENS["enhancement"][card.enhancement]
+    if card.seal is not None:
+        tokens[row, 3] = TOKENS["seal"][card.seal]
+    tokens[row, 4] = TOKENS["edition"][card.edition]
+    tokens[row, 5] = TOKENS["card_flags"][card.is_debuffed | card.is_face_down << 1]
+    features[row, 0] = _clip_int16(card.chips)
+
+def _write_joker_tokens(tokens: np.ndarray, features: np.ndarray, row: int, joker: BalatroJoker) -> None:
+    tokens[row, 0] = TOKENS["joker"][joker.__class__]
+    tokens[row, 1] = TOKENS["edition"][joker.edition]
+    tokens[row, 2] = TOKENS["joker_flags"][
+        joker.is_eternal | joker.is_perishable << 1 | joker.is_rental << 2 | joker.is_debuffed << 3 | joker.is_flipped << 4
+    ]
+    features[row, 0] = _clip_int16(joker.num_perishable_rounds_left)
+    features[row, 1] = _clip_int16(joker._extra_sell_value)
+
+def _write_consumable_tokens(tokens: np.ndarray, features: np.ndarray, row: int, consumable: Consumable) -> None:
+    tokens[row, 0] = TOKENS["consumable"][consumable.card]
+    tokens[row, 1] = TOKENS["consumable_flags"][int(consumable.is_negative)]
+    features[row, 1] = _clip_int16(consumable._extra_sell_value)
+
+def _write_item_tokens(tokens: np.ndarray, features: np.ndarray, row: int, item: BalatroJoker | Consumable | Card) -> None:
+    match item:
+        case BalatroJoker():
+            _write_joker_tokens(tokens, features, row, item)
+        case Consumable():
+            _write_consumable_tokens(tokens, features, row, item)
+        case Card():
+            _write_card_tokens(tokens, features, row, item)
+        case _:
+            raise Exception("wrong type")
+
+def empty_token_observation() -> Dict[str, np.ndarray]:
+    """
+    allocates the arrays of a token observation, see TOKEN_FIELDS
+    """
+    return {name: np.zeros(shape, dtype=dtype) for name, (shape, dtype) in TOKEN_FIELDS.items()}
+
+def encode_tokens_into(run: Run, out: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    writes the run as a token observation into out (see empty_token_observation):
+    token ids and small ints per entity, token lists of the tags and vouchers, plus
+    global tokens and features. it holds the same information as encode in about 12x
+    fewer bytes, except that tarots, planets and spectrals get their own ids here
+    """
+    tokens = out["entity_tokens"]
+    features = out["entity_features"]
+    for array in out.values():
+        array.fill(0)
+
+    for name, cards in (("hand_cards", run.hand or ()), ("deck_cards_left", run.deck_cards_left)):
+        row = TOKEN_ENTITY_OFFSETS[name]
+        for card in cards[:TOKEN_ENTITIES[name]]:
+            _write_card_tokens(tokens, features, row, card)
+            row += 1
+
+    row = TOKEN_ENTITY_OFFSETS["jokers"]
+    for joker in run.jokers[:MAX_JOKERS]:
+        _write_joker_tokens(tokens, features, row, joker)
+        row += 1
+
+    row = TOKEN_ENTITY_OFFSETS["consumables"]
+    for consumable in run.consumables[:MAX_CONSUMABLES]:
+        _write_consumable_tokens(tokens, features, row, consumable)
+        row += 1
+
+    row = TOKEN_ENTITY_OFFSETS["pack_items"]
+    for item in (run.pack_items or ())[:MAX_PACK_ITEMS]:
+        _write_item_tokens(tokens, features, row, item)
+        row += 1
+
+    for name, shop_items in (("shop_cards", run.shop_cards), ("shop_vouchers", run.shop_vouchers), ("shop_packs", run.shop_packs)):
+        row = TOKEN_ENTITY_OFFSETS[name]
+        for item, cost in (shop_items or ())[:TOKEN_ENTITIES[name]]:
+            match item:
+                case Voucher():
+                    tokens[row, 0] = TOKENS["voucher"][item]
+                case Pack():
+                    tokens[row, 0] = TOKENS["pack"][item]
+                case _:
+                    _write_item_tokens(tokens, features, row, item)
+            features[row, 2] = _clip_int16(cost)
+            row += 1
+
+    tag_tokens = out["tag_tokens"]
+    for i, tag in enumerate(run.tags[:MAX_TAGS]):
+        tag_tokens[i] = TOKENS["tag"][tag]
+
+    # vouchers are a set, so they are written in a fixed order
+    voucher_tokens = out["voucher_tokens"]
+    i = 0
+    for voucher in VOUCHER_TO_INDEX:
+        if voucher in run.vouchers:
+            voucher_tokens[i] = TOKENS["voucher"][voucher]
+            i += 1
+
+    global_tokens = out["global_tokens"]
+    global_tokens[0] = TOKENS["poker_hand"][run._most_played_hand]
+    global_tokens[1] = TOKENS["blind"][run.blind]
+    global_tokens[2] = TOKENS["blind"][run.boss_blind]
+    if run.opened_pack is not None:
+        global_tokens[3] = TOKENS["pack"][run.opened_pack]
+    global_tokens[4] = TOKENS["stake"][run.stake]
+    global_tokens[5] = TOKENS["state"][run.state]
+    if run.forced_selected_card_index is not None:
+        global_tokens[6] = TOKENS["hand_index"][run.forced_selected_card_index]
+    for i, (tag, hand) in enumerate(run.ante_tags[:SIZE_ANTE_TAGS[0]]):
+        global_tokens[7 + 2 * i] = TOKENS["tag"][tag]
+        if hand is not None:
+            global_tokens[8 + 2 * i] = TOKENS["poker_hand"][hand]
+
+    global_features = out["global_features"]
+    for i, (_, get) in enumerate(_BATCH_VALUES):
+        global_features[i] = get(run)
+    offset = len(_BATCH_VALUES)
+    for poker_hand, (level, num_played) in run.poker_hand_info.items():
+        global_features[offset + 2 * POKERHAND_TO_INDEX[poker_hand]] = level
+        global_features[offset + 2 * POKERHAND_TO_INDEX[poker_hand] + 1] = num_played
+
+    return out
+
+def encode_tokens(run: Run) -> Dict[str, "torch.Tensor"]:
+    """
+    encodes the run into fresh tensors of a token observation, see encode_tokens_into
+    """
+    import torch
+    return {name: torch.from_numpy(array) for name, array in encode_tokens_into(run, empty_token_observation()).items()}
@@ -1,19 +1,19 @@
-from encode import _enum_to_index
+import numpy as np
 import torch
 from tensordict import TensorDict, TensorDictBase
 from torch import nn, Tensor
 from enum import Enum
+from typing import Dict
 from encode import *
 from torchrl.data import Composite, Categorical, Binary
 from torchrl.envs import (
     EnvBase,
 )
-from torchrl.data.tensor_specs import UnboundedContinuous
+from torchrl.data.tensor_specs import UnboundedContinuous, UnboundedDiscrete
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from balatro import Deck, Stake, Run
-from encode import one_hot
+from balatro import Action, Deck, LegalActionMask, Stake, Run
 import math
 import json
 import time
@@ -40,25 +40,40 @@ class ActionType(Enum):
 
 # see __init__ for an explanation
 PARAM1_LENGTH = max(MAX_HAND_CARDS, MAX_JOKERS, MAX_CONSUMABLES, MAX_SHOP_CARDS, MAX_SHOP_VOUCHERS, MAX_SHOP_PACKS, MAX_PACK_ITEMS)
-PARAM2_LENGTH = max(MAX_JOKERS, 2, 1)
+PARAM2_LENGTH = max(MAX_JOKERS, MAX_HAND_CARDS, 2)
+# the reward for a hand that scores the whole goal of its blind
+PLAY_HAND_REWARD = 30.0
 
 class BalatroEnv(EnvBase):
     batch_locked = False
 
-    def __init__(self, worker_id: int, td_params=None, seed=None, device="cpu", generate_replay=True):
+    def __init__(self, worker_id: int, td_params=None, seed=None, device="cpu", generate_replay=True, token_observations=False):
         super().__init__(device=device, batch_size=[])
         self.worker_id = worker_id
         self.seed = seed
         self.set_seed = seed
         self.generate_replay=generate_replay
+        # observe the run as tokens (see encode_tokens) instead of the dense encoding
+        self.token_observations = token_observations
+        # the run is encoded incrementally into this buffer, see encode_into
+        self.obs_buffer = np.zeros(SIZE_ENCODED, dtype=np.float32)
         self._init_run()
-        self.observation_spec = Composite(
-             observation=UnboundedContinuous(
-                 shape=(SIZE_ENCODED,),
-                 device=device,
-                 dtype=torch.float32,
-             )
-        )
+        if token_observations:
+            self.observation_spec = Composite(
+                observation=Composite({
+                    name: UnboundedDiscrete(shape=shape, device=device, dtype=torch.int16) if dtype == np.int16
+                        else UnboundedContinuous(shape=shape, device=device, dtype=torch.float32)
+                    for name, (shape, dtype) in TOKEN_FIELDS.items()
+                })
+            )
+        else:
+            self.observation_spec = Composite(
+                 observation=UnboundedContinuous(
+                     shape=(SIZE_ENCODED,),
+                     device=device,
+                     dtype=torch.float32,
+                 )
+            )
         self.action_spec = Composite(
             action_type = Categorical(len(ActionType)),
             # used as index/indices for:
@@ -72,9 +87,9 @@ class BalatroEnv(EnvBase):
             param1 = Binary(PARAM1_LENGTH),
             # used as index/indices for:
             #   jokers (move_joker)
-            #   consumable arguments (use_consumable)
-            #   whether a bought shop item should be used
-            param2 = Binary(PARAM2_LENGTH), # longest is useconsumable, which's second param has a max length of 2
+            #   hand cards to use a consumable on (use_consumable/choose_pack_item)
+            #   whether a bought shop item should be used (index 1)
+            param2 = Binary(PARAM2_LENGTH),
         )
         self.reward_spec = Composite(
             reward=UnboundedContinuous(
@@ -98,7 +113,8 @@ class BalatroEnv(EnvBase):
             # use current unix timestamp as fallback seed
             self.seed = timestamp
 
-        self.run = Run(Deck.RED, stake=Stake.WHITE, seed=self.seed)
+        # big numbers keep late-ante scores finite
+        self.run = Run(Deck.RED, stake=Stake.WHITE, seed=self.seed, big_numbers=True)
         if self.generate_replay:
             os.makedirs("runs", exist_ok=True)
             self.replay_file = os.path.join("runs", f"replay_{self.seed}.jsonl")
@@ -106,13 +122,23 @@ class BalatroEnv(EnvBase):
         self.total_reward = 0.0
 
 
+    def _encode_obs(self) -> torch.Tensor | TensorDict:
+        """
+        encodes the run for an observation (the dense encoding only re-encodes
+        what changed since the last step), it stays valid after later steps
+        """
+        if self.token_observations:
+            return TensorDict(encode_tokens(self.run), batch_size=[])
+        encode_into(self.run, self.obs_buffer, incremental=True)
+        return torch.from_numpy(self.obs_buffer.copy())
+
     def _reset(self, tensordict: TensorDict | None = None, **kwargs) -> TensorDict:
         # remove if it didnt beat the first round
         if self.generate_replay and self.run.round < 2:
             os.remove(self.replay_file)
 
         self._init_run()
-        obs = encode(self.run)
+        obs = self._encode_obs()
         return TensorDict(
             {
                 "observation": obs,
@@ -148,10 +174,17 @@ class BalatroEnv(EnvBase):
                 self.run.reroll_boss_blind()
             elif action_type == ActionType.PLAY_HAND.value:
                 blind = self.run.blind
+                goal = self.run.round_goal
                 before = self.run.round_score
+                # the forced card is left out of the param1 mask, see get_legal_param1
+                forced_card_index = self.run.forced_selected_card_index
+                if forced_card_index is not None and forced_card_index not in param1:
+                    param1.append(forced_card_index)
                 self.run.play_hand(param1)
                 after = self.run.round_score
-                reward = (after - before) / 10
+                # the share of the blind's goal the hand scored, which stays bounded
+                # however large late-ante scores get
+                reward = PLAY_HAND_REWARD * min(float((after - before) / goal), 1.0)
                 # if round won
                 if self.run.state == State.CASHING_OUT:
                     # add blind reward
@@ -171,11 +204,11 @@ class BalatroEnv(EnvBase):
             elif action_type == ActionType.SELL_JOKER.value:
                 self.run.sell_joker(param1[0])
             elif action_type == ActionType.USE_CONSUMABLE.value:
-                self.run.use_consumable(param1[0], param2)
+                self.run.use_consumable(param1[0], param2 or None)
             elif action_type == ActionType.SELL_CONSUMABLE.value:
                 self.run.sell_consumable(param1[0])
             elif action_type == ActionType.BUY_SHOP_CARD.value:
-                self.run.buy_shop_card(param1[0], bool(param2))
+                self.run.buy_shop_card(param1[0], 1 in param2)
             elif action_type == ActionType.REDEEM_SHOP_VOUCHER.value:
                 self.run.redeem_shop_voucher(param1[0])
             elif action_type == ActionType.OPEN_SHOP_PACK.value:
@@ -185,7 +218,7 @@ class BalatroEnv(EnvBase):
             elif action_type == ActionType.NEXT_ROUND.value:
                 self.run.next_round()
             elif action_type == ActionType.CHOOSE_PACK_ITEM.value:
-                self.run.choose_pack_item(param1[0], param2)
+                self.run.choose_pack_item(param1[0], param2 or None)
             elif action_type == ActionType.SKIP_PACK.value:
                 self.run.skip_pack()
             elif action_type == ActionType.NO_OP.value:
@@ -199,7 +232,7 @@ class BalatroEnv(EnvBase):
             print(f"[STEP ERROR] {ActionType(action_type).name}({param1}, {param2}) → {e}")
             reward = -5.0
 
-        obs = encode(self.run)
+        obs = self._encode_obs()
         done = self.run.state == State.GAME_OVER
 
         self.total_reward += reward
@@ -225,49 +258,25 @@ class BalatroEnv(EnvBase):
     def snapshot(self) -> dict:
         return {
             "device": self.device,
-            # action type
-            "state": self.run.state,
-            "len_jokers": len(self.run.jokers),
-            "len_consumables": len(self.run.consumables),
-            "can_reroll": self.run.reroll_cost is not None and self.run._available_money > self.run.reroll_cost,
-            "can_discard": self.run.discards > 0,
-            "can_skip_blind": self.run.blind == Blind.SMALL_BLIND or self.run.blind == Blind.BIG_BLIND,
-            "can_reroll_boss_blind": (Voucher.DIRECTORS_CUT in self.run.vouchers or (Voucher.RETCON in self.run.vouchers and not self.run._rerolled_boss_blind)) and self.run._available_money >= 10,
-            "joker_slots": self.run.joker_slots,
-            "consumable_slots": self.run.consumable_slots,
-            # param1
-            "len_hand_cards": None if self.run.hand is None else len(self.run.hand),
-            "forced_selected_card_index": self.run.forced_selected_card_index,
-            "len_pack_items": None if self.run.pack_items is None else len(self.run.pack_items),
+            "len_hand_cards": 0 if self.run.hand is None else len(self.run.hand),
+            # the legal arguments of every action type, straight from the run
             # dont use tensors so we can send snapshots across threads
-            "buyable_shop_cards_mask": [
-                (cost <= self.run._available_money)
-                for _, cost in (self.run.shop_cards or [])
-            ],
-            "buyable_shop_vouchers_mask": [
-                (cost <= self.run._available_money)
-                for _, cost in (self.run.shop_vouchers or [])
-            ],
-            "buyable_shop_packs_mask": [
-                (cost <= self.run._available_money)
-                for _, cost in (self.run.shop_packs or [])
-            ],
+            "masks": get_masks(self.run),
         }
 
+# the run action behind every action type but NO_OP
+ACTIONS = {
+    action_type: Action.DISCARD if action_type is ActionType.DISCARD_HAND else Action[action_type.name]
+    for action_type in ActionType
+    if action_type is not ActionType.NO_OP
+}
 
-
-    def shop_item_mask(self, items) -> Tensor:
-        mask = torch.zeros(PARAM1_LENGTH, dtype=torch.bool)
-        if items is not None:
-            for i, card in enumerate(items):
-                _, cost = card
-                if cost <= self.run._available_money:
-                    mask[i] = True
-        return mask
-
-def add_action_types(mask, action_type: set):
-    for elem in action_type:
-        mask[elem.value] = True
+def get_masks(run: Run) -> Dict[ActionType, LegalActionMask]:
+    """
+    the legal action masks of the run by action type, over as many indices as param1 and param2 take
+    """
+    masks = run.legal_action_masks(max(PARAM1_LENGTH, PARAM2_LENGTH))
+    return {action_type: masks[action] for action_type, action in ACTIONS.items()}
 
 def get_legal_action_type(snapshots):
     """
@@ -275,66 +284,16 @@ def get_legal_action_type(snapshots):
     returns a tensor of masks for legal actions (1 = legal, 0 = illegal)
     """
     masks = []
-    for i, snapshot in enumerate(snapshots):
-        device = snapshot["device"]
-
-        move_and_sell = torch.zeros(len(ActionType), dtype=torch.bool, device=device)
-        if snapshot["len_jokers"] > 0:
-            add_action_type(move_and_sell, ActionType.SELL_JOKER)
-        if snapshot["len_jokers"] > 1:
-            add_action_type(move_and_sell, ActionType.MOVE_JOKER)
-        if snapshot["len_consumables"] > 0:
-            add_action_type(move_and_sell, ActionType.SELL_CONSUMABLE)
-            add_action_type(move_and_sell, ActionType.USE_CONSUMABLE)
-
-        # only allow no-op
-        if snapshot["state"] == State.GAME_OVER:
-            masks.append(torch.nn.functional.one_hot(torch.tensor(ActionType.NO_OP.value), len(ActionType)).to(torch.bool).to(device))
-        elif snapshot["state"] == State.CASHING_OUT:
-            masks.append(torch.nn.functional.one_hot(torch.tensor(ActionType.CASH_OUT.value), len(ActionType)).to(torch.bool).to(device))
-        elif snapshot["state"] == State.IN_SHOP:
-            in_shop = move_and_sell.detach().clone()
-            add_action_type(in_shop, ActionType.NEXT_ROUND)
-
-            if snapshot["buyable_shop_cards_mask"].any():
-                add_action_type(in_shop, ActionType.BUY_SHOP_CARD)
-            if snapshot["buyable_shop_vouchers_mask"].any():
-                add_action_type(in_shop, ActionType.REDEEM_SHOP_VOUCHER)
-            if snapshot["buyable_shop_packs_mask"].any():
-                add_action_type(in_shop, ActionType.OPEN_SHOP_PACK)
-            if snapshot["can_reroll"]:
-                add_action_type(in_shop, ActionType.REROLL)
-
-            masks.append(in_shop)
-        elif snapshot["state"] == State.OPENING_PACK:
-            opening_pack = move_and_sell.detach().clone()
-            add_action_types(opening_pack, {
-                ActionType.CHOOSE_PACK_ITEM, ActionType.SKIP_PACK
-            })
-            masks.append(opening_pack)
-        elif snapshot["state"] == State.PLAYING_BLIND:
-            playing_blind = move_and_sell.detach().clone()
-            add_action_type(playing_blind, ActionType.PLAY_HAND) # if we haven't lost, we can always play a hand during a blind
-            if snapshot["can_discard"]:
-                add_action_type(playing_blind, ActionType.DISCARD_HAND)
-
-            masks.append(playing_blind)
-        elif snapshot["state"] == State.SELECTING_BLIND:
-            selecting_blind = move_and_sell.detach().clone()
-            add_action_type(selecting_blind, ActionType.SELECT_BLIND)
-            if snapshot["can_skip_blind"]:
-                add_action_type(selecting_blind, ActionType.SKIP_BLIND)
-
-            if snapshot["can_reroll_boss_blind"]:
-                add_action_type(selecting_blind, ActionType.REROLL_BOSS_BLIND)
-
-            masks.append(selecting_blind)
-        else:
-            raise Exception("shouldnt happen")
-
-        if masks[i].sum() == 0:
-            print(snapshot)
-            raise Exception("there should always be a legal action")
+    for snapshot in snapshots:
+        mask = torch.zeros(len(ActionType), dtype=torch.bool, device=snapshot["device"])
+        for action_type, action_mask in snapshot["masks"].items():
+            if any(action_mask.indices):
+                add_action_type(mask, action_type)
+
+        # only allow no-op once the game is over
+        if not mask.any():
+            add_action_type(mask, ActionType.NO_OP)
+        masks.append(mask)
 
     return torch.stack(masks, dim=0)
 
@@ -349,51 +308,38 @@ def get_legal_param1(snapshots):
         min_samples.append(min)
         max_samples.append(max)
 
-    for i, snapshot in enumerate(snapshots):
+    for snapshot in snapshots:
         action = snapshot["action"]
         device = snapshot["device"]
 
-        if action == ActionType.NO_OP:
-            # allow everything
-            append(torch.ones(PARAM1_LENGTH, dtype=torch.bool, device=device), 0, PARAM1_LENGTH)
-        elif action == ActionType.PLAY_HAND or action == ActionType.DISCARD_HAND:
-            max_sample = 5
-
-            len_hand_cards = snapshot["len_hand_cards"]
-            mask = set_until(len_hand_cards, PARAM1_LENGTH, device)
-
-            if snapshot["forced_selected_card_index"] is not None:
-                max_sample = 4
-                mask[snapshot["forced_selected_card_index"]] = False
-            append(mask, 1, max_sample)
-
-        elif action == ActionType.MOVE_JOKER or action == ActionType.SELL_JOKER:
-            # TODO: handle eternal jokers for selling
-            append(set_until(snapshot["len_jokers"], PARAM1_LENGTH, device), 1, 1)
-        elif action == ActionType.USE_CONSUMABLE or action == ActionType.SELL_CONSUMABLE:
-            # TODO: handle non-usable consumables (judgement, ankh etc., see below)
-            append(set_until(snapshot["len_consumables"], PARAM1_LENGTH, device), 1, 1)
-        elif action == ActionType.BUY_SHOP_CARD:
-            append(snapshot["buyable_shop_cards_mask"], 1, 1)
-        elif action == ActionType.REDEEM_SHOP_VOUCHER:
-            append(snapshot["buyable_shop_vouchers_mask"], 1, 1)
-        elif action == ActionType.OPEN_SHOP_PACK:
-            append(snapshot["buyable_shop_packs_mask"], 1, 1)
-        elif action == ActionType.CHOOSE_PACK_ITEM:
-            # TODO: handle non-usable cards (jokers/judgement when joker slots full, ankh when empty, etc.)
-            append(set_until(snapshot["len_pack_items"], PARAM1_LENGTH, device), 1, 1)
+        if action == ActionType.PLAY_HAND or action == ActionType.DISCARD_HAND:
+            action_mask = snapshot["masks"][action]
+            min_sample, max_sample = action_mask.min_cards[0], action_mask.max_cards[0]
+
+            mask = set_until(snapshot["len_hand_cards"], PARAM1_LENGTH, device)
+
+            # the env adds the forced card to the played hand
+            if action_mask.forced_card_index is not None:
+                mask[action_mask.forced_card_index] = False
+                min_sample, max_sample = max(0, min_sample - 1), max_sample - 1
+            append(mask, min_sample, max_sample)
+        elif action in (
+            ActionType.MOVE_JOKER, ActionType.SELL_JOKER,
+            ActionType.USE_CONSUMABLE, ActionType.SELL_CONSUMABLE,
+            ActionType.BUY_SHOP_CARD, ActionType.REDEEM_SHOP_VOUCHER,
+            ActionType.OPEN_SHOP_PACK, ActionType.CHOOSE_PACK_ITEM,
+        ):
+            indices = snapshot["masks"][action].indices[:PARAM1_LENGTH]
+            append(torch.tensor(indices, dtype=torch.bool, device=device), 1, 1)
         else:
-            append(torch.ones(PARAM1_LENGTH, dtype=torch.bool, device=device), 0, PARAM1_LENGTH)
-
-        if masks[i].sum() == 0:
-            print(snapshot)
-            raise Exception("there should always be a legal param1 configuration")
+            # the action takes no index
+            append(torch.zeros(PARAM1_LENGTH, dtype=torch.bool, device=device), 0, 0)
 
     return (torch.stack(masks, dim=0), torch.Tensor(min_samples), torch.Tensor(max_samples))
 
-def get_legal_param2(snapshots):
+def get_legal_param2(snapshots, param1):
     """
-    takes an iterable of snapshots
+    takes an iterable of snapshots and the chosen param1 of each of them
     returns a tensor of (mask, min_samples, max_samples)
     """
     masks, min_samples, max_samples = [], [], []
@@ -402,35 +348,34 @@ def get_legal_param2(snapshots):
         min_samples.append(min)
         max_samples.append(max)
 
-    for i, snapshot in enumerate(snapshots):
+    for snapshot, chosen in zip(snapshots, param1):
         action = snapshot["action"]
         device = snapshot["device"]
-        #param1 = snapshot["param1"]
-
-        # used as index/indices for:
-        #   whether a bought shop item should be used
-        if action == ActionType.NO_OP:
-            # allow everything
-            append(torch.ones(PARAM2_LENGTH, dtype=torch.bool, device=device), 0, PARAM2_LENGTH)
-        elif action == ActionType.MOVE_JOKER:
-            # TODO: handle eternal jokers for selling
-            # TODO: maybe exclude param1 joker
-            append(set_until(snapshot["len_jokers"], PARAM2_LENGTH, device), 1, 1)
-        elif action == ActionType.USE_CONSUMABLE:
-            # TODO: actually set min and max_samples and respect the used consumable
-            append(set_until(snapshot["len_hand_cards"], PARAM2_LENGTH, device), 1, 3)
-        elif action == ActionType.CHOOSE_PACK_ITEM:
-            # TODO: actually set min and max_samples and respect the used consumable
-            append(set_until(snapshot["len_hand_cards"], PARAM2_LENGTH, device), 1, 3)
+        indices = chosen.nonzero(as_tuple=True)[0].tolist()
+
+        if not indices:
+            # the action takes no index
+            append(torch.zeros(PARAM2_LENGTH, dtype=torch.bool, device=device), 0, 0)
+            continue
+
+        i = indices[0]
+        action_mask = snapshot["masks"][action]
+        if action == ActionType.MOVE_JOKER:
+            # the new index of the Joker
+            mask = torch.tensor(action_mask.second_args[i][:PARAM2_LENGTH], dtype=torch.bool, device=device)
+            append(mask, 1, 1)
+        elif action == ActionType.USE_CONSUMABLE or action == ActionType.CHOOSE_PACK_ITEM:
+            # the hand cards to use the consumable on
+            mask = set_until(snapshot["len_hand_cards"] if action_mask.max_cards[i] else 0, PARAM2_LENGTH, device)
+            append(mask, action_mask.min_cards[i], action_mask.max_cards[i])
         elif action == ActionType.BUY_SHOP_CARD:
-            # bool and_use
-            append(torch.nn.functional.one_hot(torch.tensor(1), PARAM2_LENGTH).to(torch.bool).to(device), 0, 1)
+            # bool and_use, set at index 1
+            buy, buy_and_use = action_mask.second_args[i][:2]
+            mask = torch.zeros(PARAM2_LENGTH, dtype=torch.bool, device=device)
+            mask[1] = buy_and_use
+            append(mask, 0 if buy else 1, 1 if buy_and_use else 0)
         else:
-            append(torch.ones(PARAM2_LENGTH, dtype=torch.bool, device=device), 0, PARAM2_LENGTH)
-
-        if masks[i].sum() == 0:
-            print(snapshot)
-            raise Exception("there should always be a legal param2 configuration")
+            append(torch.zeros(PARAM2_LENGTH, dtype=torch.bool, device=device), 0, 0)
 
     return (torch.stack(masks, dim=0), torch.Tensor(min_samples), torch.Tensor(max_samples))
 
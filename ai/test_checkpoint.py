@@ -0,0 +1,27 @@
+import random
+import pytest
+from balatro import *
+from conftest import play_random_actions, summarize
+
+NUM_STEPS = 60
+
+def test_rollback_restores_the_checkpoint(random_runs):
+    for run, rng in random_runs:
+        before = summarize(run)
+        checkpoint = run.checkpoint()
+        # a checkpoint stays valid for several rollbacks
+        for _ in range(2):
+            play_random_actions(run, rng, 3)
+            run.rollback(checkpoint)
+            assert summarize(run) == before
+
+        # the rolled back run draws the same random numbers again
+        seed = rng.randrange(2**32)
+        summaries = play_random_actions(run, random.Random(seed), NUM_STEPS)
+        run.rollback(checkpoint)
+        assert play_random_actions(run, random.Random(seed), NUM_STEPS) == summaries
+
+def test_rollback_rejects_a_checkpoint_of_another_run(random_runs):
+    run, _ = random_runs[0]
+    with pytest.raises(ValueError):
+        run.clone().rollback(run.checkpoint())
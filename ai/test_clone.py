@@ -0,0 +1,17 @@
+import random
+from balatro import *
+from conftest import play_random_actions, summarize
+
+NUM_STEPS = 60
+
+def test_clone_plays_out_like_the_original(random_runs):
+    for run, rng in random_runs:
+        before = summarize(run)
+        clone = run.clone()
+        assert summarize(clone) == before
+        assert all(joker._run is clone for joker in clone.jokers)
+
+        seed = rng.randrange(2**32)
+        clone_summaries = play_random_actions(clone, random.Random(seed), NUM_STEPS)
+        assert summarize(run) == before, "playing the clone changed the original"
+        assert play_random_actions(run, random.Random(seed), NUM_STEPS) == clone_summaries
@@ -0,0 +1,91 @@
+import random
+import numpy as np
+from balatro import *
+from conftest import card_indices, play_random_action
+from encode import LAYOUT, LOG_SCALED_FIELDS, SIZE_ENCODED, _log_scale, empty_token_observation, encode_batch, encode_into, encode_tokens_into
+
+NUM_STEPS = 40
+# the last ante with a base goal, past ante 20 the goals no longer fit in a float32
+LAST_ANTE = 39
+
+def full_encoding(run: Run) -> np.ndarray:
+    return encode_into(run, np.empty(SIZE_ENCODED, dtype=np.float32))
+
+def test_encode_into_overwrites_the_buffer(random_runs):
+    for run, _ in random_runs:
+        stale = np.full(SIZE_ENCODED, 7.0, dtype=np.float32)
+        assert encode_into(run, stale) is stale
+        np.testing.assert_array_equal(stale, full_encoding(run))
+        assert stale.dtype == np.float32 and np.isfinite(stale).all()
+
+def test_layout_covers_the_encoding():
+    offset = 0
+    for name, field in LAYOUT.items():
+        assert field.name == name and field.offset == offset, name
+        offset += field.size
+    assert offset == SIZE_ENCODED
+
+    obs = np.arange(3 * SIZE_ENCODED, dtype=np.float32).reshape(3, SIZE_ENCODED)
+    for field in LAYOUT.values():
+        view = field.view(obs)
+        assert view.shape == (3, *field.shape)
+        assert np.shares_memory(view, obs)
+        np.testing.assert_array_equal(view.reshape(3, -1), obs[:, field.offset:field.offset + field.size])
+
+def test_incremental_matches_full(random_runs):
+    for run, rng in random_runs:
+        buffer = np.full(SIZE_ENCODED, 7.0, dtype=np.float32)
+        checkpoint = run.checkpoint()
+        for step in range(NUM_STEPS):
+            expected = full_encoding(run)
+            encode_into(run, buffer, incremental=True)
+            stale = [name for name, field in LAYOUT.items() if not np.array_equal(field.view(buffer), field.view(expected))]
+            assert not stale, (step, run.state)
+            if run.is_game_over:
+                break
+            play_random_action(run, rng)
+            # rolling back marks every section dirty again
+            if step == NUM_STEPS // 2:
+                run.rollback(checkpoint)
+
+def test_batch_matches_encode_into(random_runs):
+    runs = [run for run, _ in random_runs]
+    out = np.full((len(runs), SIZE_ENCODED), 7.0, dtype=np.float32)
+    assert encode_batch(runs, out) is out
+    for row, run in zip(out, runs):
+        np.testing.assert_array_equal(row, full_encoding(run))
+
+def test_late_ante_scores_stay_finite():
+    run = Run(Deck.RED, seed="0", big_numbers=True)
+    rng = random.Random(0)
+    num_checked = 0
+    while run.ante <= LAST_ANTE:
+        if run.state is State.PLAYING_BLIND:
+            if run.ante > 20:
+                run._round_score = run.round_goal * 0.5
+                encoding = full_encoding(run)
+                assert np.isfinite(encoding).all(), run.ante
+                for name in LOG_SCALED_FIELDS:
+                    expected = _log_scale(getattr(run, name))
+                    assert 20 < expected < 400 and np.isclose(LAYOUT[name].view(encoding)[0], expected, rtol=1e-6), (run.ante, name)
+                batch = encode_batch([run], np.empty((1, SIZE_ENCODED), dtype=np.float32))
+                np.testing.assert_array_equal(batch[0], encoding)
+                tokens = encode_tokens_into(run, empty_token_observation())
+                assert np.isfinite(tokens["global_features"]).all(), run.ante
+                num_checked += 1
+                if run.ante == LAST_ANTE:
+                    break
+            # any hand beats the blind, so the run reaches the late antes with their real goals
+            run._round_score = run.round_goal
+            play = next(legal_action for legal_action in run.legal_actions() if legal_action.action is Action.PLAY_HAND)
+            run.play_hand(card_indices(run, play, rng))
+        elif run.state is State.SELECTING_BLIND:
+            run.select_blind()
+        elif run.state is State.CASHING_OUT:
+            run.cash_out()
+        elif run.state is State.IN_SHOP:
+            run.next_round()
+        else:
+            run.skip_pack()
+    assert run.ante == LAST_ANTE and type(run.round_goal) is BigNumber
+    assert num_checked > 3 * (LAST_ANTE - 21)
@@ -0,0 +1,59 @@
+from itertools import combinations
+from balatro import *
+from conftest import card_indices, play_random_action
+
+NUM_STEPS = 60
+
+def check(run: Run, action: Action, *args) -> bool:
+    return getattr(run, f"check_{action.value}")(*args) is None
+
+def test_legal_actions_agree_with_checks(random_runs):
+    for run, rng in random_runs:
+        for _ in range(NUM_STEPS):
+            if run.is_game_over:
+                break
+            legal_actions = list(run.legal_actions())
+            legal = {(legal_action.action, legal_action.args): legal_action for legal_action in legal_actions}
+
+            num_jokers, num_consumables = len(run.jokers), len(run.consumables)
+            candidates = [(action, ()) for action in (Action.CASH_OUT, Action.NEXT_ROUND, Action.REROLL, Action.REROLL_BOSS_BLIND, Action.SELECT_BLIND, Action.SKIP_BLIND, Action.SKIP_PACK)]
+            candidates += [(Action.BUY_SHOP_CARD, (i, use)) for i in range(len(run.shop_cards or [])) for use in (False, True)]
+            candidates += [(Action.REDEEM_SHOP_VOUCHER, (i,)) for i in range(len(run.shop_vouchers or []))]
+            candidates += [(Action.OPEN_SHOP_PACK, (i,)) for i in range(len(run.shop_packs or []))]
+            candidates += [(Action.SELL_JOKER, (i,)) for i in range(num_jokers)]
+            candidates += [(Action.MOVE_JOKER, (i, j)) for i in range(num_jokers) for j in range(num_jokers)]
+            candidates += [(Action.SELL_CONSUMABLE, (i,)) for i in range(num_consumables)]
+            pack_items = list(enumerate(run.pack_items or []))
+            candidates += [(Action.CHOOSE_PACK_ITEM, (i,)) for i, item in pack_items if not isinstance(item, Consumable)]
+            for action, args in candidates:
+                assert check(run, action, *args) == ((action, args) in legal), (run.state, action, args)
+
+            # actions on cards in hand are legal exactly with a selection in range
+            num_hand_cards = len(run.hand or [])
+            card_actions = [(Action.PLAY_HAND, ()), (Action.DISCARD, ())]
+            card_actions += [(Action.USE_CONSUMABLE, (i,)) for i in range(num_consumables)]
+            card_actions += [(Action.CHOOSE_PACK_ITEM, (i,)) for i, item in pack_items if isinstance(item, Consumable)]
+            for action, args in card_actions:
+                legal_action = legal.get((action, args))
+                # consumables that take no cards ignore the selection
+                max_selected = 0 if legal_action is not None and legal_action.max_cards == 0 else min(num_hand_cards, 6)
+                for num_cards in range(max_selected + 1):
+                    for selection in combinations(range(num_hand_cards), num_cards):
+                        expected = (
+                            legal_action is not None
+                            and legal_action.min_cards <= num_cards <= legal_action.max_cards
+                            and legal_action.forced_card_index in (None, *selection)
+                        )
+                        # consumables and pack items take no list when no cards are selected
+                        selection = list(selection) if selection or action in (Action.PLAY_HAND, Action.DISCARD) else None
+                        assert check(run, action, *args, selection) == expected, (run.state, action, args, selection)
+
+            # and every legal action goes through
+            for legal_action in legal_actions:
+                clone = run.clone()
+                args = list(legal_action.args)
+                if legal_action.max_cards > 0:
+                    args.append(card_indices(clone, legal_action, rng))
+                getattr(clone, legal_action.action.value)(*args)
+
+            play_random_action(run, rng)
@@ -0,0 +1,125 @@
+import random
+from collections import Counter
+import pytest
+from balatro import *
+from balatro.poker_hands import get_poker_hands
+
+NUM_HANDS = 50_000
+
+def card_suits(card: Card, smeared: bool) -> list[Suit]:
+    if card.is_stone_card:
+        return []
+    if card == Enhancement.WILD:
+        return list(Suit)
+    if smeared:
+        red_suits, black_suits = [Suit.HEARTS, Suit.DIAMONDS], [Suit.SPADES, Suit.CLUBS]
+        return red_suits if card.suit in red_suits else black_suits
+    return [card.suit]
+
+def reference_poker_hands(played_cards: list[Card], four_fingers: bool, shortcut: bool, smeared: bool) -> dict[PokerHand, list[int]]:
+    """
+    the evaluator from before the table-driven one, which counted suits and ranks and
+    walked the sorted ranks for straights
+    """
+    poker_hands = {}
+
+    flush_straight_len = 4 if four_fingers else 5
+    max_straight_gap = 2 if shortcut else 1
+
+    suit_counts = Counter()
+    for played_card in played_cards:
+        suit_counts.update(card_suits(played_card, smeared))
+
+    # flush check
+    flush_suit, flush_suit_count = suit_counts.most_common(1)[0] if suit_counts else (None, 0)
+    if flush_suit_count >= flush_straight_len:
+        poker_hands[PokerHand.FLUSH] = [i for i, card in enumerate(played_cards) if flush_suit in card_suits(card, smeared)]
+
+    rank_counts = Counter(played_card.rank for played_card in played_cards if not played_card.is_stone_card)
+
+    # straight check
+    if len(rank_counts) >= flush_straight_len:
+        sorted_ranks = sorted(rank_counts)
+
+        longest_straight = set()
+        cur_straight = set()
+        for i in range(len(sorted_ranks)):
+            cur_straight.add(sorted_ranks[i])
+            if len(cur_straight) > len(longest_straight):
+                longest_straight = cur_straight
+            if i < len(sorted_ranks) - 1 and int(sorted_ranks[i + 1]) - int(sorted_ranks[i]) > max_straight_gap:
+                cur_straight = set()
+
+        if int(min(longest_straight)) <= max_straight_gap + 1 and Rank.ACE in rank_counts:
+            longest_straight.add(Rank.ACE)
+
+        if len(longest_straight) >= flush_straight_len:
+            straight_indices = [i for i, card in enumerate(played_cards) if card.rank in longest_straight]
+            if PokerHand.FLUSH in poker_hands:
+                poker_hands[PokerHand.STRAIGHT_FLUSH] = straight_indices
+            poker_hands[PokerHand.STRAIGHT] = straight_indices
+
+    # rank-matching checks
+    for rank, n in rank_counts.most_common():
+        if n == 5:
+            poker_hands[PokerHand.FIVE_OF_A_KIND] = list(range(5))
+            if PokerHand.FLUSH in poker_hands:
+                poker_hands[PokerHand.FLUSH_FIVE] = list(range(5))
+        if n >= 4:
+            poker_hands[PokerHand.FOUR_OF_A_KIND] = [i for i, card in enumerate(played_cards) if card.rank is rank][:4]
+        if n >= 3:
+            poker_hands[PokerHand.THREE_OF_A_KIND] = [i for i, card in enumerate(played_cards) if card.rank is rank][:3]
+        if n >= 2:
+            if PokerHand.THREE_OF_A_KIND in poker_hands and played_cards[poker_hands[PokerHand.THREE_OF_A_KIND][0]].rank is not rank:
+                poker_hands[PokerHand.FULL_HOUSE] = list(range(5))
+                if PokerHand.FLUSH in poker_hands:
+                    poker_hands[PokerHand.FLUSH_HOUSE] = list(range(5))
+            if PokerHand.PAIR in poker_hands:
+                poker_hands[PokerHand.TWO_PAIR] = poker_hands[PokerHand.PAIR] + [i for i, card in enumerate(played_cards) if card.rank is rank][:2]
+            poker_hands[PokerHand.PAIR] = [i for i, card in enumerate(played_cards) if card.rank is rank][:2]
+
+    # high card, with no rank when all cards are stone cards
+    if not rank_counts:
+        poker_hands[PokerHand.HIGH_CARD] = []
+    else:
+        poker_hands[PokerHand.HIGH_CARD] = [i for i, card in enumerate(played_cards) if card.rank is max(rank_counts)][:1]
+
+    return poker_hands
+
+def random_cards(rng: random.Random) -> list[Card]:
+    """
+    up to 7 cards drawn from a few ranks and suits, so that pairs, flushes and
+    straights come up often, with some Stone and Wild Cards
+    """
+    ranks = rng.sample(list(Rank), rng.randint(1, 13))
+    suits = rng.sample(list(Suit), rng.randint(1, 4))
+    cards = []
+    for _ in range(rng.choice([0, 1, 2, 3, 4, 5, 5, 5, 5, 6, 7])):
+        card = Card(rng.choice(ranks), rng.choice(suits))
+        roll = rng.random()
+        if roll < 0.1:
+            card.enhancement = Enhancement.STONE
+        elif roll < 0.2:
+            card.enhancement = Enhancement.WILD
+        card.is_debuffed = rng.random() < 0.1
+        cards.append(card)
+    return cards
+
+@pytest.mark.parametrize("four_fingers", [False, True])
+@pytest.mark.parametrize("shortcut", [False, True])
+@pytest.mark.parametrize("smeared", [False, True])
+def test_matches_reference(four_fingers, shortcut, smeared):
+    rng = random.Random(hash((four_fingers, shortcut, smeared)))
+    for _ in range(NUM_HANDS // 8):
+        cards = random_cards(rng)
+        expected = reference_poker_hands(cards, four_fingers, shortcut, smeared)
+        poker_hands = get_poker_hands(cards, four_fingers, shortcut, smeared)
+        assert poker_hands == expected, cards
+        # the hands are found in the same order, so the first is the best one
+        assert list(poker_hands) == list(expected), cards
+
+def test_examples():
+    assert max(get_poker_hands([Card(Rank.ACE, Suit.HEARTS), Card(Rank.TWO, Suit.SPADES), Card(Rank.THREE, Suit.CLUBS), Card(Rank.FOUR, Suit.HEARTS), Card(Rank.FIVE, Suit.DIAMONDS)])) is PokerHand.STRAIGHT
+    assert max(get_poker_hands([Card(Rank.KING, Suit.HEARTS), Card(Rank.KING, Suit.SPADES), Card(Rank.FIVE, Suit.HEARTS), Card(Rank.FIVE, Suit.CLUBS)])) is PokerHand.TWO_PAIR
+    assert max(get_poker_hands([Card(Rank.TWO, Suit.HEARTS), Card(Rank.FOUR, Suit.HEARTS), Card(Rank.SIX, Suit.HEARTS), Card(Rank.EIGHT, Suit.HEARTS)], four_fingers=True, shortcut=True)) is PokerHand.STRAIGHT_FLUSH
+    assert get_poker_hands([]) == {PokerHand.HIGH_CARD: []}
@@ -0,0 +1,35 @@
+from balatro import *
+from conftest import card_indices, play_random_action
+
+NUM_STEPS = 40
+
+def set_orders(run: Run) -> dict[str, list]:
+    return {name: list(value) for name, value in vars(run).items() if type(value) is set}
+
+def test_preview_leaves_the_run_unchanged(random_runs):
+    for run, rng in random_runs:
+        for _ in range(NUM_STEPS):
+            if run.is_game_over:
+                break
+            play = next((legal_action for legal_action in run.legal_actions() if legal_action.action is Action.PLAY_HAND), None)
+            if play is not None:
+                data, sets = run.to_bytes(), set_orders(run)
+                for chance_mode in ChanceMode:
+                    run.preview_play_hand(card_indices(run, play, rng), chance_mode)
+                assert run.to_bytes() == data
+                # down to the iteration order of the sets
+                assert set_orders(run) == sets
+            play_random_action(run, rng)
+
+def test_sampled_preview_matches_playing_the_hand(random_runs):
+    for run, rng in random_runs:
+        if run.state is not State.PLAYING_BLIND:
+            continue
+        play = next(legal_action for legal_action in run.legal_actions() if legal_action.action is Action.PLAY_HAND)
+        selection = card_indices(run, play, rng)
+        preview = run.preview_play_hand(selection, ChanceMode.SAMPLED)
+        clone = run.clone()
+        round_score = clone.round_score
+        clone.play_hand(selection)
+        if clone.state is State.PLAYING_BLIND:
+            assert clone.round_score - round_score == preview.score
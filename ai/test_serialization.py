@@ -0,0 +1,24 @@
+import random
+from balatro import *
+from conftest import play_random_actions, summarize
+
+NUM_STEPS = 60
+
+def test_from_bytes_plays_out_like_the_original(random_runs):
+    for run, rng in random_runs:
+        restored = Run.from_bytes(run.to_bytes())
+        assert type(restored) is type(run)
+        assert summarize(restored) == summarize(run)
+
+        seed = rng.randrange(2**32)
+        assert play_random_actions(restored, random.Random(seed), NUM_STEPS) == play_random_actions(run, random.Random(seed), NUM_STEPS)
+
+def test_equal_runs_serialize_to_equal_bytes(random_runs):
+    for run, _ in random_runs:
+        data = run.to_bytes()
+        assert Run.from_bytes(data).to_bytes() == data
+        # rebuilding the sets changes their iteration order but not the bytes
+        for name, value in list(vars(run).items()):
+            if type(value) is set:
+                setattr(run, name, set(reversed(list(value))))
+        assert run.to_bytes() == data
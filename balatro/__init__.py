@@ -1,25 +1,39 @@
 from __future__ import annotations
 import base64
+from bisect import insort
 from collections import Counter
 from copy import copy
+from heapq import heappop, heappush
+from itertools import accumulate, chain, combinations, permutations
+from operator import attrgetter
 import random as r
+from types import MappingProxyType
+from typing import Iterator
 
 from .constants import *
 from .classes import *
 from .enums import *
 from .jokers import *
+from .poker_hands import get_poker_hands
+from .serialization import dump_run, load_run
 
 __version__ = "1.0.0"
 
 
-def format_number(number: float) -> str:
+def format_number(number: float | BigNumber) -> str:
     """
     Formats a number to appropriate decimal places, or scientific notation if large
 
     Args:
-        number (float): The number to format
+        number (float | BigNumber): The number to format
     """
 
+    if isinstance(number, BigNumber):
+        number = number.narrow()
+        if isinstance(number, BigNumber):
+            if number < 0:
+                raise ValueError("Number must be non-negative")
+            return str(number)
     if number != number:
         return "nan"
     if number == float("inf"):
@@ -33,27 +47,88 @@ def format_number(number: float) -> str:
     return f"{number:,.1f}" if number >= 10 else f"{number:,.2f}"
 
 
+# the fields of a card that can change, in field order
+_CARD_FIELDS = attrgetter(
+    "rank",
+    "suit",
+    "enhancement",
+    "seal",
+    "edition",
+    "extra_chips",
+    "is_debuffed",
+    "is_face_down",
+)
+
+
+def _copy_fields(fields: dict[str, object]) -> dict[str, object]:
+    # the fields of a Joker or Consumable with their containers copied, so that changes
+    # to the object never reach a checkpoint of them
+    return {
+        name: value.copy() if isinstance(value, (list, set, dict)) else value
+        for name, value in fields.items()
+    }
+
+
+def _error(
+    describe: bool, error: type[BalatroError], message: str, *args: object
+) -> type[BalatroError] | BalatroError:
+    # the check_* methods only return the error class, the actions describe the error
+    # they raise, so the message is only formatted on the way to being raised
+    return error(message.format(*args)) if describe else error
+
+
 class Run:
+    # recompute the cached stats, deck counts and copy targets on every access and
+    # check them against the caches
+    check_stats_cache: bool = False
+    check_deck_counts: bool = False
+    check_copy_targets: bool = False
+
+    # only set while preview_play_hand scores a hand
+    _chance_mode: ChanceMode | None = None
+    _chance_outcomes: list[bool] | None = None
+    _chance_rolls: list[float] | None = None
+
+    # set while the cards and the random state are shared with a clone or a checkpoint,
+    # until the run copies them for itself before its next change
+    _is_shared: bool = False
+
+    # the latest results of best_plays by the state they were found for, shared with
+    # clones since equal states always give the same result
+    _best_plays_cache: dict[tuple, list[tuple[list[int], HandPreview]]] | None = None
+
     def __init__(
         self,
         deck: Deck,
         stake: Stake = Stake.WHITE,
         seed: str | None = None,
+        big_numbers: bool = False,
     ) -> None:
         if deck is Deck.CHALLENGE and not isinstance(self, ChallengeRun):
             raise ValueError(
                 f"Cannot use {Deck.CHALLENGE} with {Run}, use {ChallengeRun} instead"
             )
 
-        r.seed(seed)
+        self._random: r.Random = r.Random(seed)
+        self._stats_cache: dict[str, int] | None = None
+        self._deck_counts_cache: dict[str, Counter] | None = None
+        self._samplers_cache: dict[str, object] | None = None
+        self._copy_targets_cache: dict[CopyJoker, BalatroJoker | None] | None = None
+        self._dirty_sections: set[str] = set(RUN_SECTIONS)
 
         self._deck: Deck = deck
         self._stake: Stake = stake
-        self._money: int = (
-            CHALLENGE_SETUPS[self._challenge].starting_money
+        # score with BigNumber chips and mult, so that scores and round goals past the
+        # largest float stay finite (they are only BigNumbers once they are past it)
+        self._big_numbers: bool = big_numbers
+        self._ruleset: Ruleset = self._resolve_ruleset()
+        challenge_setup = (
+            CHALLENGE_SETUPS[self._challenge]
             if isinstance(self, ChallengeRun)
-            else (14 if self._deck is Deck.YELLOW else 4)
+            else None
         )
+
+        self._money: int = self._ruleset.starting_money
         self._ante: int = 0
         self._round: int = 0
 
@@ -61,18 +136,15 @@ class Run:
             poker_hand: [1, 0] for poker_hand in PokerHand
         }
         self._vouchers: set[Voucher] = (
-            copy(CHALLENGE_SETUPS[self._challenge].initial_vouchers)
-            if isinstance(self, ChallengeRun)
+            copy(challenge_setup.initial_vouchers)
+            if challenge_setup is not None
             else set()
         )
         self._tags: list[Tag] = []
 
         self._deck_cards: list[Card] = (
-            [
-                copy(deck_card)
-                for deck_card in CHALLENGE_SETUPS[self._challenge].deck_cards
-            ]
-            if isinstance(self, ChallengeRun)
+            [copy(deck_card) for deck_card in challenge_setup.deck_cards]
+            if challenge_setup is not None
             else [
                 (
                     self._get_random_card()
@@ -93,17 +165,18 @@ class Run:
                     is_perishable=joker.is_perishable,
                     is_rental=joker.is_rental,
                 )
-                for joker in CHALLENGE_SETUPS[self._challenge].initial_jokers
+                for joker in challenge_setup.initial_jokers
             ]
-            if isinstance(self, ChallengeRun)
+            if challenge_setup is not None
             else []
         )
+        self._joker_hooks: dict[str, list[BalatroJoker]] = {}
+        self._update_joker_hooks()
+        self._joker_types: Counter[type] = Counter()
+        self._update_joker_types()
         self._consumables: list[Consumable] = (
-            [
-                copy(consumable)
-                for consumable in CHALLENGE_SETUPS[self._challenge].initial_consumables
-            ]
-            if isinstance(self, ChallengeRun)
+            [copy(consumable) for consumable in challenge_setup.initial_consumables]
+            if challenge_setup is not None
             else []
         )
 
@@ -144,10 +217,10 @@ class Run:
         self._num_unused_discards: int = 0
         self._num_blinds_skipped: int = 0
 
-        self._round_score: float | None = None
-        self._round_goal: float | None = None
-        self._chips: int | None = None
-        self._mult: float | None = None
+        self._round_score: float | BigNumber | None = None
+        self._round_goal: float | BigNumber | None = None
+        self._chips: int | BigNumber | None = None
+        self._mult: float | BigNumber | None = None
         self._hands: int | None = None
         self._discards: int | None = None
         self._hand: list[Card] | None = None
@@ -197,16 +270,61 @@ class Run:
 
     def _add_card(self, card: Card, draw_to_hand: bool = False) -> None:
         self._deck_cards.append(card)
+        self._deck_counts_cache = None
         if draw_to_hand:
             self._hand.append(card)
 
-        for joker in self._jokers:
+        for joker in self._joker_hooks["_on_card_added"]:
             joker._on_card_added(card)
 
     def _add_joker(self, joker: BalatroJoker) -> None:
         self._jokers.append(joker)
+        self._update_joker_hooks()
+        self._update_joker_types()
+        self._stats_cache = None
         for other_joker in self._jokers:
             other_joker._on_jokers_moved()
+        self._copy_targets_cache = None
+
+    def _best_plays_key(self, k: int, chance_mode: ChanceMode) -> tuple:
+        # everything scoring a hand can read, with cards and Jokers by their fields
+        # rather than their identity, so that equal states key the same across clones
+        # and rollbacks (sampling also reads the random state)
+        return (
+            k,
+            chance_mode,
+            tuple(
+                (name, value)
+                for name, value in self.__dict__.items()
+                if (
+                    value is None
+                    or isinstance(value, (int, float, str, Enum, BigNumber))
+                )
+                and name != "_is_shared"
+            ),
+            tuple(map(_CARD_FIELDS, self._hand)),
+            tuple(
+                (
+                    type(joker),
+                    tuple(
+                        _CARD_FIELDS(value) if isinstance(value, Card) else value
+                        for value in joker.__dict__.values()
+                        if not isinstance(value, (Run, BalatroJoker))
+                    ),
+                )
+                for joker in self._jokers
+            ),
+            tuple(
+                (consumable.card, consumable.is_negative)
+                for consumable in self._consumables
+            ),
+            frozenset(self._vouchers),
+            tuple(map(tuple, self._poker_hand_info.values())),
+            tuple(self._round_poker_hands),
+            frozenset(Counter(map(_CARD_FIELDS, self._deck_cards)).items()),
+            frozenset(Counter(map(_CARD_FIELDS, self._deck_cards_left)).items()),
+            self._random.getstate() if chance_mode is ChanceMode.SAMPLED else None,
+        )
 
     def _calculate_buy_cost(
         self,
@@ -231,7 +349,7 @@ class Run:
                     case Tarot():
                         base_cost = 3
                     case Planet():
-                        if Astronomer in self._jokers:
+                        if Astronomer in self._joker_types:
                             return 0
                         base_cost = 3
                     case Spectral():
@@ -246,7 +364,7 @@ class Run:
                 base_cost = 10
                 # discount_percent = 1.0
             case Pack():
-                if item.name.endswith("CELESTIAL") and Astronomer in self._jokers:
+                if item.name.endswith("CELESTIAL") and Astronomer in self._joker_types:
                     return 0
                 if item.name.startswith("MEGA"):
                     base_cost = 8
@@ -262,178 +380,1042 @@ class Run:
         return max(1, self._calculate_buy_cost(item) // 2) + item._extra_sell_value
 
     def _chance(self, hit: int, pool: int) -> bool:
-        hit *= 2 ** self._jokers.count(OopsAllSixes)
-        return hit >= pool or (r.randint(1, pool) <= hit)
+        hit *= 2 ** self._joker_types[OopsAllSixes]
+        if hit >= pool:
+            return True
+
+        match self._chance_mode:
+            case ChanceMode.EXPECTED:
+                # replay the outcomes of the branch being previewed, new rolls miss
+                i = len(self._chance_rolls)
+                self._chance_rolls.append(hit / pool)
+                return i < len(self._chance_outcomes) and self._chance_outcomes[i]
+            case ChanceMode.WORST:
+                return False
+
+        return self._random.randint(1, pool) <= hit
+
+    def _check_buy_shop_card(
+        self, shop_card_index: int, use: bool = False, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.IN_SHOP:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state IN_SHOP, got {}",
+                self._state,
+            )
+        if shop_card_index not in range(len(self._shop_cards)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Invalid shop card index {}, must be in range({})",
+                shop_card_index,
+                len(self._shop_cards),
+            )
 
-    def _close_pack(self) -> None:
-        self._hand = None
+        shop_card, cost = self._shop_cards[shop_card_index]
 
-        self._opened_pack = None
-        self._pack_items = None
-        self._pack_choices_left = None
-        self._hand = None
-        self._deck_cards_left = None
+        if self._available_money < cost:
+            return _error(
+                describe,
+                InsufficientFundsError,
+                "Insufficient funds to buy {!r}, cost: {}, available: {}",
+                shop_card,
+                cost,
+                self._available_money,
+            )
 
-        if self._shop_cards is None:
-            self._state = State.SELECTING_BLIND
+        if use:
+            if not isinstance(shop_card, Consumable):
+                return _error(
+                    describe,
+                    InvalidArgumentsError,
+                    "Cannot use non-Consumable {!r}",
+                    shop_card,
+                )
+            return self._check_consumable(shop_card, None, False, describe)
 
-            if self._tags and self._tags[-1] in TAG_PACKS:
-                self._open_pack(TAG_PACKS[self._tags.pop()])
-        else:
-            self._state = State.IN_SHOP
+        match shop_card:
+            case BalatroJoker():
+                if len(self._jokers) >= self.joker_slots + (
+                    shop_card.edition is Edition.NEGATIVE
+                ):
+                    return _error(
+                        describe,
+                        NotEnoughSpaceError,
+                        "Cannot buy {!r}, Joker slots full",
+                        shop_card,
+                    )
+            case Consumable():
+                if len(self._consumables) >= self.consumable_slots:
+                    return _error(
+                        describe,
+                        NotEnoughSpaceError,
+                        "Cannot buy {!r}, Consumable slots full",
+                        shop_card,
+                    )
 
-    def _create_joker(
-        self,
-        joker_type: type[BalatroJoker],
-        edition: Edition = Edition.BASE,
-        is_eternal: bool = False,
-        is_perishable: bool = False,
-        is_rental: bool = False,
-    ) -> BalatroJoker:
-        if self.challenge is Challenge.NON_PERISHABLE:
-            is_eternal = True
+        return None
 
-        joker = joker_type(
-            edition=edition,
-            is_eternal=is_eternal,
-            is_perishable=is_perishable,
-            is_rental=is_rental,
-        )
-        joker._on_created(self)
-        return joker
+    def _check_cash_out(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.CASHING_OUT:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Excpected state to be CASHING_OUT, but got {}",
+                self._state,
+            )
 
-    def _deal(self, after_hand_played: bool = False) -> bool:
-        hand_size = self.hand_size
+        return None
 
-        if (
-            not self._deck_cards_left
-            or hand_size <= 0
-            or self._hands is not None
-            and self._hands <= 0
-        ):
-            return False
+    def _check_choose_pack_item(
+        self,
+        item_index: int,
+        card_indices: list[int] | None = None,
+        describe: bool = False,
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.OPENING_PACK:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be OPENING_PACK, but got {}",
+                self._state,
+            )
+        if item_index not in range(len(self._pack_items)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Item index should be in range(len(pack_items)), but got {}",
+                item_index,
+            )
 
-        num_cards = min(
-            len(self._deck_cards_left),
-            (
-                3
-                if self._boss_blind_disabled is False
-                and self._blind is Blind.THE_SERPENT
-                and (not self._first_hand or not self._first_discard)
-                else max(0, hand_size - len(self._hand))
-            ),
-        )
+        item = self._pack_items[item_index]
 
-        deal_indices = sorted(
-            r.sample(range(len(self._deck_cards_left)), num_cards), reverse=True
-        )
-        for i in deal_indices:
-            dealt_card = self._deck_cards_left.pop(i)
+        match item:
+            case BalatroJoker():
+                if len(self._jokers) >= self.joker_slots + (
+                    item.edition is Edition.NEGATIVE
+                ):
+                    return _error(
+                        describe,
+                        NotEnoughSpaceError,
+                        "Cannot choose {!r}, Joker slots full",
+                        item,
+                    )
+            case Consumable():
+                return self._check_consumable(item, card_indices, False, describe)
 
-            if self.challenge is Challenge.X_RAY_VISION and self._chance(1, 4):
-                dealt_card.is_face_down = True
+        return None
 
-            if self._boss_blind_disabled is False:
-                match self._blind:
-                    case Blind.THE_HOUSE:
-                        if self._first_hand:
-                            dealt_card.is_face_down = True
-                    case Blind.THE_WHEEL:
-                        if self._chance(1, 7):
-                            dealt_card.is_face_down = True
-                    case Blind.THE_FISH:
-                        if after_hand_played:
-                            dealt_card.is_face_down = True
+    def _check_consumable(
+        self,
+        consumable: Consumable,
+        card_indices: list[int] | None,
+        owned: bool = True,
+        describe: bool = False,
+    ) -> type[BalatroError] | BalatroError | None:
+        if card_indices is not None:
+            if self._hand is None:
+                return _error(
+                    describe,
+                    InvalidArgumentsError,
+                    "Selected card indices should be None when there is no hand, but got {}",
+                    card_indices,
+                )
+            if not (1 <= len(card_indices) <= 5):
+                return _error(
+                    describe,
+                    InvalidArgumentsError,
+                    "Selected card indices should have length 1-5, but got {}",
+                    len(card_indices),
+                )
+            if any(i not in range(len(self._hand)) for i in card_indices):
+                return _error(
+                    describe,
+                    InvalidArgumentsError,
+                    "Selected cards indices should all be within the range of the hand, but got {}",
+                    card_indices,
+                )
+            if len(set(card_indices)) < len(card_indices):
+                return _error(
+                    describe,
+                    InvalidArgumentsError,
+                    "Selected card indices should all be unique, but got {}",
+                    card_indices,
+                )
 
-            self._hand.append(dealt_card)
+        min_cards, max_cards = CONSUMABLE_SELECTED_CARDS.get(consumable.card, (0, 0))
+        num_selected_cards = len(card_indices) if card_indices is not None else 0
+        if min_cards and not (min_cards <= num_selected_cards <= max_cards):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "{} requires {} selected card{}, but got {}",
+                consumable.card.value,
+                min_cards if min_cards == max_cards else f"{min_cards}-{max_cards}",
+                "s" if max_cards > 1 else "",
+                num_selected_cards,
+            )
 
-        self._sort_hand()
+        return self._consumable_error(consumable, owned, describe)
 
-        if self._boss_blind_disabled is False and self._blind is Blind.CERULEAN_BELL:
-            self._forced_selected_card_index = r.randint(0, len(self._hand) - 1)
+    def _check_discard(
+        self, discard_indices: list[int], describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.PLAYING_BLIND:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be PLAYING_BLIND, but got {}",
+                self._state,
+            )
+        if self._discards == 0:
+            return _error(describe, NoDiscardsRemainingError, "No discards left")
+        if not (1 <= len(discard_indices) <= 5):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Discard indices should have length 1-5, but got {}",
+                len(discard_indices),
+            )
+        if any(i not in range(len(self._hand)) for i in discard_indices):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Discard indices should all be within the range of the hand, but got {}",
+                discard_indices,
+            )
+        if len(set(discard_indices)) < len(discard_indices):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Discard indices should all be unique, but got {}",
+                discard_indices,
+            )
 
-        return True
+        return None
 
-    def _debuff_random_joker(self) -> None:
-        valid_debuff_jokers = [joker for joker in self._jokers if not joker.is_debuffed]
-        if valid_debuff_jokers:
-            for joker in self._jokers:
-                if joker.is_debuffed and joker.num_perishable_rounds_left > 0:
-                    joker.is_debuffed = False
-                    break
-            r.choice(valid_debuff_jokers).is_debuffed = True
+    def _check_move_joker(
+        self, old_index: int, new_index: int, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self.is_game_over:
+            return _error(
+                describe, IllegalActionError, "Expected state to not be GAME_OVER"
+            )
+        if old_index not in range(len(self._jokers)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Joker index should be in range(len(jokers)), but got {}",
+                old_index,
+            )
+        if new_index not in range(len(self._jokers)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "New index should be in range(len(jokers)), but got {}",
+                new_index,
+            )
+        if new_index == old_index:
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "New index should not be the same as the Joker index, but got {}, {}",
+                old_index,
+                new_index,
+            )
+        if self.challenge is Challenge.ON_A_KNIFES_EDGE and (
+            old_index == 0 or new_index == 0
+        ):
+            return _error(
+                describe,
+                PinnedJokerMovedError,
+                "Cannot move the pinned {!r} during {}",
+                self._jokers[0],
+                Challenge.ON_A_KNIFES_EDGE,
+            )
 
-    def _destroy_card(self, card: Card) -> None:
-        self._deck_cards.remove(card)
-        if card in self._hand:
-            self._hand.remove(card)
+        return None
 
-        for joker in self._jokers:
-            joker._on_card_destroyed(card)
+    def _check_next_round(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.IN_SHOP:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be IN_SHOP, but got {}",
+                self._state,
+            )
 
-    def _destroy_joker(self, joker: BalatroJoker) -> bool:
-        if joker.is_eternal:
-            return False
+        return None
 
-        self._jokers.remove(joker)
+    def _check_open_shop_pack(
+        self, shop_pack_index: int, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.IN_SHOP:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state IN_SHOP, got {}",
+                self._state,
+            )
+        if shop_pack_index not in range(len(self._shop_packs)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Invalid shop pack index {}, must be in range({})",
+                shop_pack_index,
+                len(self._shop_packs),
+            )
 
-        for other_joker in self._jokers:
-            other_joker._on_jokers_moved()
+        shop_pack, cost = self._shop_packs[shop_pack_index]
 
-        return True
+        if self._available_money < cost:
+            return _error(
+                describe,
+                InsufficientFundsError,
+                "Insufficient funds to buy {!r}, cost: {}, available: {}",
+                shop_pack,
+                cost,
+                self._available_money,
+            )
 
-    def _disable_boss_blind(self) -> None:
-        if self._boss_blind_disabled is not False:
-            return
+        return None
 
-        self._boss_blind_disabled = True
+    def _check_play_hand(
+        self, card_indices: list[int], describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.PLAYING_BLIND:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be PLAYING_BLIND, but got {}",
+                self._state,
+            )
+        if not (1 <= len(card_indices) <= 5):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Card indices should have length 1-5, but got {}",
+                len(card_indices),
+            )
+        if any(i not in range(len(self._hand)) for i in card_indices):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Card indices should all be within the range of the hand, but got {}",
+                card_indices,
+            )
+        if len(set(card_indices)) < len(card_indices):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Card indices should all be unique, but got {}",
+                card_indices,
+            )
+        if (
+            self._forced_selected_card_index is not None
+            and self._forced_selected_card_index not in card_indices
+        ):
+            return _error(
+                describe,
+                MissingForcedSelectedCardError,
+                "Forced selected card index {} not in card indices {}",
+                self._forced_selected_card_index,
+                card_indices,
+            )
 
-        for joker in self._jokers:
-            if joker.num_perishable_rounds_left > 0:
-                joker.is_debuffed = False
-            joker.is_flipped = False
+        return None
 
-        for card in self._deck_cards_left:
-            card.is_debuffed = False
-            card.is_face_down = False
+    def _check_redeem_shop_voucher(
+        self, shop_voucher_index: int, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.IN_SHOP:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state IN_SHOP, got {}",
+                self._state,
+            )
+        if shop_voucher_index not in range(len(self._shop_vouchers)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Invalid shop voucher index {}, must be in range({})",
+                shop_voucher_index,
+                len(self._shop_vouchers),
+            )
 
-        match self._blind:
-            case Blind.THE_WALL:
-                self._round_goal //= 2
-            case Blind.THE_WATER:
-                self._discards = self._discards_per_round
-            case Blind.THE_NEEDLE:
-                self._hands = self._hands_per_round
-            case Blind.VIOLET_VESSEL:
-                self._round_goal //= 3
-            case Blind.CERULEAN_BELL:
-                self._forced_selected_card_index = None
+        shop_voucher, cost = self._shop_vouchers[shop_voucher_index]
 
-    def _discard(self, discard_indices: list[int]) -> None:
-        discarded_cards = [self._hand[i] for i in discard_indices]
+        if self._available_money < cost:
+            return _error(
+                describe,
+                InsufficientFundsError,
+                "Insufficient funds to buy {!r}, cost: {}, available: {}",
+                shop_voucher,
+                cost,
+                self._available_money,
+            )
 
-        for i in sorted(discard_indices, reverse=True):
-            self._hand.pop(i)
+        return None
 
-        for joker in self._jokers[:]:
-            joker._on_discard(discarded_cards)
+    def _check_reroll(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.IN_SHOP:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be IN_SHOP, but got {}",
+                self._state,
+            )
 
-    def _end_hand(
-        self,
-        played_cards: list[Card],
-        scored_card_indices: list[int],
-        poker_hands_played: list[PokerHand],
-        hand_not_allowed: bool = False,
-    ) -> None:
-        if hand_not_allowed:
-            for joker in self._jokers:
-                joker._on_boss_blind_triggered()
+        reroll_cost = self.reroll_cost
 
-        if self._round_score >= self._round_goal:
-            self._end_round(poker_hands_played[0])
-            return
+        if self._available_money < reroll_cost:
+            return _error(
+                describe,
+                InsufficientFundsError,
+                "Cannot afford reroll cost {} with available money {}",
+                reroll_cost,
+                self._available_money,
+            )
 
-        if self._hands == 0:  # game over
+        return None
+
+    def _check_reroll_boss_blind(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.SELECTING_BLIND:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be SELECTING_BLIND, but got {}",
+                self._state,
+            )
+        if Voucher.DIRECTORS_CUT not in self._vouchers:
+            return _error(
+                describe,
+                IllegalBossRerollError,
+                "Cannot reroll boss blind without Director's Cut Voucher",
+            )
+        if Voucher.RETCON not in self._vouchers and self._rerolled_boss_blind:
+            return _error(
+                describe,
+                IllegalBossRerollError,
+                "Cannot reroll boss blind more than once per ante without Retcon Voucher",
+            )
+        if self._available_money < 10:
+            return _error(
+                describe,
+                InsufficientFundsError,
+                "Cannot afford boss blind reroll ($10) with available money {}",
+                self._available_money,
+            )
+
+        return None
+
+    def _check_select_blind(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.SELECTING_BLIND:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be SELECTING_BLIND, but got {}",
+                self._state,
+            )
+
+        return None
+
+    def _check_sell_consumable(
+        self, consumable_index: int, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self.is_game_over:
+            return _error(
+                describe, IllegalActionError, "Expected state to not be GAME_OVER"
+            )
+        if consumable_index not in range(len(self._consumables)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Consumable index should be in range(len({})), but got {}",
+                len(self._consumables),
+                consumable_index,
+            )
+
+        return None
+
+    def _check_sell_joker(
+        self, joker_index: int, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self.is_game_over:
+            return _error(
+                describe, IllegalActionError, "Expected state to not be GAME_OVER"
+            )
+        if joker_index not in range(len(self._jokers)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Joker index should be in range(len({})), but got {}",
+                len(self._jokers),
+                joker_index,
+            )
+        if self._jokers[joker_index].is_eternal:
+            return _error(
+                describe,
+                EternalJokerSoldError,
+                "Cannot sell eternal Joker {!r}",
+                self._jokers[joker_index],
+            )
+
+        return None
+
+    def _check_skip_blind(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.SELECTING_BLIND:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be SELECTING_BLIND, but got {}",
+                self._state,
+            )
+        if self._is_boss_blind:
+            return _error(
+                describe, IllegalSkipError, "Cannot skip boss blind {}", self._blind
+            )
+
+        return None
+
+    def _check_skip_pack(
+        self, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        if self._state is not State.OPENING_PACK:
+            return _error(
+                describe,
+                IllegalActionError,
+                "Expected state to be OPENING_PACK, but got {}",
+                self._state,
+            )
+
+        return None
+
+    def _check_use_consumable(
+        self,
+        consumable_index: int,
+        card_indices: list[int] | None = None,
+        describe: bool = False,
+    ) -> type[BalatroError] | BalatroError | None:
+        if self.is_game_over:
+            return _error(
+                describe, IllegalActionError, "Expected state to not be GAME_OVER"
+            )
+        if consumable_index not in range(len(self._consumables)):
+            return _error(
+                describe,
+                InvalidArgumentsError,
+                "Consumable index should be in range(len(consumables)), but got {}",
+                consumable_index,
+            )
+
+        return self._check_consumable(
+            self._consumables[consumable_index], card_indices, True, describe
+        )
+
+    def _clone_object(
+        self,
+        obj: BalatroJoker | Consumable | Card,
+        copies: dict[int, Run | BalatroJoker | Consumable],
+    ) -> BalatroJoker | Consumable | Card:
+        # cards are shared until a run changes them, see _unshare
+        if isinstance(obj, Card):
+            return obj
+
+        if id(obj) in copies:
+            return copies[id(obj)]
+
+        clone = object.__new__(type(obj))
+        copies[id(obj)] = clone
+
+        if isinstance(obj, BalatroJoker):
+            clone.__dict__ = {
+                name: (
+                    self._clone_object(value, copies)
+                    if isinstance(value, (Run, BalatroJoker))
+                    else value
+                )
+                for name, value in obj.__dict__.items()
+            }
+        else:
+            clone.__dict__ = obj.__dict__.copy()
+
+        return clone
+
+    def _close_pack(self) -> None:
+        self._hand = None
+
+        self._opened_pack = None
+        self._pack_items = None
+        self._pack_choices_left = None
+        self._hand = None
+        self._deck_cards_left = None
+
+        if self._shop_cards is None:
+            self._state = State.SELECTING_BLIND
+
+            if self._tags and self._tags[-1] in TAG_PACKS:
+                self._open_pack(TAG_PACKS[self._tags.pop()])
+        else:
+            self._state = State.IN_SHOP
+
+    def _compute_stats(self) -> dict[str, int]:
+        # the parts of the stats that only change with the deck, vouchers, Jokers and
+        # ante, the rest is applied on access
+        ruleset = self._ruleset
+        hand_size = ruleset.hand_size
+        hands_per_round = ruleset.hands_per_round
+        discards_per_round = ruleset.discards_per_round
+        joker_slots = (
+            0
+            if (self.challenge is Challenge.TYPECAST and self.ante > 4)
+            else ruleset.joker_slots
+        )
+        consumable_slots = ruleset.consumable_slots
+
+        if Voucher.PAINT_BRUSH in self._vouchers:
+            hand_size += 1
+        if Voucher.PALETTE in self._vouchers:
+            hand_size += 1
+        if Voucher.GRABBER in self._vouchers:
+            hands_per_round += 1
+        if Voucher.NACHO_TONG in self._vouchers:
+            hands_per_round += 1
+        if Voucher.HIEROGLYPH in self._vouchers:
+            hands_per_round -= 1
+        if Voucher.WASTEFUL in self._vouchers:
+            discards_per_round += 1
+        if Voucher.RECYCLOMANCY in self._vouchers:
+            discards_per_round += 1
+        if Voucher.PETROGLYPH in self._vouchers:
+            discards_per_round -= 1
+        if Voucher.ANTIMATTER in self._vouchers:
+            joker_slots += 1
+        if Voucher.CRYSTAL_BALL in self._vouchers:
+            consumable_slots += 1
+
+        for joker in self._jokers:
+            if joker.edition is Edition.NEGATIVE:
+                joker_slots += 1
+
+            if joker.is_debuffed:
+                continue
+
+            match joker:
+                case Stuntman():
+                    hand_size -= 2
+                case TurtleBean():
+                    hand_size += joker.hand_size_increase
+                case Juggler():
+                    hand_size += 1
+                case Drunkard():
+                    discards_per_round += 1
+                case MerryAndy():
+                    hand_size -= 1
+                    discards_per_round += 3
+                case Troubadour():
+                    hand_size += 2
+                    hands_per_round -= 1
+
+        return {
+            "consumable_slots": consumable_slots,
+            "discards_per_round": discards_per_round,
+            "hand_size": hand_size,
+            "hands_per_round": hands_per_round,
+            "joker_slots": joker_slots,
+        }
+
+    def _compute_samplers(self) -> dict[str, object]:
+        # the pools and cumulative weights of the random draws that depend on the
+        # vouchers, the fixed pools are in the ruleset (cumulative weights draw the same
+        # as the weights they are accumulated from)
+        shop_card_weights = SHOP_BASE_CARD_WEIGHTS.copy()
+        if Voucher.MAGIC_TRICK in self._vouchers:
+            shop_card_weights[Card] = 4
+        if Voucher.TAROT_TYCOON in self._vouchers:
+            shop_card_weights[Tarot] = 32
+        elif Voucher.TAROT_MERCHANT in self._vouchers:
+            shop_card_weights[Tarot] = 9.6
+        if Voucher.PLANET_TYCOON in self._vouchers:
+            shop_card_weights[Planet] = 32
+        elif Voucher.PLANET_MERCHANT in self._vouchers:
+            shop_card_weights[Planet] = 9.6
+        if self._deck is Deck.GHOST:
+            shop_card_weights[Spectral] = 2
+        if self.challenge in [Challenge.BRAM_POKER, Challenge.JOKERLESS]:
+            del shop_card_weights[BalatroJoker]
+
+        card_edition_chances = (
+            CARD_EDITION_CHANCES_GLOW_UP
+            if Voucher.GLOW_UP in self._vouchers
+            else (
+                CARD_EDITION_CHANCES_HONE
+                if Voucher.HONE in self._vouchers
+                else CARD_EDITION_CHANCES
+            )
+        )
+        joker_edition_chances = (
+            JOKER_EDITION_CHANCES_GLOW_UP
+            if Voucher.GLOW_UP in self._vouchers
+            else (
+                JOKER_EDITION_CHANCES_HONE
+                if Voucher.HONE in self._vouchers
+                else JOKER_EDITION_CHANCES
+            )
+        )
+
+        voucher_list = list(Voucher)
+        vouchers = []
+        for base_voucher, upgraded_voucher in zip(voucher_list[:16], voucher_list[16:]):
+            if upgraded_voucher in self._vouchers:
+                continue
+
+            voucher = (
+                upgraded_voucher if base_voucher in self._vouchers else base_voucher
+            )
+            if voucher in self._ruleset.vouchers:
+                vouchers.append(voucher)
+
+        def cumulative(weights):
+            return list(weights), list(accumulate(weights.values()))
+
+        return {
+            "card_editions": cumulative(card_edition_chances),
+            "illusion_editions": cumulative(CARD_EDITION_CHANCES_ILLUSION),
+            "joker_editions": cumulative(joker_edition_chances),
+            "joker_rarities": cumulative(JOKER_BASE_RARITY_WEIGHTS),
+            "shop_cards": cumulative(shop_card_weights),
+            "vouchers": vouchers,
+        }
+
+    def _consumable_error(
+        self, consumable: Consumable, owned: bool = True, describe: bool = False
+    ) -> type[BalatroError] | BalatroError | None:
+        # owned consumables are removed from the consumable slots while being used
+        match consumable.card:
+            case Tarot.THE_FOOL:
+                if self._fool_next in [None, Tarot.THE_FOOL]:
+                    return _error(
+                        describe,
+                        IllegalFoolUseError,
+                        "Cannot use The Fool without a valid consumable to create, got {}",
+                        self._fool_next,
+                    )
+                if len(self._consumables) - owned >= self.consumable_slots - (
+                    owned and consumable.is_negative
+                ):
+                    return _error(
+                        describe,
+                        NotEnoughSpaceError,
+                        "Cannot use The Fool when consumable slots are full",
+                    )
+            case Tarot.THE_WHEEL_OF_FORTUNE | Spectral.HEX:
+                if all(joker.edition is not Edition.BASE for joker in self._jokers):
+                    return _error(
+                        describe,
+                        NoValidJokersError,
+                        "{} requires at least one base Joker to use",
+                        consumable.card.value,
+                    )
+            case Tarot.JUDGEMENT | Spectral.WRAITH | Spectral.THE_SOUL:
+                if len(self._jokers) >= self.joker_slots:
+                    return _error(
+                        describe,
+                        NotEnoughSpaceError,
+                        "{} requires an empty Joker slot to use",
+                        consumable.card.value,
+                    )
+            case (
+                Spectral.FAMILIAR
+                | Spectral.GRIM
+                | Spectral.INCANTATION
+                | Spectral.SIGIL
+                | Spectral.IMMOLATE
+            ):
+                if not self._hand:
+                    return _error(
+                        describe,
+                        IllegalActionError,
+                        "{} requires a hand to use",
+                        consumable.card.value,
+                    )
+            case Spectral.OUIJA:
+                if not self._hand:
+                    return _error(
+                        describe, IllegalActionError, "Ouija requires a hand to use"
+                    )
+                if self.hand_size == 1:
+                    return _error(
+                        describe,
+                        HandSizeOfOneError,
+                        "Ouija requires a hand size greater than 1 to use",
+                    )
+            case Spectral.ECTOPLASM:
+                if not self._jokers:
+                    return _error(
+                        describe,
+                        NoValidJokersError,
+                        "Ectoplasm requires a Joker to use",
+                    )
+                if self.hand_size == 1:
+                    return _error(
+                        describe,
+                        HandSizeOfOneError,
+                        "Ectoplasm requires a hand size greater than 1 to use",
+                    )
+            case Spectral.ANKH:
+                if not self._jokers:
+                    return _error(
+                        describe, NoValidJokersError, "Ankh requires a Joker to use"
+                    )
+                if (
+                    self.joker_slots
+                    - len(self._jokers)
+                    + sum(not joker.is_eternal for joker in self._jokers)
+                    < 1
+                ):
+                    return _error(
+                        describe,
+                        NotEnoughSpaceError,
+                        "Ankh cannot make room for a new Joker",
+                    )
+
+        return None
+
+    def _consumable_selected_cards(
+        self, consumable: Consumable, owned: bool = True
+    ) -> tuple[int, int] | None:
+        # the range of cards in hand the consumable can be used on, or none if it
+        # cannot be used right now
+        if self._consumable_error(consumable, owned) is not None:
+            return None
+
+        min_cards, max_cards = CONSUMABLE_SELECTED_CARDS.get(consumable.card, (0, 0))
+        num_hand_cards = len(self._hand) if self._hand is not None else 0
+        if min_cards > num_hand_cards:
+            return None
+
+        return min_cards, min(max_cards, num_hand_cards)
+
+    def _compute_copy_targets(self) -> dict[CopyJoker, BalatroJoker | None]:
+        # the Joker each copy Joker ends up copying, which only changes when the Jokers
+        # move or are debuffed
+        return {
+            joker: joker._resolve_copy_target()
+            for joker in self._jokers
+            if isinstance(joker, CopyJoker)
+        }
+
+    def _compute_deck_counts(self) -> dict[str, Counter]:
+        # histograms of the full deck, ranks and suits only count the cards that have
+        # them (neither debuffed nor Stone Cards)
+        ranks, suits = Counter(), Counter()
+        enhancements, seals, editions = Counter(), Counter(), Counter()
+        for card in self._deck_cards:
+            if not card.is_debuffed and card.enhancement is not Enhancement.STONE:
+                ranks[card.rank] += 1
+                suits[card.suit] += 1
+            enhancements[card.enhancement] += 1
+            seals[card.seal] += 1
+            editions[card.edition] += 1
+
+        return {
+            "editions": editions,
+            "enhancements": enhancements,
+            "ranks": ranks,
+            "seals": seals,
+            "suits": suits,
+        }
+
+    def _create_joker(
+        self,
+        joker_type: type[BalatroJoker],
+        edition: Edition = Edition.BASE,
+        is_eternal: bool = False,
+        is_perishable: bool = False,
+        is_rental: bool = False,
+    ) -> BalatroJoker:
+        if self.challenge is Challenge.NON_PERISHABLE:
+            is_eternal = True
+
+        joker = joker_type(
+            edition=edition,
+            is_eternal=is_eternal,
+            is_perishable=is_perishable,
+            is_rental=is_rental,
+        )
+        joker._on_created(self)
+        return joker
+
+    def _deal(self, after_hand_played: bool = False) -> bool:
+        hand_size = self.hand_size
+
+        if (
+            not self._deck_cards_left
+            or hand_size <= 0
+            or self._hands is not None
+            and self._hands <= 0
+        ):
+            return False
+
+        num_cards = min(
+            len(self._deck_cards_left),
+            (
+                3
+                if self._boss_blind_disabled is False
+                and self._blind is Blind.THE_SERPENT
+                and (not self._first_hand or not self._first_discard)
+                else max(0, hand_size - len(self._hand))
+            ),
+        )
+
+        # a partial Fisher-Yates shuffle, each dealt card is swapped to the end of the
+        # deck and popped from there
+        deck_cards_left = self._deck_cards_left
+        dealt_cards = []
+        for _ in range(num_cards):
+            i = self._random.randrange(len(deck_cards_left))
+            deck_cards_left[i], deck_cards_left[-1] = (
+                deck_cards_left[-1],
+                deck_cards_left[i],
+            )
+            dealt_cards.append(deck_cards_left.pop())
+
+        num_sorted = len(self._hand)
+        for dealt_card in dealt_cards:
+            if self.challenge is Challenge.X_RAY_VISION and self._chance(1, 4):
+                dealt_card.is_face_down = True
+
+            if self._boss_blind_disabled is False:
+                match self._blind:
+                    case Blind.THE_HOUSE:
+                        if self._first_hand:
+                            dealt_card.is_face_down = True
+                    case Blind.THE_WHEEL:
+                        if self._chance(1, 7):
+                            dealt_card.is_face_down = True
+                    case Blind.THE_FISH:
+                        if after_hand_played:
+                            dealt_card.is_face_down = True
+
+            self._hand.append(dealt_card)
+
+        self._sort_hand(num_sorted)
+
+        if self._boss_blind_disabled is False and self._blind is Blind.CERULEAN_BELL:
+            self._forced_selected_card_index = self._random.randint(
+                0, len(self._hand) - 1
+            )
+
+        return True
+
+    def _debuff_random_joker(self) -> None:
+        valid_debuff_jokers = [joker for joker in self._jokers if not joker.is_debuffed]
+        if valid_debuff_jokers:
+            for joker in self._jokers:
+                if joker.is_debuffed and joker.num_perishable_rounds_left > 0:
+                    joker.is_debuffed = False
+                    break
+            self._random.choice(valid_debuff_jokers).is_debuffed = True
+            self._update_joker_types()
+            self._stats_cache = None
+            self._copy_targets_cache = None
+
+    def _destroy_card(self, card: Card) -> None:
+        self._deck_cards.remove(card)
+        self._deck_counts_cache = None
+        if card in self._hand:
+            self._hand.remove(card)
+
+        for joker in self._joker_hooks["_on_card_destroyed"]:
+            joker._on_card_destroyed(card)
+
+    def _destroy_joker(self, joker: BalatroJoker) -> bool:
+        if joker.is_eternal:
+            return False
+
+        self._jokers.remove(joker)
+        self._update_joker_hooks()
+        self._update_joker_types()
+        self._stats_cache = None
+
+        for other_joker in self._jokers:
+            other_joker._on_jokers_moved()
+        self._copy_targets_cache = None
+
+        return True
+
+    def _disable_boss_blind(self) -> None:
+        if self._boss_blind_disabled is not False:
+            return
+
+        self._boss_blind_disabled = True
+
+        for joker in self._jokers:
+            if joker.num_perishable_rounds_left > 0:
+                joker.is_debuffed = False
+            joker.is_flipped = False
+        self._update_joker_types()
+        self._stats_cache = None
+        self._copy_targets_cache = None
+
+        for card in self._deck_cards_left:
+            card.is_debuffed = False
+            card.is_face_down = False
+        self._deck_counts_cache = None
+
+        match self._blind:
+            case Blind.THE_WALL:
+                self._round_goal //= 2
+            case Blind.THE_WATER:
+                self._discards = self._discards_per_round
+            case Blind.THE_NEEDLE:
+                self._hands = self._hands_per_round
+            case Blind.VIOLET_VESSEL:
+                self._round_goal //= 3
+            case Blind.CERULEAN_BELL:
+                self._forced_selected_card_index = None
+
+    def _discard(self, discard_indices: list[int]) -> None:
+        discarded_cards = [self._hand[i] for i in discard_indices]
+
+        for i in sorted(discard_indices, reverse=True):
+            self._hand.pop(i)
+
+        for joker in self._jokers[:]:
+            joker._on_discard(discarded_cards)
+
+    def _end_hand(
+        self,
+        played_cards: list[Card],
+        scored_card_indices: list[int],
+        poker_hands_played: list[PokerHand],
+        hand_not_allowed: bool = False,
+    ) -> None:
+        if hand_not_allowed:
+            for joker in self._joker_hooks["_on_boss_blind_triggered"]:
+                joker._on_boss_blind_triggered()
+
+        if self._round_score >= self._round_goal:
+            self._end_round(poker_hands_played[0])
+            return
+
+        if self._hands == 0:  # game over
             if self._round_score >= self._round_goal // 4:
                 for joker in self._jokers:
                     if joker == MrBones:  # saved by mr. bones
@@ -454,7 +1436,7 @@ class Run:
             if held_card == Seal.RED:
                 self._trigger_held_card_round_end(held_card, last_poker_hand_played)
 
-            for joker in self._jokers:
+            for joker in self._joker_hooks["_on_card_held_retriggers"]:
                 for _ in range(joker._on_card_held_retriggers(held_card)):
                     self._trigger_held_card_round_end(held_card, last_poker_hand_played)
 
@@ -493,7 +1475,7 @@ class Run:
                 self._deck is Deck.GREEN
                 or self.challenge in [Challenge.THE_OMELETTE, Challenge.MAD_WORLD]
             )
-            else (1 + self._jokers.count(ToTheMoon))
+            else (1 + self._joker_types[ToTheMoon])
         ), (
             20
             if Voucher.MONEY_TREE in self._vouchers
@@ -529,7 +1511,7 @@ class Run:
         return (
             0
             if (
-                (self._stake >= Stake.RED and blind is Blind.SMALL_BLIND)
+                (not self._ruleset.small_blind_reward and blind is Blind.SMALL_BLIND)
                 or self.challenge is Challenge.THE_OMELETTE
                 or (self.challenge is Challenge.CRUELTY and not self._is_boss_blind)
             )
@@ -541,7 +1523,7 @@ class Run:
             return []
         if card == Enhancement.WILD:
             return list(Suit)
-        if SmearedJoker in self._jokers:
+        if SmearedJoker in self._joker_types:
             red_suits, black_suits = [Suit.HEARTS, Suit.DIAMONDS], [
                 Suit.SPADES,
                 Suit.CLUBS,
@@ -550,119 +1532,18 @@ class Run:
         return [card.suit]
 
     def _get_poker_hands(self, played_cards: list[Card]) -> dict[PokerHand, list[int]]:
-        poker_hands = {}
-
-        flush_straight_len = 4 if (FourFingers in self._jokers) else 5
-        max_straight_gap = 2 if (Shortcut in self._jokers) else 1
-
-        suit_counts = Counter()
-        for played_card in played_cards:
-            suit_counts.update(self._get_card_suits(played_card, force_base_suit=True))
-
-        # flush check
-        flush_suit, flush_suit_count = (
-            suit_counts.most_common(1)[0] if suit_counts else (None, 0)
+        return get_poker_hands(
+            played_cards,
+            four_fingers=FourFingers in self._joker_types,
+            shortcut=Shortcut in self._joker_types,
+            smeared=SmearedJoker in self._joker_types,
         )
-        if flush_suit_count >= flush_straight_len:  # flush
-            poker_hands[PokerHand.FLUSH] = [
-                i
-                for i, card in enumerate(played_cards)
-                if flush_suit in self._get_card_suits(card, force_base_suit=True)
-            ]
-
-        rank_counts = Counter(
-            played_card.rank
-            for played_card in played_cards
-            if not played_card.is_stone_card
-        )
-
-        # straight check
-        if len(rank_counts) >= flush_straight_len:
-            sorted_ranks = sorted(rank_counts)
-
-            longest_straight = set()
-            cur_straight = set()
-            for i in range(len(sorted_ranks)):
-                cur_straight.add(sorted_ranks[i])
-                if len(cur_straight) > len(longest_straight):
-                    longest_straight = cur_straight
-                if (
-                    i < len(sorted_ranks) - 1
-                    and int(sorted_ranks[i + 1]) - int(sorted_ranks[i])
-                    > max_straight_gap
-                ):
-                    cur_straight = set()
-
-            if (
-                int(min(longest_straight)) <= max_straight_gap + 1
-                and Rank.ACE in rank_counts
-            ):
-                longest_straight.add(Rank.ACE)
-
-            if len(longest_straight) >= flush_straight_len:  # straight
-                straight_indices = [
-                    i
-                    for i, card in enumerate(played_cards)
-                    if card.rank in longest_straight
-                ]
-                if PokerHand.FLUSH in poker_hands:  # straight flush
-                    poker_hands[PokerHand.STRAIGHT_FLUSH] = straight_indices
-                poker_hands[PokerHand.STRAIGHT] = straight_indices
-
-        # rank-matching checks
-        for rank, n in rank_counts.most_common():
-            if n == 5:  # 5oak
-                poker_hands[PokerHand.FIVE_OF_A_KIND] = list(range(5))
-                if PokerHand.FLUSH in poker_hands:  # flush five
-                    poker_hands[PokerHand.FLUSH_FIVE] = list(range(5))
-            if n >= 4:  # 4oak
-                poker_hands[PokerHand.FOUR_OF_A_KIND] = [
-                    i for i, card in enumerate(played_cards) if card.rank is rank
-                ][:4]
-            if n >= 3:  # 3oak
-                poker_hands[PokerHand.THREE_OF_A_KIND] = [
-                    i for i, card in enumerate(played_cards) if card.rank is rank
-                ][:3]
-            if n >= 2:  # pair
-                if (
-                    PokerHand.THREE_OF_A_KIND in poker_hands
-                    and played_cards[poker_hands[PokerHand.THREE_OF_A_KIND][0]].rank
-                    is not rank
-                ):  # full house
-                    poker_hands[PokerHand.FULL_HOUSE] = list(range(5))
-                    if PokerHand.FLUSH in poker_hands:  # flush house
-                        poker_hands[PokerHand.FLUSH_HOUSE] = list(range(5))
-                if PokerHand.PAIR in poker_hands:  # two pair
-                    poker_hands[PokerHand.TWO_PAIR] = (
-                        poker_hands[PokerHand.PAIR]
-                        + [
-                            i
-                            for i, card in enumerate(played_cards)
-                            if card.rank is rank
-                        ][:2]
-                    )
-                poker_hands[PokerHand.PAIR] = [
-                    i for i, card in enumerate(played_cards) if card.rank is rank
-                ][:2]
-
-        # high card
-        if not rank_counts:
-            # (all stone cards - default to high card)
-            poker_hands[PokerHand.HIGH_CARD] = []
-        else:
-            poker_hands[PokerHand.HIGH_CARD] = [
-                i
-                for i, card in enumerate(played_cards)
-                if card.rank is max(rank_counts)
-            ][:1]
-
-        return poker_hands
 
     def _get_random_card(self, ranks: list[Rank] | None = None) -> Card:
         if ranks is None:
             ranks = list(Rank)
 
-        card = Card(r.choice(ranks), r.choice(list(Suit)))
+        card = Card(self._random.choice(ranks), self._random.choice(list(Suit)))
 
         return card
 
@@ -672,39 +1553,29 @@ class Run:
         allow_black_hole: bool = False,
         allow_the_soul: bool = False,
     ) -> Consumable:
+        ruleset = self._ruleset
         if (
             allow_black_hole
-            and (
-                not isinstance(self, ChallengeRun)
-                or Spectral.BLACK_HOLE
-                not in CHALLENGE_SETUPS[self._challenge].banned_consumable_cards
-            )
-            and r.random() < 0.003
+            and ruleset.allow_black_hole
+            and self._random.random() < 0.003
         ):
             return Consumable(Spectral.BLACK_HOLE)
-        if (
-            allow_the_soul
-            and (
-                not isinstance(self, ChallengeRun)
-                or Spectral.THE_SOUL
-                not in CHALLENGE_SETUPS[self._challenge].banned_consumable_cards
-            )
-            and r.random() < 0.003
-        ):
+        if allow_the_soul and ruleset.allow_the_soul and self._random.random() < 0.003:
             return Consumable(Spectral.THE_SOUL)
 
-        if consumable_type is Tarot:
-            consumable_card_pool = list(Tarot)
-        elif consumable_type is Planet:
+        if consumable_type is Planet:
             consumable_card_pool = [
-                unlocked_poker_hand.planet
-                for unlocked_poker_hand in self._unlocked_poker_hands
+                planet
+                for i, poker_hand, planet in ruleset.planets
+                if i > 2 or self._poker_hand_info[poker_hand][1] > 0
             ]
-        elif consumable_type is Spectral:
-            consumable_card_pool = list(Spectral)[:-2]
+        elif consumable_type is Tarot:
+            consumable_card_pool = ruleset.tarots
+        else:
+            consumable_card_pool = ruleset.spectrals
 
         prohibited_consumable_cards = set()
-        if Showman not in self._jokers:
+        if Showman not in self._joker_types:
             prohibited_consumable_cards.update(
                 consumable.card for consumable in self.consumables
             )
@@ -728,14 +1599,9 @@ class Run:
             consumable_card
             for consumable_card in consumable_card_pool
             if consumable_card not in prohibited_consumable_cards
-            and (
-                not isinstance(self, ChallengeRun)
-                or consumable_card
-                not in CHALLENGE_SETUPS[self._challenge].banned_consumable_cards
-            )
         ]
         return Consumable(
-            r.choice(valid_consumable_cards)
+            self._random.choice(valid_consumable_cards)
             if valid_consumable_cards
             else consumable_type.DEFAULT
         )
@@ -745,15 +1611,13 @@ class Run:
         rarity: Rarity | None = None,
         allow_stickers: bool = False,
     ) -> BalatroJoker:
+        samplers = self._samplers
         if rarity is None:
-            rarity = r.choices(
-                list(JOKER_BASE_RARITY_WEIGHTS),
-                weights=JOKER_BASE_RARITY_WEIGHTS.values(),
-                k=1,
-            )[0]
+            rarities, cum_weights = samplers["joker_rarities"]
+            rarity = self._random.choices(rarities, cum_weights=cum_weights, k=1)[0]
 
         prohibited_joker_types = set()
-        if Showman not in self._jokers:
+        if Showman not in self._joker_types:
             prohibited_joker_types.update(type(joker) for joker in self.jokers)
 
             if self._shop_cards is not None:
@@ -775,11 +1639,7 @@ class Run:
             prohibited_joker_types.add(GrosMichel)
         if not self._gros_michel_extinct:
             prohibited_joker_types.add(Cavendish)
-        deck_card_enhancements = {
-            deck_card.enhancement
-            for deck_card in self._deck_cards
-            if deck_card.enhancement is not None
-        }
+        deck_card_enhancements = self._deck_counts["enhancements"]
         if Enhancement.GOLD not in deck_card_enhancements:
             prohibited_joker_types.add(GoldenTicket)
         if Enhancement.STEEL not in deck_card_enhancements:
@@ -793,46 +1653,33 @@ class Run:
 
         valid_joker_types = [
             joker_type
-            for joker_type in JOKER_RARITIES[rarity]
+            for joker_type in self._ruleset.joker_types[rarity]
             if joker_type not in prohibited_joker_types
-            and (
-                not isinstance(self, ChallengeRun)
-                or joker_type
-                not in CHALLENGE_SETUPS[self._challenge].banned_joker_types
-            )
         ]
-        joker_type = r.choice(valid_joker_types) if valid_joker_types else Joker
-
-        edition_chances = (
-            JOKER_EDITION_CHANCES_GLOW_UP
-            if Voucher.GLOW_UP in self._vouchers
-            else (
-                JOKER_EDITION_CHANCES_HONE
-                if Voucher.HONE in self._vouchers
-                else JOKER_EDITION_CHANCES
-            )
+        joker_type = (
+            self._random.choice(valid_joker_types) if valid_joker_types else Joker
         )
-        edition = r.choices(
-            list(edition_chances), weights=edition_chances.values(), k=1
-        )[0]
+
+        editions, cum_weights = samplers["joker_editions"]
+        edition = self._random.choices(editions, cum_weights=cum_weights, k=1)[0]
 
         is_eternal, is_perishable, is_rental = False, False, False
         if allow_stickers:
-            eternal_perishable_roll = r.random()
+            eternal_perishable_roll = self._random.random()
             if (
-                self._stake >= Stake.BLACK
+                self._ruleset.eternal_stickers
                 and joker_type not in NON_ETERNAL_JOKERS
                 and eternal_perishable_roll < 0.3
             ):
                 is_eternal = True
             elif (
-                self._stake >= Stake.ORANGE
+                self._ruleset.perishable_stickers
                 and joker_type not in NON_PERISHABLE_JOKERS
                 and eternal_perishable_roll < 0.6
             ):
                 is_perishable = True
 
-            if self._stake is Stake.GOLD and r.random() < 0.3:
+            if self._ruleset.rental_stickers and self._random.random() < 0.3:
                 is_rental = True
 
         return self._create_joker(
@@ -843,24 +1690,44 @@ class Run:
             is_rental=is_rental,
         )
 
-    def _get_round_goal(self, blind: Blind) -> float:
+    def _get_round_goal(self, blind: Blind) -> float | BigNumber:
+        base_chips = self._ruleset.ante_base_chips[self.ante]
+        if self._big_numbers:
+            return (
+                BigNumber(base_chips)
+                * BLIND_INFO[blind][1]
+                * self._ruleset.round_goal_scale
+            ).narrow()
+
         round_goal = (
-            float(
-                ANTE_BASE_CHIPS[
-                    (
-                        2
-                        if self._stake >= Stake.PURPLE
-                        else 1 if self._stake >= Stake.GREEN else 0
-                    )
-                ][self.ante]
-            )
-            * BLIND_INFO[blind][1]
-        ) * (2 if self._deck is Deck.PLASMA else 1)
+            float(base_chips) * BLIND_INFO[blind][1]
+        ) * self._ruleset.round_goal_scale
 
         return float("nan") if round_goal == float("inf") else round_goal
 
+    def _is_hand_allowed(self, poker_hand: PokerHand, num_cards: int) -> bool:
+        if self._boss_blind_disabled is not False:
+            return True
+
+        match self._blind:
+            case Blind.THE_PSYCHIC:
+                return num_cards >= 5
+            case Blind.THE_EYE:
+                return poker_hand not in self._round_poker_hands
+            case Blind.THE_MOUTH:
+                return (
+                    not self._round_poker_hands
+                    or poker_hand is self._round_poker_hands[0]
+                )
+
+        return True
+
     def _is_face_card(self, card: Card) -> bool:
-        return not card.is_debuffed and card.rank.is_face or Pareidolia in self._jokers
+        return (
+            not card.is_debuffed
+            and card.rank.is_face
+            or Pareidolia in self._joker_types
+        )
 
     def _lucky_check(self) -> bool:
         triggered = False
@@ -876,26 +1743,19 @@ class Run:
 
     def _new_ante(self) -> None:
         self._ante += 1
+        self._stats_cache = None
 
         self._ante_tags: list[
             tuple[Tag, PokerHand | None], tuple[Tag, PokerHand | None]
         ] = [None, None]
         for i in range(2):
-            tag = r.choice(
-                [
-                    tag
-                    for tag in Tag
-                    if (self._ante > 1 or tag not in PROHIBITED_ANTE_1_TAGS)
-                    and (
-                        not isinstance(self, ChallengeRun)
-                        or tag not in CHALLENGE_SETUPS[self._challenge].banned_tags
-                    )
-                ]
+            tag = self._random.choice(
+                self._ruleset.tags if self._ante > 1 else self._ruleset.ante_1_tags
             )
 
             orbital_hand = None
             if tag is Tag.ORBITAL:
-                orbital_hand = r.choice(self._unlocked_poker_hands)
+                orbital_hand = self._random.choice(self._unlocked_poker_hands)
 
             self._ante_tags[i] = (tag, orbital_hand)
 
@@ -952,7 +1812,7 @@ class Run:
                             (
                                 Spectral
                                 if Voucher.OMEN_GLOBE in self._vouchers
-                                and r.random() < 0.2
+                                and self._random.random() < 0.2
                                 else Tarot
                             ),
                             allow_the_soul=True,
@@ -984,25 +1844,17 @@ class Run:
                 if not self._deal():
                     self._game_over()
             case Pack.STANDARD | Pack.JUMBO_STANDARD | Pack.MEGA_STANDARD:
-                edition_chances = (
-                    CARD_EDITION_CHANCES_GLOW_UP
-                    if Voucher.GLOW_UP in self._vouchers
-                    else (
-                        CARD_EDITION_CHANCES_HONE
-                        if Voucher.HONE in self._vouchers
-                        else CARD_EDITION_CHANCES
-                    )
-                )
+                editions, cum_weights = self._samplers["card_editions"]
 
                 while len(self._pack_items) < of_up_to:
                     pack_card = self._get_random_card()
-                    pack_card.edition = r.choices(
-                        list(edition_chances), weights=edition_chances.values(), k=1
+                    pack_card.edition = self._random.choices(
+                        editions, cum_weights=cum_weights, k=1
                     )[0]
-                    if r.random() < 0.4:
-                        pack_card.enhancement = r.choice(list(Enhancement))
-                    if r.random() < 0.2:
-                        pack_card.seal = r.choice(list(Seal))
+                    if self._random.random() < 0.4:
+                        pack_card.enhancement = self._random.choice(list(Enhancement))
+                    if self._random.random() < 0.2:
+                        pack_card.seal = self._random.choice(list(Seal))
 
                     self._pack_items.append(pack_card)
 
@@ -1014,11 +1866,7 @@ class Run:
 
         self._reroll_cost = max(
             0,
-            (
-                CHALLENGE_SETUPS[self._challenge].base_reroll_cost
-                if isinstance(self, ChallengeRun)
-                else 5
-            )
+            self._ruleset.base_reroll_cost
             - 2 * (Voucher.REROLL_SURPLUS in self._vouchers)
             - 2 * (Voucher.REROLL_GLUT in self._vouchers),
         )
@@ -1040,55 +1888,22 @@ class Run:
 
         # TODO: run out of vouchers (bunch of voucher tags)
         if needed_vouchers > 0:
-            voucher_list = list(Voucher)
-            possible_vouchers = []
-            for base_voucher, upgraded_voucher in zip(
-                voucher_list[:16], voucher_list[16:]
-            ):
-                if upgraded_voucher in self._vouchers:
-                    continue
-
-                possible_voucher = (
-                    upgraded_voucher if base_voucher in self._vouchers else base_voucher
-                )
-
-                if (
-                    possible_voucher in self._shop_vouchers
-                    or isinstance(self, ChallengeRun)
-                    and possible_voucher
-                    in CHALLENGE_SETUPS[self._challenge].banned_vouchers
-                ):
-                    continue
-
-                possible_vouchers.append(possible_voucher)
+            possible_vouchers = [
+                voucher
+                for voucher in self._samplers["vouchers"]
+                if voucher not in self._shop_vouchers
+            ]
 
             for _ in range(needed_vouchers):
-                voucher = r.choice(possible_vouchers)
+                voucher = self._random.choice(possible_vouchers)
                 buy_cost = self._calculate_buy_cost(voucher) + self._inflation_amount
                 self._shop_vouchers.append((voucher, buy_cost))
                 possible_vouchers.remove(voucher)
 
-        shop_base_pack_weights = [
-            (
-                weight
-                if (
-                    not isinstance(self, ChallengeRun)
-                    or pack not in CHALLENGE_SETUPS[self._challenge].banned_packs
-                )
-                else 0
-            )
-            for pack, weight in SHOP_BASE_PACK_WEIGHTS.items()
-        ]
-        self._shop_packs = r.choices(
-            list(SHOP_BASE_PACK_WEIGHTS),
-            weights=shop_base_pack_weights,
-            k=2,
-        )
+        packs, cum_weights = self._ruleset.shop_packs
+        self._shop_packs = self._random.choices(packs, cum_weights=cum_weights, k=2)
 
-        if self._round == 1 and (
-            not isinstance(self, ChallengeRun)
-            or Pack.BUFFOON not in CHALLENGE_SETUPS[self._challenge].banned_packs
-        ):
+        if self._round == 1 and self._ruleset.allow_buffoon_pack:
             self._shop_packs[0] = Pack.BUFFOON
 
         for i, pack in enumerate(self._shop_packs):
@@ -1098,22 +1913,7 @@ class Run:
             self._shop_packs[i] = (pack, buy_cost)
 
     def _populate_shop_cards(self, coupon: bool = False) -> None:
-        shop_card_weights = SHOP_BASE_CARD_WEIGHTS.copy()
-        if Voucher.MAGIC_TRICK in self._vouchers:
-            shop_card_weights[Card] = 4
-        if Voucher.TAROT_TYCOON in self._vouchers:
-            shop_card_weights[Tarot] = 32
-        elif Voucher.TAROT_MERCHANT in self._vouchers:
-            shop_card_weights[Tarot] = 9.6
-        if Voucher.PLANET_TYCOON in self._vouchers:
-            shop_card_weights[Planet] = 32
-        elif Voucher.PLANET_MERCHANT in self._vouchers:
-            shop_card_weights[Planet] = 9.6
-        if self._deck is Deck.GHOST:
-            shop_card_weights[Spectral] = 2
-        if self.challenge in [Challenge.BRAM_POKER, Challenge.JOKERLESS]:
-            del shop_card_weights[BalatroJoker]
-
+        samplers = self._samplers
         if self._shop_cards is None:
             self._shop_cards = []
 
@@ -1123,12 +1923,9 @@ class Run:
             else 3 if Voucher.OVERSTOCK in self._vouchers else 2
         ) - len(self._shop_cards)
 
+        shop_card_types, cum_weights = samplers["shop_cards"]
         self._shop_cards.extend(
-            r.choices(
-                list(shop_card_weights),
-                weights=shop_card_weights.values(),
-                k=k,
-            )
+            self._random.choices(shop_card_types, cum_weights=cum_weights, k=k)
         )
         joker_tags_used = 0
         for tag in self._tags:
@@ -1186,16 +1983,15 @@ class Run:
                 case Card.__name__:
                     card = self._get_random_card()
                     if Voucher.ILLUSION in self._vouchers:
-                        card.edition = r.choices(
-                            list(CARD_EDITION_CHANCES_ILLUSION),
-                            weights=CARD_EDITION_CHANCES_ILLUSION.values(),
-                            k=1,
+                        editions, cum_weights = samplers["illusion_editions"]
+                        card.edition = self._random.choices(
+                            editions, cum_weights=cum_weights, k=1
                         )[0]
-                        if r.random() < 0.4:
-                            card.enhancement = r.choice(list(Enhancement))
+                        if self._random.random() < 0.4:
+                            card.enhancement = self._random.choice(list(Enhancement))
                         # not in the Lua code despite it being in the voucher description (bug?)
-                        # if r.random() < 0.2:
-                        #     card.seal = r.choice(list(Seal))
+                        # if self._random.random() < 0.2:
+                        #     card.seal = self._random.choice(list(Seal))
                     buy_cost = (
                         0
                         if coupon
@@ -1203,32 +1999,85 @@ class Run:
                     )
                     self._shop_cards[i] = (card, buy_cost)
 
+    def _preview_score_hand(
+        self,
+        card_indices: list[int],
+        chance_mode: ChanceMode,
+        chance_outcomes: list[bool] | None = None,
+        chance_rolls: list[float] | None = None,
+    ) -> HandPreview:
+        # score on the run itself, with copies of everything scoring can change: the
+        # containers it adds to or removes from, the fields of the Jokers and
+        # Consumables and the random state. the originals are put back untouched
+        # afterwards, along with the fields of the cards in hand (only the cards in
+        # hand are played, held or copied while a hand is scored)
+        attributes = self.__dict__.copy()
+        items = [
+            (item, item.__dict__.copy())
+            for item in chain(self._jokers, self._consumables)
+        ]
+        cards = [(card, _CARD_FIELDS(card)) for card in self._hand]
+
+        for name in (
+            "_hand",
+            "_deck_cards",
+            "_deck_cards_left",
+            "_cards_played_ante",
+            "_jokers",
+            "_consumables",
+            "_tags",
+        ):
+            setattr(self, name, getattr(self, name).copy())
+        self._poker_hand_info = {
+            poker_hand: info.copy()
+            for poker_hand, info in self._poker_hand_info.items()
+        }
+        for item, fields in items:
+            item.__dict__.update(_copy_fields(fields))
+        self._random = r.Random.__new__(r.Random)
+        self._random.setstate(attributes["_random"].getstate())
+        self._chance_mode = chance_mode
+        self._chance_outcomes = chance_outcomes
+        self._chance_rolls = chance_rolls
+        try:
+            _, _, poker_hands_played, score = self._score_hand(card_indices)
+            if score is None:
+                return HandPreview(poker_hands_played[0], 0, 0, 0)
+
+            chips, mult = self._chips, self._mult
+            if self._big_numbers:
+                chips, mult = BigNumber(chips).narrow(), mult.narrow()
+            return HandPreview(poker_hands_played[0], chips, mult, score)
+        finally:
+            self.__dict__.clear()
+            self.__dict__.update(attributes)
+            for item, fields in items:
+                item.__dict__.clear()
+                item.__dict__.update(fields)
+            for card, fields in cards:
+                (
+                    card.rank,
+                    card.suit,
+                    card.enhancement,
+                    card.seal,
+                    card.edition,
+                    card.extra_chips,
+                    card.is_debuffed,
+                    card.is_face_down,
+                ) = fields
+
     def _random_boss_blind(self) -> None:
         self._boss_blind: Blind = None
         self._ox_poker_hand: PokerHand | None = None
         if self._is_finisher_ante:
             if not self._finisher_blind_pool:
-                self._finisher_blind_pool = [
-                    blind
-                    for blind in list(Blind)[-5:]
-                    if (
-                        not isinstance(self, ChallengeRun)
-                        or blind not in CHALLENGE_SETUPS[self._challenge].banned_blinds
-                    )
-                ]
-            self._boss_blind = r.choice(self._finisher_blind_pool)
+                self._finisher_blind_pool = list(self._ruleset.finisher_blinds)
+            self._boss_blind = self._random.choice(self._finisher_blind_pool)
             self._finisher_blind_pool.remove(self._boss_blind)
         else:
             if not self._boss_blind_pool:
-                self._boss_blind_pool = [
-                    blind
-                    for blind in list(Blind)[2:-5]
-                    if (
-                        not isinstance(self, ChallengeRun)
-                        or blind not in CHALLENGE_SETUPS[self._challenge].banned_blinds
-                    )
-                ]
-            self._boss_blind = r.choice(
+                self._boss_blind_pool = list(self._ruleset.boss_blinds)
+            self._boss_blind = self._random.choice(
                 [
                     blind
                     for blind in self._boss_blind_pool
@@ -1665,24 +2514,304 @@ class Run:
         """
         return html + self._repr_frame()
 
-    def _sort_hand(self, by_suit: bool = False) -> None:
-        if by_suit:
-            self._hand.sort(
-                key=lambda card: (
-                    card.is_stone_card,
-                    list(Suit).index(card.suit),
-                    list(Rank).index(card.rank),
+    def _resolve_ruleset(self) -> Ruleset:
+        # everything the challenge, deck and stake decide, so that standard runs pay
+        # nothing for challenge support (ChallengeSetup() holds the standard rules)
+        challenge_setup = (
+            CHALLENGE_SETUPS[self._challenge]
+            if isinstance(self, ChallengeRun)
+            else ChallengeSetup()
+        )
+        banned_consumable_cards = challenge_setup.banned_consumable_cards
+
+        hand_size = challenge_setup.hand_size
+        hands_per_round = challenge_setup.hands_per_round
+        discards_per_round = challenge_setup.discards_per_round
+        joker_slots = challenge_setup.joker_slots
+        consumable_slots = challenge_setup.consumable_slots
+
+        match self._deck:
+            case Deck.RED:
+                discards_per_round += 1
+            case Deck.BLUE:
+                hands_per_round += 1
+            case Deck.BLACK:
+                hands_per_round -= 1
+                joker_slots += 1
+            case Deck.PAINTED:
+                hand_size -= 2
+                joker_slots -= 1
+            case Deck.NEBULA:
+                consumable_slots -= 1
+
+        if self._stake >= Stake.BLUE:
+            discards_per_round -= 1
+
+        tags = tuple(tag for tag in Tag if tag not in challenge_setup.banned_tags)
+        blinds = [
+            blind for blind in Blind if blind not in challenge_setup.banned_blinds
+        ]
+        boss_blinds = list(Blind)[2:-5]
+        finisher_blinds = list(Blind)[-5:]
+
+        return Ruleset(
+            ante_1_tags=tuple(tag for tag in tags if tag not in PROHIBITED_ANTE_1_TAGS),
+            boss_blinds=tuple(blind for blind in blinds if blind in boss_blinds),
+            finisher_blinds=tuple(
+                blind for blind in blinds if blind in finisher_blinds
+            ),
+            joker_types=MappingProxyType(
+                {
+                    rarity: tuple(
+                        joker_type
+                        for joker_type in joker_types
+                        if joker_type not in challenge_setup.banned_joker_types
+                    )
+                    for rarity, joker_types in JOKER_RARITIES.items()
+                }
+            ),
+            planets=tuple(
+                (i, poker_hand, planet)
+                for i, (poker_hand, planet) in enumerate(zip(PokerHand, Planet))
+                if planet not in banned_consumable_cards
+            ),
+            shop_packs=(
+                tuple(SHOP_BASE_PACK_WEIGHTS),
+                tuple(
+                    accumulate(
+                        weight if pack not in challenge_setup.banned_packs else 0
+                        for pack, weight in SHOP_BASE_PACK_WEIGHTS.items()
+                    )
+                ),
+            ),
+            spectrals=tuple(
+                spectral
+                for spectral in list(Spectral)[:-2]
+                if spectral not in banned_consumable_cards
+            ),
+            tags=tags,
+            tarots=tuple(
+                tarot for tarot in Tarot if tarot not in banned_consumable_cards
+            ),
+            vouchers=frozenset(
+                voucher
+                for voucher in Voucher
+                if voucher not in challenge_setup.banned_vouchers
+            ),
+            allow_black_hole=Spectral.BLACK_HOLE not in banned_consumable_cards,
+            allow_buffoon_pack=Pack.BUFFOON not in challenge_setup.banned_packs,
+            allow_the_soul=Spectral.THE_SOUL not in banned_consumable_cards,
+            eternal_stickers=self._stake >= Stake.BLACK,
+            perishable_stickers=self._stake >= Stake.ORANGE,
+            rental_stickers=self._stake is Stake.GOLD,
+            small_blind_reward=self._stake < Stake.RED,
+            ante_base_chips=tuple(
+                ANTE_BASE_CHIPS[
+                    (
+                        2
+                        if self._stake >= Stake.PURPLE
+                        else 1 if self._stake >= Stake.GREEN else 0
+                    )
+                ]
+            ),
+            base_reroll_cost=challenge_setup.base_reroll_cost,
+            consumable_slots=consumable_slots,
+            discards_per_round=discards_per_round,
+            hand_size=hand_size,
+            hands_per_round=hands_per_round,
+            joker_slots=joker_slots,
+            round_goal_scale=2 if self._deck is Deck.PLASMA else 1,
+            starting_money=(
+                challenge_setup.starting_money
+                if isinstance(self, ChallengeRun)
+                else (14 if self._deck is Deck.YELLOW else 4)
+            ),
+        )
+
+    def _score_hand(
+        self, card_indices: list[int]
+    ) -> tuple[list[Card], list[int], list[PokerHand], int | None]:
+        self._hands -= 1
+        self._num_played_hands += 1
+
+        played_cards = [self._hand[i] for i in card_indices]
+
+        # TODO: check this
+        self._cards_played_ante.update(played_cards)
+
+        for i in sorted(card_indices, reverse=True):
+            self._hand.pop(i)
+
+        for played_card in played_cards:
+            played_card.is_face_down = False
+
+        poker_hands = self._get_poker_hands(played_cards)
+        poker_hands_played = sorted(poker_hands, reverse=True)
+        scored_card_indices = (
+            list(range(len(played_cards)))
+            if Splash in self._joker_types
+            else [
+                i
+                for i, card in enumerate(played_cards)
+                if i in poker_hands[poker_hands_played[0]] or card.is_stone_card
+            ]
+        )
+
+        poker_hand_level = self._poker_hand_info[poker_hands_played[0]][0]
+        poker_hand_base_chips, poker_hand_base_mult = HAND_BASE_SCORE[
+            poker_hands_played[0]
+        ]
+        poker_hand_chips_scaling, poker_hand_mult_scaling = HAND_SCALING[
+            poker_hands_played[0]
+        ]
+        poker_hand_chips, poker_hand_mult = (
+            poker_hand_base_chips + poker_hand_chips_scaling * (poker_hand_level - 1),
+            poker_hand_base_mult + poker_hand_mult_scaling * (poker_hand_level - 1),
+        )
+        if self._big_numbers:
+            self._chips = BigNumber(poker_hand_chips)
+            self._mult = BigNumber(poker_hand_mult)
+        else:
+            self._chips = poker_hand_chips
+            self._mult = poker_hand_mult
+
+        if not self._is_hand_allowed(poker_hands_played[0], len(played_cards)):
+            return played_cards, scored_card_indices, poker_hands_played, None
+
+        boss_blind_triggered = False
+
+        if self._boss_blind_disabled is False:
+            match self._blind:
+                case Blind.THE_OX:
+                    if poker_hands_played[0] is self._ox_poker_hand:
+                        self._money = 0
+                        boss_blind_triggered = True
+                case Blind.THE_ARM:
+                    if self._poker_hand_info[poker_hands_played[0]][0] > 1:
+                        boss_blind_triggered = True
+                    self._poker_hand_info[poker_hands_played[0]][0] = max(
+                        1, self._poker_hand_info[poker_hands_played[0]][0] - 1
+                    )
+                case Blind.THE_TOOTH:
+                    self._money -= 1 * len(played_cards)
+                case Blind.THE_FLINT:
+                    self._chips //= 2
+                    self._mult //= 2
+                    boss_blind_triggered = True
+
+        for joker in self._joker_hooks["_on_hand_played"]:
+            joker._on_hand_played(played_cards, scored_card_indices, poker_hands_played)
+
+        self._poker_hand_info[poker_hands_played[0]][1] += 1
+
+        for i in scored_card_indices:
+            scored_card = played_cards[i]
+
+            if scored_card.is_debuffed:
+                boss_blind_triggered = True
+
+            self._trigger_scored_card(
+                scored_card, played_cards, scored_card_indices, poker_hands_played
+            )
+
+            if scored_card == Seal.RED:
+                self._trigger_scored_card(
+                    scored_card,
+                    played_cards,
+                    scored_card_indices,
+                    poker_hands_played,
+                )
+
+            for joker in self._joker_hooks["_on_card_scored_retriggers"]:
+                for _ in range(
+                    joker._on_card_scored_retriggers(
+                        scored_card,
+                        played_cards,
+                        scored_card_indices,
+                        poker_hands_played,
+                    )
+                ):
+                    self._trigger_scored_card(
+                        scored_card,
+                        played_cards,
+                        scored_card_indices,
+                        poker_hands_played,
+                    )
+
+        for held_card in self._hand:
+            self._trigger_held_card(held_card)
+
+            if held_card == Seal.RED:
+                self._trigger_held_card(held_card)
+
+            for joker in self._joker_hooks["_on_card_held_retriggers"]:
+                for _ in range(joker._on_card_held_retriggers(held_card)):
+                    self._trigger_held_card(held_card)
+
+        for joker in self._jokers:
+            match joker:
+                case Edition.FOIL:
+                    self._chips += 50
+                case Edition.HOLOGRAPHIC:
+                    self._mult += 10
+
+            joker_hooks = joker._implemented_hooks()
+            if "_on_independent" in joker_hooks:
+                joker._on_independent(
+                    played_cards, scored_card_indices, poker_hands_played
                 )
+            if boss_blind_triggered and "_on_boss_blind_triggered" in joker_hooks:
+                joker._on_boss_blind_triggered()
+
+            for other_joker in self._joker_hooks["_on_dependent"]:
+                other_joker._on_dependent(joker)
+
+            if joker == Edition.POLYCHROME:
+                self._mult *= 1.5
+
+        if Voucher.OBSERVATORY in self._vouchers:
+            self._mult *= 1.5 ** self._consumables.count(poker_hands_played[0].planet)
+
+        if self.challenge is Challenge.RICH_GET_RICHER:
+            self._chips = max(0, min(self._money, self._chips))
+        self._mult = round(self._mult, 9)  # floating-point imprecision
+        score = round(
+            (
+                ((self._chips + self._mult) / 2) ** 2
+                if self._deck is Deck.PLASMA
+                else self._chips * self._mult
+            )
+            - 1e-9
+        )
+
+        return played_cards, scored_card_indices, poker_hands_played, score
+
+    def _sort_hand(self, num_sorted: int = 0, by_suit: bool = False) -> None:
+        # the cards after the first num_sorted are inserted in place, which orders the
+        # hand the same as a stable sort as long as the first num_sorted are in order
+        if by_suit:
+            key = lambda card: (
+                card.enhancement is Enhancement.STONE,
+                SUIT_ORDINALS[card.suit],
+                RANK_ORDINALS[card.rank],
             )
         else:
-            self._hand.sort(
-                key=lambda card: (
-                    card.is_stone_card,
-                    list(Rank).index(card.rank),
-                    list(Suit).index(card.suit),
-                )
+            key = lambda card: (
+                card.enhancement is Enhancement.STONE,
+                RANK_ORDINALS[card.rank],
+                SUIT_ORDINALS[card.suit],
             )
 
+        sorted_keys = [key(card) for card in self._hand[:num_sorted]]
+        if any(a > b for a, b in zip(sorted_keys, sorted_keys[1:])):
+            self._hand.sort(key=key)
+            return
+
+        unsorted_cards = self._hand[num_sorted:]
+        del self._hand[num_sorted:]
+        for card in unsorted_cards:
+            insort(self._hand, card, key=key)
+
     def _trigger_scored_card(
         self,
         scored_card: Card,
@@ -1701,7 +2830,7 @@ class Run:
                 self._mult *= 2
             case Enhancement.LUCKY:
                 if self._lucky_check():
-                    for joker in self._jokers:
+                    for joker in self._joker_hooks["_on_lucky_card_triggered"]:
                         joker._on_lucky_card_triggered()
 
         if scored_card == Seal.GOLD:
@@ -1715,7 +2844,7 @@ class Run:
             case Edition.POLYCHROME:
                 self._mult *= 1.5
 
-        for joker in self._jokers:
+        for joker in self._joker_hooks["_on_card_scored"]:
             joker._on_card_scored(
                 scored_card, played_cards, scored_card_indices, poker_hands_played
             )
@@ -1724,7 +2853,7 @@ class Run:
         if held_card == Enhancement.STEEL:
             self._mult *= 1.5
 
-        for joker in self._jokers:
+        for joker in self._joker_hooks["_on_card_held"]:
             joker._on_card_held(held_card)
 
     def _trigger_held_card_round_end(
@@ -1736,6 +2865,67 @@ class Run:
         if held_card == Seal.BLUE and self.consumable_slots > len(self._consumables):
             self._consumables.append(Consumable(last_poker_hand_played.planet))
 
+    def _unshare(self) -> None:
+        # every action calls this before changing anything, so that a shared card or
+        # random state is never changed under a clone (the copies keep the identities
+        # shared between the containers and the Jokers)
+        if not self._is_shared:
+            return
+
+        self._is_shared = False
+
+        random_state = self._random.getstate()
+        self._random = r.Random.__new__(r.Random)
+        self._random.setstate(random_state)
+
+        copies = {}
+
+        def own(obj):
+            if not isinstance(obj, Card):
+                return obj
+            card_copy = copies.get(id(obj))
+            if card_copy is None:
+                card_copy = copies[id(obj)] = copy(obj)
+            return card_copy
+
+        self._deck_cards = [own(card) for card in self._deck_cards]
+        self._cards_played_ante = {own(card) for card in self._cards_played_ante}
+        if self._hand is not None:
+            self._hand = [own(card) for card in self._hand]
+        if self._deck_cards_left is not None:
+            self._deck_cards_left = [own(card) for card in self._deck_cards_left]
+        if self._pack_items is not None:
+            self._pack_items = [own(item) for item in self._pack_items]
+        if self._shop_cards is not None:
+            self._shop_cards = [
+                (own(shop_card), cost) for shop_card, cost in self._shop_cards
+            ]
+
+        for joker in chain(
+            self._jokers,
+            self._pack_items or (),
+            (shop_card for shop_card, _ in self._shop_cards or ()),
+        ):
+            if isinstance(joker, BalatroJoker):
+                for name, value in joker.__dict__.items():
+                    if isinstance(value, Card):
+                        joker.__dict__[name] = own(value)
+
+    def _update_joker_hooks(self) -> None:
+        self._joker_hooks = {hook: [] for hook in JOKER_HOOKS}
+        for joker in self._jokers:
+            for hook in joker._implemented_hooks():
+                self._joker_hooks[hook].append(joker)
+
+    def _update_joker_types(self) -> None:
+        # every Joker class (and base class) of the active Jokers with its count
+        self._joker_types = Counter(
+            joker_type
+            for joker in self._jokers
+            if not joker.is_debuffed
+            for joker_type in type(joker).__mro__
+        )
+
     def _update_shop_costs(self) -> None:
         for i, (shop_card, cost) in enumerate(self._shop_cards):
             updated_cost = self._calculate_buy_cost(shop_card) + self._inflation_amount
@@ -1755,49 +2945,16 @@ class Run:
     def _use_consumable(
         self, consumable: Consumable, card_indices: list[int] | None = None
     ) -> None:
-        if card_indices is not None:
-            if self._hand is None:
-                raise InvalidArgumentsError(
-                    f"Selected card indices should be None when there is no hand, but got {card_indices}"
-                )
-            if not (1 <= len(card_indices) <= 5):
-                raise InvalidArgumentsError(
-                    f"Selected card indices should have length 1-5, but got {len(card_indices)}"
-                )
-            if any((i not in range(len(self._hand)) for i in card_indices)):
-                raise InvalidArgumentsError(
-                    f"Selected cards indices should all be within the range of the hand, but got {card_indices}"
-                )
-            if len(set(card_indices)) < len(card_indices):
-                raise InvalidArgumentsError(
-                    f"Selected card indices should all be unique, but got {card_indices}"
-                )
-
-            selected_cards = [self._hand[i] for i in card_indices]
-        else:
-            selected_cards = []
+        selected_cards = (
+            [self._hand[i] for i in card_indices] if card_indices is not None else []
+        )
 
         match consumable.card:
             case Tarot():
                 match consumable.card:
                     case Tarot.THE_FOOL:
-                        if self._fool_next in [None, Tarot.THE_FOOL]:
-                            raise IllegalFoolUseError(
-                                f"Cannot use The Fool without a valid consumable to create, got {self._fool_next}"
-                            )
-
-                        if len(self._consumables) >= self.consumable_slots:
-                            raise NotEnoughSpaceError(
-                                "Cannot use The Fool when consumable slots are full"
-                            )
-
                         self._consumables.append(Consumable(self._fool_next))
                     case Tarot.THE_MAGICIAN:
-                        if not (1 <= len(selected_cards) <= 2):
-                            raise InvalidArgumentsError(
-                                f"The Magician requires 1-2 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.enhancement = Enhancement.LUCKY
                     case Tarot.THE_HIGH_PRIESTESS:
@@ -1812,11 +2969,6 @@ class Run:
                                 self._get_random_consumable(Planet)
                             )
                     case Tarot.THE_EMPRESS:
-                        if not (1 <= len(selected_cards) <= 2):
-                            raise InvalidArgumentsError(
-                                f"The Empress requires 1-2 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.enhancement = Enhancement.MULT
                     case Tarot.THE_EMPEROR:
@@ -1828,33 +2980,13 @@ class Run:
                         ):
                             self._consumables.append(self._get_random_consumable(Tarot))
                     case Tarot.THE_HEIROPHANT:
-                        if not (1 <= len(selected_cards) <= 2):
-                            raise InvalidArgumentsError(
-                                f"The Heirophant requires 1-2 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.enhancement = Enhancement.BONUS
                     case Tarot.THE_LOVERS:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"The Lovers requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].enhancement = Enhancement.WILD
                     case Tarot.THE_CHARIOT:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"The Chariot requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].enhancement = Enhancement.STEEL
                     case Tarot.JUSTICE:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Justice requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].enhancement = Enhancement.GLASS
                     case Tarot.THE_HERMIT:
                         self._money += max(0, min(20, self._money))
@@ -1865,40 +2997,23 @@ class Run:
                             if joker.edition is Edition.BASE
                         ]
 
-                        if not valid_jokers:
-                            raise NoValidJokersError(
-                                "The Wheel of Fortune requires at least one base Joker to use"
-                            )
-
                         if self._chance(1, 4):
-                            r.choice(valid_jokers).edition = r.choices(
-                                list(UPGRADED_EDITION_WEIGHTS),
-                                weights=UPGRADED_EDITION_WEIGHTS.values(),
-                                k=1,
-                            )[0]
-                    case Tarot.STRENGTH:
-                        if not (1 <= len(selected_cards) <= 2):
-                            raise InvalidArgumentsError(
-                                f"Strength requires 1-2 selected cards, but got {len(selected_cards)}"
+                            self._random.choice(valid_jokers).edition = (
+                                self._random.choices(
+                                    list(UPGRADED_EDITION_WEIGHTS),
+                                    weights=UPGRADED_EDITION_WEIGHTS.values(),
+                                    k=1,
+                                )[0]
                             )
-
+                            self._stats_cache = None
+                    case Tarot.STRENGTH:
                         ranks = list(Rank)
                         for card in selected_cards:
                             card.rank = ranks[(ranks.index(card.rank) - 1) % 13]
                     case Tarot.THE_HANGED_MAN:
-                        if not (1 <= len(selected_cards) <= 2):
-                            raise InvalidArgumentsError(
-                                f"The Hanged Man requires 1-2 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             self._destroy_card(card)
                     case Tarot.DEATH:
-                        if len(selected_cards) != 2:
-                            raise InvalidArgumentsError(
-                                f"Death requires 2 selected cards, but got {len(selected_cards)}"
-                            )
-
                         left, right = selected_cards
                         left.suit = right.suit
                         left.rank = right.rank
@@ -1914,56 +3029,21 @@ class Run:
                             ),
                         )
                     case Tarot.THE_DEVIL:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"The Devil requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].enhancement = Enhancement.GOLD
                     case Tarot.THE_TOWER:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"The Tower requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].enhancement = Enhancement.STONE
                     case Tarot.THE_STAR:
-                        if not (1 <= len(selected_cards) <= 3):
-                            raise InvalidArgumentsError(
-                                f"The Star requires 1-3 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.suit = Suit.DIAMONDS
                     case Tarot.THE_MOON:
-                        if not (1 <= len(selected_cards) <= 3):
-                            raise InvalidArgumentsError(
-                                f"The Moon requires 1-3 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.suit = Suit.CLUBS
                     case Tarot.THE_SUN:
-                        if not (1 <= len(selected_cards) <= 3):
-                            raise InvalidArgumentsError(
-                                f"The Sun requires 1-3 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.suit = Suit.HEARTS
                     case Tarot.JUDGEMENT:
-                        if len(self._jokers) >= self.joker_slots:
-                            raise NotEnoughSpaceError(
-                                "Judgement requires an empty Joker slot to use"
-                            )
-
                         self._add_joker(self._get_random_joker())
                     case Tarot.THE_WORLD:
-                        if not (1 <= len(selected_cards) <= 3):
-                            raise InvalidArgumentsError(
-                                f"The World requires 1-3 selected cards, but got {len(selected_cards)}"
-                            )
-
                         for card in selected_cards:
                             card.suit = Suit.SPADES
 
@@ -1980,16 +3060,13 @@ class Run:
             case Spectral():
                 match consumable.card:
                     case Spectral.FAMILIAR:
-                        if not self._hand:
-                            raise IllegalActionError("Familiar requires a hand to use")
-
-                        self._destroy_card(r.choice(self._hand))
+                        self._destroy_card(self._random.choice(self._hand))
 
                         for _ in range(3):
                             random_face_card = self._get_random_card(
                                 ranks=[Rank.KING, Rank.QUEEN, Rank.JACK]
                             )
-                            random_face_card.enhancement = r.choice(
+                            random_face_card.enhancement = self._random.choice(
                                 [
                                     enhancement
                                     for enhancement in Enhancement
@@ -1998,14 +3075,11 @@ class Run:
                             )
                             self._add_card(random_face_card, draw_to_hand=True)
                     case Spectral.GRIM:
-                        if not self._hand:
-                            raise IllegalActionError("Grim requires a hand to use")
-
-                        self._destroy_card(r.choice(self._hand))
+                        self._destroy_card(self._random.choice(self._hand))
 
                         for _ in range(2):
                             random_ace = self._get_random_card(ranks=[Rank.ACE])
-                            random_ace.enhancement = r.choice(
+                            random_ace.enhancement = self._random.choice(
                                 [
                                     enhancement
                                     for enhancement in Enhancement
@@ -2014,18 +3088,13 @@ class Run:
                             )
                             self._add_card(random_ace, draw_to_hand=True)
                     case Spectral.INCANTATION:
-                        if not self._hand:
-                            raise IllegalActionError(
-                                "Incantation requires a hand to use"
-                            )
-
-                        self._destroy_card(r.choice(self._hand))
+                        self._destroy_card(self._random.choice(self._hand))
 
                         for _ in range(4):
                             random_numbered_card = self._get_random_card(
                                 ranks=list(Rank)[4:]
                             )
-                            random_numbered_card.enhancement = r.choice(
+                            random_numbered_card.enhancement = self._random.choice(
                                 [
                                     enhancement
                                     for enhancement in Enhancement
@@ -2034,89 +3103,39 @@ class Run:
                             )
                             self._add_card(random_numbered_card, draw_to_hand=True)
                     case Spectral.TALISMAN:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Talisman requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].seal = Seal.GOLD
                     case Spectral.AURA:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Aura requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
-                        selected_cards[0].edition = r.choices(
+                        selected_cards[0].edition = self._random.choices(
                             list(UPGRADED_EDITION_WEIGHTS),
                             weights=UPGRADED_EDITION_WEIGHTS.values(),
                             k=1,
                         )[0]
                     case Spectral.WRAITH:
-                        if len(self._jokers) >= self.joker_slots:
-                            raise NotEnoughSpaceError(
-                                "Wraith requires an empty Joker slot to use"
-                            )
-
                         self._add_joker(self._get_random_joker(rarity=Rarity.RARE))
                         self._money = 0
                     case Spectral.SIGIL:
-                        if not self._hand:
-                            raise IllegalActionError("Sigil requires a hand to use")
-
-                        random_suit = r.choice(list(Suit))
+                        random_suit = self._random.choice(list(Suit))
                         for card in self._hand:
                             card.suit = random_suit
                     case Spectral.OUIJA:
-                        if not self._hand:
-                            raise IllegalActionError("Ouija requires a hand to use")
-
-                        if self.hand_size == 1:
-                            raise HandSizeOfOneError(
-                                "Ouija requires a hand size greater than 1 to use"
-                            )
-
-                        random_rank = r.choice(list(Rank))
+                        random_rank = self._random.choice(list(Rank))
                         for card in self._hand:
                             card.rank = random_rank
                         self._hand_size_penalty += 1
                     case Spectral.ECTOPLASM:
-                        if not self._jokers:
-                            raise NoValidJokersError(
-                                "Ectoplasm requires a Joker to use"
-                            )
-
-                        if self.hand_size == 1:
-                            raise HandSizeOfOneError(
-                                "Ectoplasm requires a hand size greater than 1 to use"
-                            )
-
-                        r.choice(self._jokers).edition = Edition.NEGATIVE
+                        self._random.choice(self._jokers).edition = Edition.NEGATIVE
+                        self._stats_cache = None
                         self._hand_size_penalty += 1 + self._num_ectoplasms_used
                         self._num_ectoplasms_used += 1
                     case Spectral.IMMOLATE:
-                        if not self._hand:
-                            raise IllegalActionError("Immolate requires a hand to use")
-
                         for _ in range(5):
                             if not self._hand:
                                 break
 
-                            self._destroy_card(r.choice(self._hand))
+                            self._destroy_card(self._random.choice(self._hand))
                         self._money += 20
                     case Spectral.ANKH:
-                        if not self._jokers:
-                            raise NoValidJokersError("Ankh requires a Joker to use")
-                        if (
-                            self.joker_slots
-                            - len(self._jokers)
-                            + sum(not joker.is_eternal for joker in self._jokers)
-                            < 1
-                        ):
-                            raise NotEnoughSpaceError(
-                                "Ankh cannot make room for a new Joker"
-                            )
-
-                        copied_joker = r.choice(self._jokers)
+                        copied_joker = self._random.choice(self._jokers)
                         joker_copy = self._create_joker(
                             type(copied_joker),
                             (
@@ -2135,11 +3154,6 @@ class Run:
                             self._destroy_joker(joker)
                         self._add_joker(joker_copy)
                     case Spectral.DEJA_VU:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Deja Vu requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].seal = Seal.RED
                     case Spectral.HEX:
                         valid_jokers = [
@@ -2148,12 +3162,7 @@ class Run:
                             if joker.edition is Edition.BASE
                         ]
 
-                        if not valid_jokers:
-                            raise NoValidJokersError(
-                                "Hex requires at least one base Joker to use"
-                            )
-
-                        random_joker = r.choice(valid_jokers)
+                        random_joker = self._random.choice(valid_jokers)
                         random_joker.edition = Edition.POLYCHROME
 
                         for joker in self._jokers[:]:
@@ -2162,133 +3171,398 @@ class Run:
 
                             self._destroy_joker(joker)
                     case Spectral.TRANCE:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Trance requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].seal = Seal.BLUE
                     case Spectral.MEDIUM:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Medium requires 1 selected card, but got {len(selected_cards)}"
-                            )
-
                         selected_cards[0].seal = Seal.PURPLE
                     case Spectral.CRYPTID:
-                        if len(selected_cards) != 1:
-                            raise InvalidArgumentsError(
-                                f"Cryptid requires 1 selected card, but got {len(selected_cards)}"
-                            )
+                        for _ in range(2):
+                            card_copy = copy(selected_cards[0])
+                            self._add_card(card_copy, draw_to_hand=True)
+                    case Spectral.THE_SOUL:
+                        self._add_joker(self._get_random_joker(rarity=Rarity.LEGENDARY))
+                    case Spectral.BLACK_HOLE:
+                        for poker_hand in PokerHand:
+                            self._poker_hand_info[poker_hand][0] += 1
+
+        self._deck_counts_cache = None
+
+    def best_plays(
+        self, k: int = 1, chance_mode: ChanceMode = ChanceMode.EXPECTED
+    ) -> list[tuple[list[int], HandPreview]]:
+        """
+        Find the highest scoring poker hands that can be played from cards in hand
+
+        Args:
+            k (int, optional): The number of plays to return
+            chance_mode (ChanceMode, optional): How probabilistic effects are resolved when scoring
+        """
+
+        if self._state is not State.PLAYING_BLIND:
+            raise IllegalActionError(
+                f"Expected state to be PLAYING_BLIND, but got {self._state}"
+            )
+
+        state_key = self._best_plays_key(k, chance_mode)
+        if self._best_plays_cache is None:
+            self._best_plays_cache = {}
+        elif state_key in self._best_plays_cache:
+            return self._best_plays_cache[state_key].copy()
+
+        # cards that look the same score the same, so plays are only scored once per
+        # sequence of played and held cards
+        card_keys = [_CARD_FIELDS(card) for card in self._hand]
+
+        # the order cards are played in only matters when they are scored one at a
+        # time by Jokers, or with Glass or Polychrome cards mixed in, and then only the
+        # order of the scored cards
+        order_sensitive = bool(
+            self._joker_hooks["_on_card_scored"]
+            or self._joker_hooks["_on_card_scored_retriggers"]
+        )
+        plays = {}
+        unscored_plays = {}
+        for num_cards in range(1, min(5, len(self._hand)) + 1):
+            for card_indices in combinations(range(len(self._hand)), num_cards):
+                if (
+                    self._forced_selected_card_index is not None
+                    and self._forced_selected_card_index not in card_indices
+                ):
+                    continue
+
+                play_key = (
+                    tuple(card_keys[i] for i in card_indices),
+                    tuple(
+                        card_key
+                        for i, card_key in enumerate(card_keys)
+                        if i not in card_indices
+                    ),
+                )
+                if play_key in plays or play_key in unscored_plays:
+                    continue
+
+                played_cards = [self._hand[i] for i in card_indices]
+                poker_hands = self._get_poker_hands(played_cards)
+                poker_hand = max(poker_hands)
+                if not self._is_hand_allowed(poker_hand, num_cards):
+                    unscored_plays[play_key] = list(card_indices)
+                    continue
+
+                card_indices = list(card_indices)
+                preview = self.preview_play_hand(card_indices, chance_mode)
+
+                scored_indices = [
+                    i
+                    for j, i in enumerate(card_indices)
+                    if j in poker_hands[poker_hand]
+                    or played_cards[j].is_stone_card
+                    or Splash in self._joker_types
+                ]
+                if len(scored_indices) > 1 and (
+                    order_sensitive
+                    or any(
+                        self._hand[i] == Enhancement.GLASS
+                        or self._hand[i] == Edition.POLYCHROME
+                        for i in scored_indices
+                    )
+                ):
+                    unscored_indices = [
+                        i for i in card_indices if i not in scored_indices
+                    ]
+                    orders = {
+                        tuple(card_keys[i] for i in order): list(order)
+                        for order in permutations(scored_indices)
+                    }
+                    del orders[tuple(card_keys[i] for i in scored_indices)]
+                    for order in orders.values():
+                        order += unscored_indices
+                        order_preview = self.preview_play_hand(order, chance_mode)
+                        if order_preview.score > preview.score:
+                            card_indices, preview = order, order_preview
+
+                plays[play_key] = (card_indices, preview)
+
+        # when the boss blind scores none of the plays, one still has to be played, so
+        # they are all returned scoring nothing
+        if not plays:
+            plays = {
+                play_key: (
+                    card_indices,
+                    self.preview_play_hand(card_indices, chance_mode),
+                )
+                for play_key, card_indices in unscored_plays.items()
+            }
+
+        best_plays = sorted(
+            plays.values(), key=lambda play: play[1].score, reverse=True
+        )[:k]
+
+        if len(self._best_plays_cache) >= BEST_PLAYS_CACHE_SIZE:
+            del self._best_plays_cache[next(iter(self._best_plays_cache))]
+        self._best_plays_cache[state_key] = best_plays
+        return best_plays.copy()
+
+    def buy_shop_card(self, shop_card_index: int, use: bool = False) -> None:
+        """
+        Buy a shop card
+
+        Args:
+            shop_card_index (int): The index of the shop card (0-indexed)
+            use (bool): Whether to use the card immediately after buying it. Defaults to False.
+        """
+
+        error = self._check_buy_shop_card(shop_card_index, use, describe=True)
+        if error is not None:
+            raise error
+
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
+
+        shop_card, cost = self._shop_cards.pop(shop_card_index)
+        self._money -= cost
+
+        if use:
+            self._use_consumable(shop_card)
+        else:
+            match shop_card:
+                case BalatroJoker():
+                    self._add_joker(shop_card)
+                case Consumable():
+                    self._consumables.append(shop_card)
+                case Card():
+                    self._add_card(shop_card)
+
+        if self.challenge is Challenge.INFLATION:
+            self._inflation_amount += 1
+            self._update_shop_costs()
+
+    def cash_out(self) -> None:
+        """
+        Collect the money earned from the round and proceed to the shop
+        """
+
+        error = self._check_cash_out(describe=True)
+        if error is not None:
+            raise error
+
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
+
+        self._money += self.cash_out_total
+        self._round_score = None
+        self._round_goal = None
+        self._num_unused_discards += self._discards
+        self._hands = None
+        self._discards = None
+        self._hand = None
+        self._deck_cards_left = None
+        self._chips = None
+        self._mult = None
+        self._first_hand = None
+        self._first_discard = None
+        self._round_poker_hands = None
+        self._boss_blind_disabled = None
+        self._forced_selected_card_index = None
+
+        self._next_blind()
+
+        self._populate_shop()
+        self._state = State.IN_SHOP
+
+    def check_buy_shop_card(
+        self, shop_card_index: int, use: bool = False
+    ) -> type[BalatroError] | None:
+        """
+        Check whether a shop card can be bought, giving the error buy_shop_card would raise or None
+
+        Args:
+            shop_card_index (int): The index of the shop card (0-indexed)
+            use (bool): Whether to use the card immediately after buying it. Defaults to False.
+        """
+
+        return self._check_buy_shop_card(shop_card_index, use)
+
+    def check_cash_out(self) -> type[BalatroError] | None:
+        """
+        Check whether the round can be cashed out, giving the error cash_out would raise or None
+        """
+
+        return self._check_cash_out()
+
+    def check_choose_pack_item(
+        self, item_index: int, card_indices: list[int] | None = None
+    ) -> type[BalatroError] | None:
+        """
+        Check whether an item can be chosen from the opened pack, giving the error choose_pack_item would raise or None
+
+        Args:
+            item_index (int): The index of the item in the pack (0-indexed)
+            card_indices (list[int], optional): The indices of the cards in hand to use the item on (0-indexed), or none
+        """
+
+        return self._check_choose_pack_item(item_index, card_indices)
+
+    def check_discard(self, discard_indices: list[int]) -> type[BalatroError] | None:
+        """
+        Check whether cards can be discarded, giving the error discard would raise or None
+
+        Args:
+            discard_indices (list[int]): The indices of the cards in hand to discard (0-indexed)
+        """
+
+        return self._check_discard(discard_indices)
+
+    def check_move_joker(
+        self, old_index: int, new_index: int
+    ) -> type[BalatroError] | None:
+        """
+        Check whether a Joker can be moved, giving the error move_joker would raise or None
+
+        Args:
+            old_index (int): The index of the Joker to move (0-indexed)
+            new_index (int): The index to move the Joker to (0-indexed)
+        """
+
+        return self._check_move_joker(old_index, new_index)
+
+    def check_next_round(self) -> type[BalatroError] | None:
+        """
+        Check whether the shop can be exited, giving the error next_round would raise or None
+        """
+
+        return self._check_next_round()
+
+    def check_open_shop_pack(self, shop_pack_index: int) -> type[BalatroError] | None:
+        """
+        Check whether a shop pack can be bought, giving the error open_shop_pack would raise or None
+
+        Args:
+            shop_pack_index (int): The index of the shop pack (0-indexed)
+        """
+
+        return self._check_open_shop_pack(shop_pack_index)
+
+    def check_play_hand(self, card_indices: list[int]) -> type[BalatroError] | None:
+        """
+        Check whether a poker hand can be played, giving the error play_hand would raise or None
+
+        Args:
+            card_indices (list[int]): The indices of the cards in hand to play, in order (0-indexed)
+        """
+
+        return self._check_play_hand(card_indices)
+
+    def check_redeem_shop_voucher(
+        self, shop_voucher_index: int
+    ) -> type[BalatroError] | None:
+        """
+        Check whether a shop voucher can be redeemed, giving the error redeem_shop_voucher would raise or None
+
+        Args:
+            shop_voucher_index (int): The index of the shop voucher (0-indexed)
+        """
+
+        return self._check_redeem_shop_voucher(shop_voucher_index)
+
+    def check_reroll(self) -> type[BalatroError] | None:
+        """
+        Check whether the shop can be rerolled, giving the error reroll would raise or None
+        """
+
+        return self._check_reroll()
+
+    def check_reroll_boss_blind(self) -> type[BalatroError] | None:
+        """
+        Check whether the boss blind can be rerolled, giving the error reroll_boss_blind would raise or None
+        """
+
+        return self._check_reroll_boss_blind()
 
-                        for _ in range(2):
-                            card_copy = copy(selected_cards[0])
-                            self._add_card(card_copy, draw_to_hand=True)
-                    case Spectral.THE_SOUL:
-                        if len(self._jokers) >= self.joker_slots:
-                            raise NotEnoughSpaceError(
-                                "The Soul requires an empty Joker slot to use"
-                            )
+    def check_select_blind(self) -> type[BalatroError] | None:
+        """
+        Check whether the current blind can be played, giving the error select_blind would raise or None
+        """
 
-                        self._add_joker(self._get_random_joker(rarity=Rarity.LEGENDARY))
-                    case Spectral.BLACK_HOLE:
-                        for poker_hand in PokerHand:
-                            self._poker_hand_info[poker_hand][0] += 1
+        return self._check_select_blind()
 
-    def buy_shop_card(self, shop_card_index: int, use: bool = False) -> None:
+    def check_sell_consumable(self, consumable_index: int) -> type[BalatroError] | None:
         """
-        Buy a shop card
+        Check whether an owned Consumable can be sold, giving the error sell_consumable would raise or None
 
         Args:
-            shop_card_index (int): The index of the shop card (0-indexed)
-            use (bool): Whether to use the card immediately after buying it. Defaults to False.
+            consumable_index (int): The index of the consumable to sell (0-indexed)
         """
 
-        if self._state is not State.IN_SHOP:
-            raise IllegalActionError(f"Expected state IN_SHOP, got {self._state}")
+        return self._check_sell_consumable(consumable_index)
 
-        if shop_card_index not in range(len(self._shop_cards)):
-            raise InvalidArgumentsError(
-                f"Invalid shop card index {shop_card_index}, must be in range({len(self._shop_cards)})"
-            )
+    def check_sell_joker(self, joker_index: int) -> type[BalatroError] | None:
+        """
+        Check whether an owned Joker can be sold, giving the error sell_joker would raise or None
 
-        shop_card, cost = self._shop_cards[shop_card_index]
+        Args:
+            joker_index (int): The index of the Joker to sell (0-indexed)
+        """
 
-        if self._available_money < cost:
-            raise InsufficientFundsError(
-                f"Insufficient funds to buy {shop_card!r}, cost: {cost}, available: {self._available_money}"
-            )
+        return self._check_sell_joker(joker_index)
 
-        self._money -= cost
-        self._shop_cards.pop(shop_card_index)
+    def check_skip_blind(self) -> type[BalatroError] | None:
+        """
+        Check whether the current blind can be skipped, giving the error skip_blind would raise or None
+        """
 
-        try:
-            if use:
-                if not isinstance(shop_card, Consumable):
-                    raise InvalidArgumentsError(
-                        f"Cannot use non-Consumable {shop_card!r}"
-                    )
+        return self._check_skip_blind()
 
-                self._use_consumable(shop_card)
-            else:
-                match shop_card:
-                    case BalatroJoker():
-                        if len(self._jokers) >= self.joker_slots + (
-                            shop_card.edition is Edition.NEGATIVE
-                        ):
-                            raise NotEnoughSpaceError(
-                                f"Cannot buy {shop_card!r}, Joker slots full"
-                            )
+    def check_skip_pack(self) -> type[BalatroError] | None:
+        """
+        Check whether the opened pack can be closed, giving the error skip_pack would raise or None
+        """
 
-                        self._add_joker(shop_card)
-                    case Consumable():
-                        if len(self._consumables) >= self.consumable_slots:
-                            raise NotEnoughSpaceError(
-                                f"Cannot buy {shop_card!r}, Consumable slots full"
-                            )
+        return self._check_skip_pack()
 
-                        self._consumables.append(shop_card)
-                    case Card():
-                        self._add_card(shop_card)
-        except BalatroError:
-            self._shop_cards.insert(shop_card_index, (shop_card, cost))
-            self._money += cost
-            raise
+    def check_use_consumable(
+        self, consumable_index: int, card_indices: list[int] | None = None
+    ) -> type[BalatroError] | None:
+        """
+        Check whether an owned Consumable can be used, giving the error use_consumable would raise or None
 
-        if self.challenge is Challenge.INFLATION:
-            self._inflation_amount += 1
-            self._update_shop_costs()
+        Args:
+            consumable_index (int): The index of the consumable to use (0-indexed)
+            card_indices (list[int], optional): The indices of the cards in hand to use the consumable on (0-indexed), or none
+        """
 
-    def cash_out(self) -> None:
+        return self._check_use_consumable(consumable_index, card_indices)
+
+    def checkpoint(self) -> Checkpoint:
         """
-        Collect the money earned from the round and proceed to the shop
+        Record the state of the run so it can be restored in place with rollback, a lighter alternative to clone for trying an action and backing out of it
         """
 
-        if self._state is not State.CASHING_OUT:
-            raise IllegalActionError(
-                f"Excpected state to be CASHING_OUT, but got {self._state}"
-            )
+        # the cards and the random state are shared with the checkpoint like with a
+        # clone, so they are only copied if the run changes them before the rollback
+        self._is_shared = True
 
-        self._money += self.cash_out_total
-        self._round_score = None
-        self._round_goal = None
-        self._num_unused_discards += self._discards
-        self._hands = None
-        self._discards = None
-        self._hand = None
-        self._deck_cards_left = None
-        self._chips = None
-        self._mult = None
-        self._first_hand = None
-        self._first_discard = None
-        self._round_poker_hands = None
-        self._boss_blind_disabled = None
-        self._forced_selected_card_index = None
+        containers = [
+            (value, value.copy())
+            for value in self.__dict__.values()
+            if type(value) in (list, set, dict)
+        ]
+        containers.extend(
+            (info, info.copy()) for info in self._poker_hand_info.values()
+        )
 
-        self._next_blind()
+        # items are restored by identity, since they are referenced from several
+        # containers and by the Jokers
+        items = {}
+        for objs in (
+            self._jokers,
+            self._consumables,
+            self._pack_items or (),
+            (shop_card for shop_card, _ in self._shop_cards or ()),
+        ):
+            for obj in objs:
+                if not isinstance(obj, Card):
+                    items[id(obj)] = (obj, _copy_fields(obj.__dict__))
 
-        self._populate_shop()
-        self._state = State.IN_SHOP
+        return Checkpoint(self, self.__dict__.copy(), containers, list(items.values()))
 
     def choose_pack_item(
         self, item_index: int, card_indices: list[int] | None = None
@@ -2301,27 +3575,17 @@ class Run:
             card_indices (list[int], optional): The indices of the cards in hand to use the item on (0-indexed), or none
         """
 
-        if self._state is not State.OPENING_PACK:
-            raise IllegalActionError(
-                f"Expected state to be OPENING_PACK, but got {self._state}"
-            )
+        error = self._check_choose_pack_item(item_index, card_indices, describe=True)
+        if error is not None:
+            raise error
 
-        if item_index not in range(len(self._pack_items)):
-            raise InvalidArgumentsError(
-                f"Item index should be in range(len(pack_items)), but got {item_index}"
-            )
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
         item = self._pack_items[item_index]
 
         match item:
             case BalatroJoker():
-                if len(self._jokers) >= self.joker_slots + (
-                    item.edition is Edition.NEGATIVE
-                ):
-                    raise NotEnoughSpaceError(
-                        f"Cannot choose {item!r}, Joker slots full"
-                    )
-
                 self._add_joker(item)
             case Consumable():
                 self._use_consumable(item, card_indices)
@@ -2334,6 +3598,67 @@ class Run:
         if self._pack_choices_left == 0:
             self._close_pack()
 
+    def clone(self) -> Run:
+        """
+        Create an independent copy of the run, e.g. to branch a search or rollout from it
+        """
+
+        # attributes that are not replaced below only hold immutable values, and the
+        # cards and the random state are shared until either run changes them
+        self._is_shared = True
+        run = object.__new__(type(self))
+        run.__dict__.update(self.__dict__)
+
+        copies = {id(self): run}
+
+        def clone_all(objs):
+            return [self._clone_object(obj, copies) for obj in objs]
+
+        run._deck_cards = self._deck_cards.copy()
+        run._poker_hand_info = {
+            poker_hand: info.copy()
+            for poker_hand, info in self._poker_hand_info.items()
+        }
+        run._vouchers = self._vouchers.copy()
+        run._tags = self._tags.copy()
+        run._jokers = clone_all(self._jokers)
+        # the Joker types are only ever replaced, so they are shared as well
+        run._joker_hooks = {
+            hook: clone_all(jokers) for hook, jokers in self._joker_hooks.items()
+        }
+        run._copy_targets_cache = None
+        run._dirty_sections = set(RUN_SECTIONS)
+        run._consumables = clone_all(self._consumables)
+        run._cards_played_ante = self._cards_played_ante.copy()
+        run._ante_tags = self._ante_tags.copy()
+        run._boss_blind_pool = self._boss_blind_pool.copy()
+        run._finisher_blind_pool = self._finisher_blind_pool.copy()
+        run._unique_planet_cards_used = self._unique_planet_cards_used.copy()
+
+        if self._hand is not None:
+            run._hand = self._hand.copy()
+        if self._deck_cards_left is not None:
+            run._deck_cards_left = self._deck_cards_left.copy()
+        if self._round_poker_hands is not None:
+            run._round_poker_hands = self._round_poker_hands.copy()
+        if self._chaos_used is not None:
+            run._chaos_used = set(clone_all(self._chaos_used))
+        if self._shop_cards is not None:
+            run._shop_cards = [
+                (self._clone_object(shop_card, copies), cost)
+                for shop_card, cost in self._shop_cards
+            ]
+        if self._shop_packs is not None:
+            run._shop_packs = self._shop_packs.copy()
+        if self._shop_vouchers is not None:
+            run._shop_vouchers = self._shop_vouchers.copy()
+        if self._pack_items is not None:
+            run._pack_items = clone_all(self._pack_items)
+        if self._cash_out is not None:
+            run._cash_out = self._cash_out.copy()
+
+        return run
+
     def discard(self, discard_indices: list[int]) -> None:
         """
         Discard cards from hand and draw new ones
@@ -2342,28 +3667,14 @@ class Run:
             discard_indices (list[int]): The indices of the cards in hand to discard (0-indexed)
         """
 
-        if self._state is not State.PLAYING_BLIND:
-            raise IllegalActionError(
-                f"Expected state to be PLAYING_BLIND, but got {self._state}"
-            )
-
-        if self._discards == 0:
-            raise NoDiscardsRemainingError("No discards left")
-
-        if not (1 <= len(discard_indices) <= 5):
-            raise InvalidArgumentsError(
-                f"Discard indices should have length 1-5, but got {len(discard_indices)}"
-            )
-
-        if any(i not in range(len(self._hand)) for i in discard_indices):
-            raise InvalidArgumentsError(
-                f"Discard indices should all be within the range of the hand, but got {discard_indices}"
-            )
+        error = self._check_discard(discard_indices, describe=True)
+        if error is not None:
+            raise error
 
-        if len(set(discard_indices)) < len(discard_indices):
-            raise InvalidArgumentsError(
-                f"Discard indices should all be unique, but got {discard_indices}"
-            )
+        self._dirty_sections.update(
+            ("consumables", "deck_cards_left", "hand", "jokers", "poker_hand_info")
+        )
+        self._unshare()
 
         self._discard(discard_indices)
 
@@ -2376,230 +3687,197 @@ class Run:
         if not self._deal():
             self._game_over()
 
-    def next_round(self) -> None:
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Run:
         """
-        Exit the shop and proceed to the next round
-        """
-
-        if self._state is not State.IN_SHOP:
-            raise IllegalActionError(
-                f"Expected state to be IN_SHOP, but got {self._state}"
-            )
-
-        self._reroll_cost = None
-        self._chaos_used = None
-        self._shop_cards = None
-        self._shop_packs = None
+        Restore a run from the state produced by to_bytes
 
-        self._state = State.SELECTING_BLIND
+        Args:
+            data (bytes): The serialized run
+        """
 
-    def play_hand(self, card_indices: list[int]) -> None:
+        run = load_run(data, Run, ChallengeRun)
+        run._ruleset = run._resolve_ruleset()
+        run._update_joker_hooks()
+        run._update_joker_types()
+        run._stats_cache = None
+        run._deck_counts_cache = None
+        run._samplers_cache = None
+        run._copy_targets_cache = None
+        run._dirty_sections = set(RUN_SECTIONS)
+        return run
+
+    def legal_action_masks(self, size: int) -> dict[Action, LegalActionMask]:
         """
-        Play a poker hand from cards in hand
+        The legal actions as fixed-size masks over each of their arguments, indices past the size are left out
 
         Args:
-            card_indices (list[int]): The indices of the cards in hand to play, in order (0-indexed)
+            size (int): The number of indices each mask covers
         """
 
-        if self._state is not State.PLAYING_BLIND:
-            raise IllegalActionError(
-                f"Expected state to be PLAYING_BLIND, but got {self._state}"
-            )
-
-        if not (1 <= len(card_indices) <= 5):
-            raise InvalidArgumentsError(
-                f"Card indices should have length 1-5, but got {len(card_indices)}"
-            )
-
-        if any(i not in range(len(self._hand)) for i in card_indices):
-            raise InvalidArgumentsError(
-                f"Card indices should all be within the range of the hand, but got {card_indices}"
-            )
-
-        if len(set(card_indices)) < len(card_indices):
-            raise InvalidArgumentsError(
-                f"Card indices should all be unique, but got {card_indices}"
-            )
-
-        if (
-            self._forced_selected_card_index is not None
-            and self._forced_selected_card_index not in card_indices
-        ):
-            raise MissingForcedSelectedCardError(
-                f"Forced selected card index {self._forced_selected_card_index} not in card indices {card_indices}"
-            )
-
-        self._hands -= 1
-        self._num_played_hands += 1
-
-        played_cards = [self._hand[i] for i in card_indices]
-
-        # TODO: check this
-        self._cards_played_ante.update(played_cards)
-
-        for i in sorted(card_indices, reverse=True):
-            self._hand.pop(i)
-
-        for played_card in played_cards:
-            played_card.is_face_down = False
-
-        poker_hands = self._get_poker_hands(played_cards)
-        poker_hands_played = sorted(poker_hands, reverse=True)
-        scored_card_indices = (
-            list(range(len(played_cards)))
-            if Splash in self._jokers
-            else [
-                i
-                for i, card in enumerate(played_cards)
-                if i in poker_hands[poker_hands_played[0]] or card.is_stone_card
-            ]
-        )
-
-        poker_hand_level = self._poker_hand_info[poker_hands_played[0]][0]
-        poker_hand_base_chips, poker_hand_base_mult = HAND_BASE_SCORE[
-            poker_hands_played[0]
-        ]
-        poker_hand_chips_scaling, poker_hand_mult_scaling = HAND_SCALING[
-            poker_hands_played[0]
-        ]
-        poker_hand_chips, poker_hand_mult = (
-            poker_hand_base_chips + poker_hand_chips_scaling * (poker_hand_level - 1),
-            poker_hand_base_mult + poker_hand_mult_scaling * (poker_hand_level - 1),
-        )
-        self._chips = poker_hand_chips
-        self._mult = poker_hand_mult
-
-        boss_blind_triggered = False
-
-        if self._boss_blind_disabled is False:
-            match self._blind:
-                case Blind.THE_OX:
-                    if poker_hands_played[0] is self._ox_poker_hand:
-                        self._money = 0
-                        boss_blind_triggered = True
-                case Blind.THE_ARM:
-                    if self._poker_hand_info[poker_hands_played[0]][0] > 1:
-                        boss_blind_triggered = True
-                    self._poker_hand_info[poker_hands_played[0]][0] = max(
-                        1, self._poker_hand_info[poker_hands_played[0]][0] - 1
-                    )
-                case Blind.THE_PSYCHIC:
-                    if len(played_cards) < 5:
-                        self._end_hand(
-                            played_cards,
-                            scored_card_indices,
-                            poker_hands_played,
-                            hand_not_allowed=True,
-                        )
-                        return
-                case Blind.THE_EYE:
-                    if poker_hands_played[0] in self._round_poker_hands:
-                        self._end_hand(
-                            played_cards,
-                            scored_card_indices,
-                            poker_hands_played,
-                            hand_not_allowed=True,
-                        )
-                        return
-                case Blind.THE_MOUTH:
-                    if (
-                        self._round_poker_hands
-                        and poker_hands_played[0] is not self._round_poker_hands[0]
-                    ):
-                        self._end_hand(
-                            played_cards,
-                            scored_card_indices,
-                            poker_hands_played,
-                            hand_not_allowed=True,
-                        )
-                        return
-                case Blind.THE_TOOTH:
-                    self._money -= 1 * len(played_cards)
-                case Blind.THE_FLINT:
-                    self._chips //= 2
-                    self._mult //= 2
-                    boss_blind_triggered = True
-
-        for joker in self._jokers:
-            joker._on_hand_played(played_cards, scored_card_indices, poker_hands_played)
-
-        self._poker_hand_info[poker_hands_played[0]][1] += 1
-
-        for i in scored_card_indices:
-            scored_card = played_cards[i]
-
-            if scored_card.is_debuffed:
-                boss_blind_triggered = True
-
-            self._trigger_scored_card(
-                scored_card, played_cards, scored_card_indices, poker_hands_played
+        masks = {
+            action: LegalActionMask(
+                [False] * size,
+                (
+                    [[False] * size for _ in range(size)]
+                    if action in (Action.BUY_SHOP_CARD, Action.MOVE_JOKER)
+                    else []
+                ),
+                [0] * size,
+                [0] * size,
             )
+            for action in Action
+        }
+        for legal_action in self.legal_actions():
+            mask = masks[legal_action.action]
+            args = legal_action.args
+            i = args[0] if args else 0
+            if i >= size:
+                continue
+
+            mask.indices[i] = True
+            if len(args) > 1 and args[1] < size:
+                mask.second_args[i][args[1]] = True
+            mask.min_cards[i] = legal_action.min_cards
+            mask.max_cards[i] = legal_action.max_cards
+            mask.forced_card_index = legal_action.forced_card_index
+        return masks
+
+    def legal_actions(self) -> Iterator[LegalAction]:
+        """
+        Yield every action that is legal in the current state, with the constraints on its arguments
+        """
 
-            if scored_card == Seal.RED:
-                self._trigger_scored_card(
-                    scored_card,
-                    played_cards,
-                    scored_card_indices,
-                    poker_hands_played,
-                )
+        if self._state is State.GAME_OVER:
+            return
 
-            for joker in self._jokers:
-                for _ in range(
-                    joker._on_card_scored_retriggers(
-                        scored_card,
-                        played_cards,
-                        scored_card_indices,
-                        poker_hands_played,
-                    )
-                ):
-                    self._trigger_scored_card(
-                        scored_card,
-                        played_cards,
-                        scored_card_indices,
-                        poker_hands_played,
+        match self._state:
+            case State.SELECTING_BLIND:
+                yield LegalAction(Action.SELECT_BLIND)
+                if self.check_skip_blind() is None:
+                    yield LegalAction(Action.SKIP_BLIND)
+                if self.check_reroll_boss_blind() is None:
+                    yield LegalAction(Action.REROLL_BOSS_BLIND)
+            case State.PLAYING_BLIND:
+                max_cards = min(5, len(self._hand))
+                if max_cards > 0:
+                    yield LegalAction(
+                        Action.PLAY_HAND,
+                        min_cards=1,
+                        max_cards=max_cards,
+                        forced_card_index=self._forced_selected_card_index,
                     )
+                    if self._discards > 0:
+                        yield LegalAction(
+                            Action.DISCARD, min_cards=1, max_cards=max_cards
+                        )
+            case State.CASHING_OUT:
+                yield LegalAction(Action.CASH_OUT)
+            case State.IN_SHOP:
+                for i in range(len(self._shop_cards)):
+                    for use in (False, True):
+                        if self.check_buy_shop_card(i, use) is None:
+                            yield LegalAction(Action.BUY_SHOP_CARD, (i, use))
+                for i in range(len(self._shop_vouchers)):
+                    if self.check_redeem_shop_voucher(i) is None:
+                        yield LegalAction(Action.REDEEM_SHOP_VOUCHER, (i,))
+                for i in range(len(self._shop_packs)):
+                    if self.check_open_shop_pack(i) is None:
+                        yield LegalAction(Action.OPEN_SHOP_PACK, (i,))
+                if self.check_reroll() is None:
+                    yield LegalAction(Action.REROLL)
+                yield LegalAction(Action.NEXT_ROUND)
+            case State.OPENING_PACK:
+                for i, item in enumerate(self._pack_items):
+                    if isinstance(item, Consumable):
+                        selected_cards = self._consumable_selected_cards(
+                            item, owned=False
+                        )
+                        if selected_cards is not None:
+                            yield LegalAction(
+                                Action.CHOOSE_PACK_ITEM,
+                                (i,),
+                                min_cards=selected_cards[0],
+                                max_cards=selected_cards[1],
+                            )
+                    elif self.check_choose_pack_item(i) is None:
+                        yield LegalAction(Action.CHOOSE_PACK_ITEM, (i,))
+                yield LegalAction(Action.SKIP_PACK)
+
+        for i in range(len(self._jokers)):
+            if self.check_sell_joker(i) is None:
+                yield LegalAction(Action.SELL_JOKER, (i,))
+            for new_index in range(len(self._jokers)):
+                if self.check_move_joker(i, new_index) is None:
+                    yield LegalAction(Action.MOVE_JOKER, (i, new_index))
+
+        for i, consumable in enumerate(self._consumables):
+            yield LegalAction(Action.SELL_CONSUMABLE, (i,))
+            selected_cards = self._consumable_selected_cards(consumable)
+            if selected_cards is not None:
+                yield LegalAction(
+                    Action.USE_CONSUMABLE,
+                    (i,),
+                    min_cards=selected_cards[0],
+                    max_cards=selected_cards[1],
+                )
 
-        for held_card in self._hand:
-            self._trigger_held_card(held_card)
+    def next_round(self) -> None:
+        """
+        Exit the shop and proceed to the next round
+        """
 
-            if held_card == Seal.RED:
-                self._trigger_held_card(held_card)
+        error = self._check_next_round(describe=True)
+        if error is not None:
+            raise error
 
-            for joker in self._jokers:
-                for _ in range(joker._on_card_held_retriggers(held_card)):
-                    self._trigger_held_card(held_card)
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
-        for joker in self._jokers:
-            match joker:
-                case Edition.FOIL:
-                    self._chips += 50
-                case Edition.HOLOGRAPHIC:
-                    self._mult += 10
+        self._reroll_cost = None
+        self._chaos_used = None
+        self._shop_cards = None
+        self._shop_packs = None
 
-            joker._on_independent(played_cards, scored_card_indices, poker_hands_played)
-            if boss_blind_triggered:
-                joker._on_boss_blind_triggered()
+        self._state = State.SELECTING_BLIND
 
-            for other_joker in self._jokers:
-                other_joker._on_dependent(joker)
+    def play_hand(self, card_indices: list[int]) -> None:
+        """
+        Play a poker hand from cards in hand
 
-            if joker == Edition.POLYCHROME:
-                self._mult *= 1.5
+        Args:
+            card_indices (list[int]): The indices of the cards in hand to play, in order (0-indexed)
+        """
 
-        if Voucher.OBSERVATORY in self._vouchers:
-            self._mult *= 1.5 ** self._consumables.count(poker_hands_played[0].planet)
+        error = self._check_play_hand(card_indices, describe=True)
+        if error is not None:
+            raise error
 
-        if self.challenge is Challenge.RICH_GET_RICHER:
-            self._chips = max(0, min(self._money, self._chips))
-        self._mult = round(self._mult, 9)  # floating-point imprecision
-        score = round(
+        # beating a boss blind also cashes in Investment Tags
+        self._dirty_sections.update(
             (
-                ((self._chips + self._mult) / 2) ** 2
-                if self._deck is Deck.PLASMA
-                else self._chips * self._mult
+                "consumables",
+                "deck_cards_left",
+                "hand",
+                "jokers",
+                "poker_hand_info",
+                "tags",
             )
-            - 1e-9
         )
+        self._unshare()
+
+        played_cards, scored_card_indices, poker_hands_played, score = self._score_hand(
+            card_indices
+        )
+        if score is None:
+            self._end_hand(
+                played_cards,
+                scored_card_indices,
+                poker_hands_played,
+                hand_not_allowed=True,
+            )
+            return
+
         self._round_score += score
         self._chips = None
         self._mult = None
@@ -2609,6 +3887,7 @@ class Run:
                 played_card.is_debuffed = True
             else:
                 played_card.is_debuffed = False
+        self._deck_counts_cache = None
 
         for joker in self._jokers[:]:
             joker._on_scoring_completed(
@@ -2629,7 +3908,7 @@ class Run:
             match self._blind:
                 case Blind.THE_HOOK:
                     if len(self._hand) >= 2:
-                        self._discard(r.sample(range(len(self._hand)), 2))
+                        self._discard(self._random.sample(range(len(self._hand)), 2))
                     elif len(self._hand) == 1:
                         self._discard([0])
                 case Blind.CRIMSON_HEART:
@@ -2637,44 +3916,88 @@ class Run:
 
         self._end_hand(played_cards, scored_card_indices, poker_hands_played)
 
-    def move_joker(self, old_index: int, new_index: int) -> None:
+    def preview_play_hand(
+        self,
+        card_indices: list[int],
+        chance_mode: ChanceMode = ChanceMode.EXPECTED,
+    ) -> HandPreview:
         """
-        Move a Joker to a new position in the Joker slots
+        Score a poker hand from cards in hand without playing it
 
         Args:
-            old_index (int): The index of the Joker to move (0-indexed)
-            new_index (int): The index to move the Joker to (0-indexed)
+            card_indices (list[int]): The indices of the cards in hand to play, in order (0-indexed)
+            chance_mode (ChanceMode, optional): How probabilistic effects are resolved, as their expected value, sampled from the run's current random state (the outcome of playing the hand now), or as all misses
         """
 
-        if self.is_game_over:
-            raise IllegalActionError(f"Expected state to not be GAME_OVER")
+        error = self._check_play_hand(card_indices, describe=True)
+        if error is not None:
+            raise error
 
-        if old_index not in range(len(self._jokers)):
-            raise InvalidArgumentsError(
-                f"Joker index should be in range(len(jokers)), but got {old_index}"
-            )
+        if chance_mode is not ChanceMode.EXPECTED:
+            return self._preview_score_hand(card_indices, chance_mode)
 
-        if new_index not in range(len(self._jokers)):
-            raise InvalidArgumentsError(
-                f"New index should be in range(len(jokers)), but got {new_index}"
-            )
+        # branch on every chance roll, most likely outcomes first, until the branch
+        # budget is spent and weight the explored outcomes by their probability
+        poker_hand = None
+        chips = mult = score = total_probability = 0.0
+        branches = [(-1.0, [])]
+        for _ in range(PREVIEW_CHANCE_BRANCHES):
+            if not branches:
+                break
 
-        if new_index == old_index:
-            raise InvalidArgumentsError(
-                f"New index should not be the same as the Joker index, but got {old_index}, {new_index}"
-            )
+            probability, outcomes = heappop(branches)
+            probability = -probability
 
-        if self.challenge is Challenge.ON_A_KNIFES_EDGE and (
-            old_index == 0 or new_index == 0
-        ):
-            raise PinnedJokerMovedError(
-                f"Cannot move the pinned {self._jokers[0]} during {Challenge.ON_A_KNIFES_EDGE}"
+            chance_rolls = []
+            preview = self._preview_score_hand(
+                card_indices, chance_mode, outcomes, chance_rolls
             )
 
+            for i, roll in enumerate(chance_rolls[len(outcomes) :], len(outcomes)):
+                heappush(
+                    branches,
+                    (
+                        -probability * roll,
+                        outcomes + [False] * (i - len(outcomes)) + [True],
+                    ),
+                )
+                probability *= 1 - roll
+
+            poker_hand = preview.poker_hand
+            chips += probability * preview.chips
+            mult += probability * preview.mult
+            score += probability * preview.score
+            total_probability += probability
+
+        return HandPreview(
+            poker_hand,
+            chips / total_probability,
+            mult / total_probability,
+            score / total_probability,
+        )
+
+    def move_joker(self, old_index: int, new_index: int) -> None:
+        """
+        Move a Joker to a new position in the Joker slots
+
+        Args:
+            old_index (int): The index of the Joker to move (0-indexed)
+            new_index (int): The index to move the Joker to (0-indexed)
+        """
+
+        error = self._check_move_joker(old_index, new_index, describe=True)
+        if error is not None:
+            raise error
+
+        self._dirty_sections.add("jokers")
+        self._unshare()
+
         self._jokers.insert(new_index, self._jokers.pop(old_index))
+        self._update_joker_hooks()
 
         for joker in self._jokers:
             joker._on_jokers_moved()
+        self._copy_targets_cache = None
 
     def open_shop_pack(self, shop_pack_index: int) -> None:
         """
@@ -2684,23 +4007,15 @@ class Run:
             shop_pack_index (int): The index of the shop pack (0-indexed)
         """
 
-        if self._state is not State.IN_SHOP:
-            raise IllegalActionError(f"Expected state IN_SHOP, got {self._state}")
-
-        if shop_pack_index not in range(len(self._shop_packs)):
-            raise InvalidArgumentsError(
-                f"Invalid shop pack index {shop_pack_index}, must be in range({len(self._shop_packs)})"
-            )
-
-        shop_pack, cost = self._shop_packs[shop_pack_index]
+        error = self._check_open_shop_pack(shop_pack_index, describe=True)
+        if error is not None:
+            raise error
 
-        if self._available_money < cost:
-            raise InsufficientFundsError(
-                f"Insufficient funds to buy {shop_pack!r}, cost: {cost}, available: {self._available_money}"
-            )
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
+        shop_pack, cost = self._shop_packs.pop(shop_pack_index)
         self._money -= cost
-        self._shop_packs.pop(shop_pack_index)
 
         if self.challenge is Challenge.INFLATION:
             self._inflation_amount += 1
@@ -2716,29 +4031,23 @@ class Run:
             shop_voucher_index (int): The index of the shop voucher (0-indexed)
         """
 
-        if self._state is not State.IN_SHOP:
-            raise IllegalActionError(f"Expected state IN_SHOP, got {self._state}")
-
-        if shop_voucher_index not in range(len(self._shop_vouchers)):
-            raise InvalidArgumentsError(
-                f"Invalid shop voucher index {shop_voucher_index}, must be in range({len(self._shop_vouchers)})"
-            )
-
-        shop_voucher, cost = self._shop_vouchers[shop_voucher_index]
+        error = self._check_redeem_shop_voucher(shop_voucher_index, describe=True)
+        if error is not None:
+            raise error
 
-        if self._available_money < cost:
-            raise InsufficientFundsError(
-                f"Insufficient funds to buy {shop_voucher!r}, cost: {cost}, available: {self._available_money}"
-            )
+        self._dirty_sections.update(("shop_cards", "vouchers"))
+        self._unshare()
 
+        shop_voucher, cost = self._shop_vouchers.pop(shop_voucher_index)
         self._money -= cost
-        self._shop_vouchers.pop(shop_voucher_index)
 
         if self.challenge is Challenge.INFLATION:
             self._inflation_amount += 1
             self._update_shop_costs()
 
         self._vouchers.add(shop_voucher)
+        self._stats_cache = None
+        self._samplers_cache = None
 
         match shop_voucher:
             case Voucher.OVERSTOCK | Voucher.OVERSTOCK_PLUS:
@@ -2753,17 +4062,14 @@ class Run:
         Reroll the shop cards
         """
 
-        if self._state is not State.IN_SHOP:
-            raise IllegalActionError(
-                f"Expected state to be IN_SHOP, but got {self._state}"
-            )
+        error = self._check_reroll(describe=True)
+        if error is not None:
+            raise error
 
-        reroll_cost = self.reroll_cost
+        self._dirty_sections.update(("jokers", "shop_cards"))
+        self._unshare()
 
-        if self._available_money < reroll_cost:
-            raise InsufficientFundsError(
-                f"Cannot afford reroll cost {reroll_cost} with available money {self._available_money}"
-            )
+        reroll_cost = self.reroll_cost
 
         self._money -= reroll_cost
 
@@ -2786,25 +4092,11 @@ class Run:
         Reroll the boss blind (requires the Director's Cut voucher)
         """
 
-        if self._state is not State.SELECTING_BLIND:
-            raise IllegalActionError(
-                f"Expected state to be SELECTING_BLIND, but got {self._state}"
-            )
-
-        if Voucher.DIRECTORS_CUT not in self._vouchers:
-            raise IllegalBossRerollError(
-                f"Cannot reroll boss blind without Director's Cut Voucher"
-            )
-
-        if Voucher.RETCON not in self._vouchers and self._rerolled_boss_blind:
-            raise IllegalBossRerollError(
-                f"Cannot reroll boss blind more than once per ante without Retcon Voucher"
-            )
+        error = self._check_reroll_boss_blind(describe=True)
+        if error is not None:
+            raise error
 
-        if self._available_money < 10:
-            raise InsufficientFundsError(
-                f"Cannot afford boss blind reroll ($10) with available money {self._available_money}"
-            )
+        self._unshare()
 
         self._money -= 10
 
@@ -2812,15 +4104,44 @@ class Run:
 
         self._rerolled_boss_blind = True
 
+    def rollback(self, checkpoint: Checkpoint) -> None:
+        """
+        Restore the run in place to a checkpoint, which stays valid for later rollbacks
+
+        Args:
+            checkpoint (Checkpoint): A checkpoint returned by checkpoint on this run
+        """
+
+        if checkpoint.run is not self:
+            raise ValueError("Cannot roll back to a checkpoint of another run")
+
+        self.__dict__.clear()
+        self.__dict__.update(checkpoint.attributes)
+
+        for container, contents in checkpoint.containers:
+            if isinstance(container, list):
+                container[:] = contents
+            else:
+                container.clear()
+                container.update(contents)
+
+        for item, fields in checkpoint.items:
+            item.__dict__.clear()
+            item.__dict__.update(_copy_fields(fields))
+
+        self._dirty_sections = set(RUN_SECTIONS)
+
     def select_blind(self) -> None:
         """
         Play the current blind
         """
 
-        if self._state is not State.SELECTING_BLIND:
-            raise IllegalActionError(
-                f"Expected state to be SELECTING_BLIND, but got {self._state}"
-            )
+        error = self._check_select_blind(describe=True)
+        if error is not None:
+            raise error
+
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
         self._round += 1
         self._round_score = 0
@@ -2871,12 +4192,14 @@ class Run:
             case Blind.AMBER_ACORN:
                 for joker in self._jokers:
                     joker.is_flipped = True
-                r.shuffle(self._jokers)
+                self._random.shuffle(self._jokers)
+                self._update_joker_hooks()
             case Blind.VERDANT_LEAF:
                 for card in self._deck_cards:
                     card.is_debuffed = True
             case Blind.CRIMSON_HEART:
                 self._debuff_random_joker()
+        self._deck_counts_cache = None
 
         while Tag.JUGGLE in self._tags:
             self._tags.remove(Tag.JUGGLE)
@@ -2898,13 +4221,12 @@ class Run:
             consumable_index (int): The index of the consumable to sell (0-indexed)
         """
 
-        if self.is_game_over:
-            raise IllegalActionError(f"Expected state to not be GAME_OVER")
+        error = self._check_sell_consumable(consumable_index, describe=True)
+        if error is not None:
+            raise error
 
-        if consumable_index not in range(len(self._consumables)):
-            raise InvalidArgumentsError(
-                f"Consumable index should be in range(len({len(self._consumables)})), but got {consumable_index}"
-            )
+        self._dirty_sections.add("consumables")
+        self._unshare()
 
         sold_consumable = self._consumables[consumable_index]
 
@@ -2923,29 +4245,30 @@ class Run:
             joker_index (int): The index of the Joker to sell (0-indexed)
         """
 
-        if self.is_game_over:
-            raise IllegalActionError(f"Expected state to not be GAME_OVER")
+        error = self._check_sell_joker(joker_index, describe=True)
+        if error is not None:
+            raise error
 
-        if joker_index not in range(len(self._jokers)):
-            raise InvalidArgumentsError(
-                f"Joker index should be in range(len({len(self._jokers)})), but got {joker_index}"
-            )
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
         sold_joker = self._jokers[joker_index]
 
-        if sold_joker.is_eternal:
-            raise EternalJokerSoldError(f"Cannot sell eternal Joker {sold_joker}")
-
         if self._blind is Blind.VERDANT_LEAF:
             self._disable_boss_blind()
 
         self._jokers.pop(joker_index)
+        self._update_joker_hooks()
+        self._update_joker_types()
+        self._stats_cache = None
+        self._copy_targets_cache = None
 
         sold_joker._on_sold()
 
         for joker in self._jokers:
             joker._on_item_sold(sold_joker)
             joker._on_jokers_moved()
+        self._copy_targets_cache = None
 
         self._money += self._calculate_sell_value(sold_joker)
 
@@ -2954,13 +4277,12 @@ class Run:
         Skip the current blind and obtain its skip tag
         """
 
-        if self._state is not State.SELECTING_BLIND:
-            raise IllegalActionError(
-                f"Expected state to be SELECTING_BLIND, but got {self._state}"
-            )
+        error = self._check_skip_blind(describe=True)
+        if error is not None:
+            raise error
 
-        if self._is_boss_blind:
-            raise IllegalSkipError(f"Cannot skip boss blind {self._blind}")
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
         tag, orbital_hand = self._ante_tags[self._blind is Blind.BIG_BLIND]
 
@@ -3003,16 +4325,34 @@ class Run:
         Close the opened pack
         """
 
-        if self._state is not State.OPENING_PACK:
-            raise IllegalActionError(
-                f"Expected state to be OPENING_PACK, but got {self._state}"
-            )
+        error = self._check_skip_pack(describe=True)
+        if error is not None:
+            raise error
+
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
         for joker in self.jokers:
             joker._on_pack_skipped()
 
         self._close_pack()
 
+    def take_dirty_sections(self) -> set[str]:
+        """
+        Get the sections of the run (names in RUN_SECTIONS) that actions may have changed since the last call, e.g. to update an observation incrementally
+        """
+
+        dirty_sections = self._dirty_sections
+        self._dirty_sections = set()
+        return dirty_sections
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the full state of the run, including its random state, into a compact binary format
+        """
+
+        return dump_run(self)
+
     def use_consumable(
         self, consumable_index: int, card_indices: list[int] | None = None
     ) -> None:
@@ -3024,81 +4364,50 @@ class Run:
             card_indices (list[int], optional): The indices of the cards in hand to use the consumable on (0-indexed), or none
         """
 
-        if self.is_game_over:
-            raise IllegalActionError(f"Expected state to not be GAME_OVER")
+        error = self._check_use_consumable(
+            consumable_index, card_indices, describe=True
+        )
+        if error is not None:
+            raise error
 
-        if consumable_index not in range(len(self._consumables)):
-            raise InvalidArgumentsError(
-                f"Consumable index should be in range(len(consumables)), but got {consumable_index}"
-            )
+        self._dirty_sections.update(RUN_SECTIONS)
+        self._unshare()
 
-        consumable = self._consumables[consumable_index]
-        self._consumables.pop(consumable_index)
-        try:
-            self._use_consumable(consumable, card_indices)
-        except BalatroError:
-            self._consumables.insert(consumable_index, consumable)
-            raise
+        self._use_consumable(self._consumables.pop(consumable_index), card_indices)
 
     @property
     def _available_money(self) -> int:
-        return max(0, self._money + 20 * self._jokers.count(CreditCard))
+        return max(0, self._money + 20 * self._joker_types[CreditCard])
 
     @property
-    def _discards_per_round(self) -> int:
-        discards_per_round = (
-            CHALLENGE_SETUPS[self._challenge].discards_per_round
-            if isinstance(self, ChallengeRun)
-            else 3
-        )
-
-        if self._deck is Deck.RED:
-            discards_per_round += 1
-
-        if self._stake >= Stake.BLUE:
-            discards_per_round -= 1
-
-        if Voucher.WASTEFUL in self._vouchers:
-            discards_per_round += 1
-        if Voucher.RECYCLOMANCY in self._vouchers:
-            discards_per_round += 1
-        if Voucher.PETROGLYPH in self._vouchers:
-            discards_per_round -= 1
+    def _copy_targets(self) -> dict[CopyJoker, BalatroJoker | None]:
+        if self._copy_targets_cache is None:
+            self._copy_targets_cache = self._compute_copy_targets()
+        elif self.check_copy_targets:
+            copy_targets = self._compute_copy_targets()
+            assert (
+                self._copy_targets_cache == copy_targets
+            ), f"Stale copy targets {self._copy_targets_cache}, expected {copy_targets}"
+        return self._copy_targets_cache
 
-        for joker in self.jokers:
-            if joker == Drunkard:
-                discards_per_round += 1
-            elif joker == MerryAndy:
-                discards_per_round += 3
+    @property
+    def _deck_counts(self) -> dict[str, Counter]:
+        if self._deck_counts_cache is None:
+            self._deck_counts_cache = self._compute_deck_counts()
+        elif self.check_deck_counts:
+            deck_counts = self._compute_deck_counts()
+            assert (
+                self._deck_counts_cache == deck_counts
+            ), f"Stale deck counts {self._deck_counts_cache}, expected {deck_counts}"
+        return self._deck_counts_cache
 
-        return max(0, discards_per_round)
+    @property
+    def _discards_per_round(self) -> int:
+        return max(0, self._stats["discards_per_round"])
 
     @property
     def _hands_per_round(self) -> int:
-        hands_per_round = (
-            CHALLENGE_SETUPS[self._challenge].hands_per_round
-            if isinstance(self, ChallengeRun)
-            else 4
-        )
-
-        match self._deck:
-            case Deck.BLUE:
-                hands_per_round += 1
-            case Deck.BLACK:
-                hands_per_round -= 1
-
-        if Voucher.GRABBER in self._vouchers:
-            hands_per_round += 1
-        if Voucher.NACHO_TONG in self._vouchers:
-            hands_per_round += 1
-        if Voucher.HIEROGLYPH in self._vouchers:
-            hands_per_round -= 1
-
-        for joker in self.jokers:
-            if joker == Troubadour:
-                hands_per_round -= 1
-
-        return max(1, hands_per_round)
+        return max(1, self._stats["hands_per_round"])
 
     @property
     def _is_boss_blind(self) -> bool:
@@ -3115,6 +4424,23 @@ class Run:
             key=lambda poker_hand: self._poker_hand_info[poker_hand][1],
         )
 
+    @property
+    def _samplers(self) -> dict[str, object]:
+        if self._samplers_cache is None:
+            self._samplers_cache = self._compute_samplers()
+        return self._samplers_cache
+
+    @property
+    def _stats(self) -> dict[str, int]:
+        if self._stats_cache is None:
+            self._stats_cache = self._compute_stats()
+        elif self.check_stats_cache:
+            stats = self._compute_stats()
+            assert (
+                self._stats_cache == stats
+            ), f"Stale stats cache {self._stats_cache}, expected {stats}"
+        return self._stats_cache
+
     @property
     def _unlocked_poker_hands(self) -> list[PokerHand]:
         return [
@@ -3144,6 +4470,12 @@ class Run:
 
         return self._ante_tags
 
+    @property
+    def big_numbers(self) -> bool:
+        """Whether the run scores with BigNumbers once scores are past the largest float"""
+
+        return self._big_numbers
+
     @property
     def blind(self) -> Blind:
         """The current blind"""
@@ -3178,25 +4510,10 @@ class Run:
     def consumable_slots(self) -> int:
         """The number of consumable slots available"""
 
-        consumable_slots = (
-            CHALLENGE_SETUPS[self._challenge].consumable_slots
-            if isinstance(self, ChallengeRun)
-            else 2
-        )
-
-        match self._deck:
-            case Deck.NEBULA:
-                consumable_slots -= 1
-
-        if Voucher.CRYSTAL_BALL in self._vouchers:
-            consumable_slots += 1
-
-        consumable_slots += sum(
+        return self._stats["consumable_slots"] + sum(
             consumable.is_negative for consumable in self._consumables
         )
 
-        return consumable_slots
-
     @property
     def consumables(self) -> list[Consumable]:
         """The consumables in possession"""
@@ -3232,13 +4549,14 @@ class Run:
 
     @property
     def deck_cards_left(self) -> list[Card]:
-        """The cards remaining in the deck"""
+        """The cards remaining in the deck, in deck order"""
 
-        return (
-            self._deck_cards_left
-            if self._deck_cards_left is not None
-            else self._deck_cards
-        )
+        if self._deck_cards_left is None:
+            return self._deck_cards
+
+        # dealing swaps cards out of the remaining deck, which leaves it out of order
+        deck_cards_left = set(self._deck_cards_left)
+        return [card for card in self._deck_cards if card in deck_cards_left]
 
     @property
     def discards(self) -> int:
@@ -3264,37 +4582,11 @@ class Run:
     def hand_size(self) -> int:
         """The current hand size"""
 
-        hand_size = (
-            CHALLENGE_SETUPS[self._challenge].hand_size
-            if isinstance(self, ChallengeRun)
-            else 8
-        )
+        hand_size = self._stats["hand_size"] - self._hand_size_penalty
 
         if self.challenge is Challenge.LUXURY_TAX:
             hand_size -= self._money // 5
 
-        if self.deck is Deck.PAINTED:
-            hand_size -= 2
-
-        if Voucher.PAINT_BRUSH in self._vouchers:
-            hand_size += 1
-        if Voucher.PALETTE in self._vouchers:
-            hand_size += 1
-
-        for joker in self.jokers:
-            if joker == Stuntman:
-                hand_size -= 2
-            elif joker == TurtleBean:
-                hand_size += joker.hand_size_increase
-            elif joker == Juggler:
-                hand_size += 1
-            elif joker == MerryAndy:
-                hand_size -= 1
-            elif joker == Troubadour:
-                hand_size += 2
-
-        hand_size -= self._hand_size_penalty
-
         if self._boss_blind_disabled is False and self._blind is Blind.THE_MANACLE:
             hand_size -= 1
 
@@ -3316,28 +4608,7 @@ class Run:
     def joker_slots(self) -> int:
         """The number of Joker slots available"""
 
-        joker_slots = (
-            0
-            if (self.challenge is Challenge.TYPECAST and self.ante > 4)
-            else (
-                CHALLENGE_SETUPS[self._challenge].joker_slots
-                if isinstance(self, ChallengeRun)
-                else 5
-            )
-        )
-
-        match self._deck:
-            case Deck.BLACK:
-                joker_slots += 1
-            case Deck.PAINTED:
-                joker_slots -= 1
-
-        if Voucher.ANTIMATTER in self._vouchers:
-            joker_slots += 1
-
-        joker_slots += self._jokers.count(Edition.NEGATIVE)
-
-        return joker_slots
+        return self._stats["joker_slots"]
 
     @property
     def jokers(self) -> list[BalatroJoker]:
@@ -3397,13 +4668,13 @@ class Run:
         return self._round
 
     @property
-    def round_goal(self) -> float | None:
+    def round_goal(self) -> float | BigNumber | None:
         """The required chips for the round"""
 
         return self._round_goal
 
     @property
-    def round_score(self) -> float:
+    def round_score(self) -> float | BigNumber:
         """The chips scored so far in the round"""
 
         return self._round_score if self._round_score is not None else 0
@@ -3452,7 +4723,9 @@ class Run:
 
 
 class ChallengeRun(Run):
-    def __init__(self, challenge: Challenge) -> None:
+    def __init__(
+        self, challenge: Challenge, seed: str | None = None, big_numbers: bool = False
+    ) -> None:
         self._challenge: Challenge = challenge
 
-        super().__init__(Deck.CHALLENGE)
+        super().__init__(Deck.CHALLENGE, seed=seed, big_numbers=big_numbers)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from math import floor, frexp, ldexp, log2, log10
+from types import MappingProxyType
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -70,6 +72,23 @@ class Sellable:
     _extra_sell_value: int = field(default=0, init=False, repr=False)
 
 
+# hooks that are only dispatched to the Jokers implementing them, mapped to the
+# methods each of them calls
+JOKER_HOOKS: dict[str, tuple[str, ...]] = {
+    "_on_boss_blind_triggered": ("_boss_blind_triggered_ability",),
+    "_on_card_added": ("_card_added_action",),
+    "_on_card_destroyed": ("_card_destroyed_action",),
+    "_on_card_held": ("_card_held_ability",),
+    "_on_card_held_retriggers": ("_card_held_retriggers",),
+    "_on_card_scored": ("_card_scored_action", "_card_scored_ability"),
+    "_on_card_scored_retriggers": ("_card_scored_retriggers",),
+    "_on_dependent": ("_dependent_ability",),
+    "_on_hand_played": ("_hand_played_action", "_hand_played_ability"),
+    "_on_independent": ("_independent_ability",),
+    "_on_lucky_card_triggered": ("_lucky_card_triggered_action",),
+}
+
+
 @dataclass(eq=False)
 class BalatroJoker(Sellable):
     _run: Run | None = field(default=None, init=False, repr=False)
@@ -111,6 +130,19 @@ class BalatroJoker(Sellable):
 
         return get_sprite(self, card_back=card_back, as_image=False)
 
+    @classmethod
+    def _implemented_hooks(cls) -> tuple[str, ...]:
+        if "_hooks" not in cls.__dict__:
+            cls._hooks = tuple(
+                hook
+                for hook, methods in JOKER_HOOKS.items()
+                if any(
+                    getattr(cls, method) is not getattr(BalatroJoker, method)
+                    for method in (hook, *methods)
+                )
+            )
+        return cls._hooks
+
     def _blind_selected_ability(self) -> None:
         pass
 
@@ -362,6 +394,9 @@ class BalatroJoker(Sellable):
             self.num_perishable_rounds_left -= 1
             if self.num_perishable_rounds_left == 0:
                 self.is_debuffed = True
+                self._run._update_joker_types()
+                self._run._stats_cache = None
+                self._run._copy_targets_cache = None
                 return
 
         self._round_ended_action()
@@ -446,36 +481,24 @@ class CopyJoker(BalatroJoker, ABC):
     _copy_loop: bool = field(default=False, init=False, repr=False)
 
     def _blind_selected_ability(self) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._blind_selected_ability()
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._blind_selected_ability()
 
     def _boss_blind_triggered_ability(self) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._boss_blind_triggered_ability()
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._boss_blind_triggered_ability()
 
     def _card_held_ability(self, held_card: Card) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._card_held_ability(held_card)
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._card_held_ability(held_card)
 
     def _card_held_retriggers(self, held_card: Card) -> int:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            return self._copied_joker._card_held_retriggers(held_card)
+        copy_target = self._copy_target
+        if copy_target is not None:
+            return copy_target._card_held_retriggers(held_card)
         return 0
 
     def _card_scored_ability(
@@ -485,12 +508,9 @@ class CopyJoker(BalatroJoker, ABC):
         scored_card_indices: list[int],
         poker_hands_played: list[PokerHand],
     ) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._card_scored_ability(
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._card_scored_ability(
                 scored_card, played_cards, scored_card_indices, poker_hands_played
             )
 
@@ -501,31 +521,22 @@ class CopyJoker(BalatroJoker, ABC):
         scored_card_indices: list[int],
         poker_hands_played: list[PokerHand],
     ) -> int:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            return self._copied_joker._card_scored_retriggers(
+        copy_target = self._copy_target
+        if copy_target is not None:
+            return copy_target._card_scored_retriggers(
                 scored_card, played_cards, scored_card_indices, poker_hands_played
             )
         return 0
 
     def _dependent_ability(self, other_joker: BalatroJoker) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._dependent_ability(other_joker)
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._dependent_ability(other_joker)
 
     def _discard_ability(self, discarded_cards: list[Card]) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._discard_ability(discarded_cards)
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._discard_ability(discarded_cards)
 
     def _hand_played_ability(
         self,
@@ -533,12 +544,9 @@ class CopyJoker(BalatroJoker, ABC):
         scored_card_indices: list[int],
         poker_hands_played: list[PokerHand],
     ) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._hand_played_ability(
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._hand_played_ability(
                 played_cards, scored_card_indices, poker_hands_played
             )
 
@@ -548,43 +556,50 @@ class CopyJoker(BalatroJoker, ABC):
         scored_card_indices: list[int],
         poker_hands_played: list[PokerHand],
     ) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._independent_ability(
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._independent_ability(
                 played_cards, scored_card_indices, poker_hands_played
             )
 
     def _pack_opened_ability(self) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._pack_opened_ability()
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._pack_opened_ability()
 
     def _shop_exited_ability(self) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._shop_exited_ability()
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._shop_exited_ability()
 
     def _sold_ability(self) -> None:
-        if (
-            not self._copy_loop
-            and self._copied_joker is not None
-            and not self._copied_joker.is_debuffed
-        ):
-            self._copied_joker._sold_ability()
+        copy_target = self._copy_target
+        if copy_target is not None:
+            copy_target._sold_ability()
 
     @abstractmethod
     def _on_jokers_moved(self) -> None:
         pass
 
+    def _resolve_copy_target(self) -> BalatroJoker | None:
+        # follow the copy chain to the Joker whose abilities are used, None if the
+        # chain loops, ends without a Joker or passes through a debuffed Joker
+        joker = self
+        while isinstance(joker, CopyJoker):
+            if joker._copy_loop or joker._copied_joker is None:
+                return None
+            joker = joker._copied_joker
+            if joker.is_debuffed:
+                return None
+        return joker
+
+    @property
+    def _copy_target(self) -> BalatroJoker | None:
+        copy_targets = self._run._copy_targets
+        if self in copy_targets:
+            return copy_targets[self]
+        return self._resolve_copy_target()
+
 
 @dataclass(eq=False)
 class Consumable(Sellable):
@@ -606,8 +621,11 @@ class Consumable(Sellable):
         return get_sprite(self, as_image=False)
 
 
+_RANK_CHIPS = {rank: rank.chips for rank in Rank}
+
+
 @total_ordering
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Card:
     rank: Rank
     suit: Suit
@@ -619,28 +637,32 @@ class Card:
     is_debuffed: bool = field(default=False, init=False, repr=False)
     is_face_down: bool = field(default=False, init=False, repr=False)
 
+    def __copy__(self) -> Card:
+        card = object.__new__(type(self))
+        card.rank = self.rank
+        card.suit = self.suit
+        card.enhancement = self.enhancement
+        card.seal = self.seal
+        card.edition = self.edition
+        card.extra_chips = self.extra_chips
+        card.is_debuffed = self.is_debuffed
+        card.is_face_down = self.is_face_down
+        return card
+
     def __eq__(self, other: Card | Rank | Suit | Enhancement | Seal | Edition) -> bool:
-        match other:
-            case Card():
-                return self is other
-            case Rank():
-                return (
-                    not self.is_debuffed
-                    and not self.is_stone_card
-                    and self.rank is other
-                )
-            case Suit():
-                return (
-                    not self.is_debuffed
-                    and not self.is_stone_card
-                    and self.suit is other
-                )
-            case Enhancement():
-                return not self.is_debuffed and self.enhancement is other
-            case Seal():
-                return not self.is_debuffed and self.seal is other
-            case Edition():
-                return not self.is_debuffed and self.edition is other
+        other_type = type(other)
+        if other_type is Rank:
+            return self.has_rank(other)
+        if other_type is Suit:
+            return self.has_suit(other)
+        if other_type is Enhancement:
+            return self.has_enhancement(other)
+        if other_type is Seal:
+            return not self.is_debuffed and self.seal is other
+        if other_type is Edition:
+            return not self.is_debuffed and self.edition is other
+        if isinstance(other, Card):
+            return self is other
 
         return NotImplemented
 
@@ -662,17 +684,197 @@ class Card:
 
         return get_sprite(self, card_back=card_back, as_image=False)
 
+    def has_enhancement(self, enhancement: Enhancement) -> bool:
+        """
+        Whether the card has the enhancement and is not debuffed
+
+        Args:
+            enhancement (Enhancement): The enhancement to check for
+        """
+
+        return not self.is_debuffed and self.enhancement is enhancement
+
+    def has_rank(self, rank: Rank) -> bool:
+        """
+        Whether the card has the rank and is neither debuffed nor a Stone Card
+
+        Args:
+            rank (Rank): The rank to check for
+        """
+
+        return (
+            not self.is_debuffed
+            and self.rank is rank
+            and self.enhancement is not Enhancement.STONE
+        )
+
+    def has_suit(self, suit: Suit) -> bool:
+        """
+        Whether the card has the suit and is neither debuffed nor a Stone Card
+
+        Args:
+            suit (Suit): The suit to check for
+        """
+
+        return (
+            not self.is_debuffed
+            and self.suit is suit
+            and self.enhancement is not Enhancement.STONE
+        )
+
     @property
     def chips(self) -> int:
         if self.is_debuffed:
             return 0
-        return (50 if self.is_stone_card else self.rank.chips) + self.extra_chips
+        if self.enhancement is Enhancement.STONE:
+            return 50 + self.extra_chips
+        return _RANK_CHIPS[self.rank] + self.extra_chips
 
     @property
     def is_stone_card(self) -> bool:
         return self.enhancement is Enhancement.STONE
 
 
+def _split_number(number: float | int | BigNumber) -> tuple[float, int]:
+    # the mantissa and binary exponent of a number, ints too large for a float are
+    # shifted down first
+    if type(number) is BigNumber:
+        return number.mantissa, number.exponent
+    if type(number) is int and number.bit_length() > 1000:
+        shift = number.bit_length() - 64
+        mantissa, exponent = frexp(float(number >> shift))
+        return mantissa, exponent + shift
+    return frexp(number)
+
+
+@total_ordering
+@dataclass(eq=False, slots=True)
+class BigNumber:
+    """
+    A number stored as a float mantissa and an int binary exponent, so it can go past the largest float
+
+    Within the float range every operation rounds exactly like the same float operation, since scaling by powers of two is exact
+    """
+
+    mantissa: float
+    exponent: int
+
+    def __init__(self, mantissa: float | int, exponent: int = 0) -> None:
+        self.mantissa, shift = _split_number(mantissa)
+        self.exponent = exponent + shift if self.mantissa else 0
+
+    def __abs__(self) -> BigNumber:
+        return BigNumber(abs(self.mantissa), self.exponent)
+
+    def __add__(self, other: float | int | BigNumber) -> BigNumber:
+        mantissa, exponent = _split_number(other)
+        if exponent > self.exponent:
+            return BigNumber(
+                mantissa + ldexp(self.mantissa, self.exponent - exponent), exponent
+            )
+        return BigNumber(
+            self.mantissa + ldexp(mantissa, exponent - self.exponent), self.exponent
+        )
+
+    def __bool__(self) -> bool:
+        return self.mantissa != 0
+
+    def __eq__(self, other: float | int | BigNumber) -> bool:
+        if not isinstance(other, (float, int, BigNumber)):
+            return NotImplemented
+        return (self - other).mantissa == 0
+
+    def __float__(self) -> float:
+        try:
+            return ldexp(self.mantissa, self.exponent)
+        except OverflowError:
+            return float("inf") if self.mantissa > 0 else float("-inf")
+
+    def __floordiv__(self, other: float | int | BigNumber) -> BigNumber:
+        if self.exponent <= 1024 and _split_number(other)[1] <= 1024:
+            return BigNumber(float(self) // float(other))
+
+        # past 2 ** 53 every float is whole, so only small quotients need flooring
+        quotient = self / other
+        return (
+            BigNumber(floor(float(quotient))) if quotient.exponent <= 53 else quotient
+        )
+
+    def __format__(self, format_spec: str) -> str:
+        if self.exponent <= 1024:
+            return format(float(self), format_spec)
+
+        log = log10(abs(self.mantissa)) + self.exponent * log10(2)
+        exponent = floor(log)
+        return (
+            f"{'-' if self.mantissa < 0 else ''}{10 ** (log - exponent):.3f}e{exponent}"
+        )
+
+    def __hash__(self) -> int:
+        return hash(float(self)) if self.exponent <= 1024 else hash(self.mantissa)
+
+    def __lt__(self, other: float | int | BigNumber) -> bool:
+        if not isinstance(other, (float, int, BigNumber)):
+            return NotImplemented
+        return (self - other).mantissa < 0
+
+    def __mul__(self, other: float | int | BigNumber) -> BigNumber:
+        mantissa, exponent = _split_number(other)
+        return BigNumber(self.mantissa * mantissa, self.exponent + exponent)
+
+    def __neg__(self) -> BigNumber:
+        return BigNumber(-self.mantissa, self.exponent)
+
+    def __pow__(self, other: float | int) -> BigNumber:
+        if self.exponent <= 1024:
+            power = float(self) ** other
+            if power != float("inf"):
+                return BigNumber(power)
+
+        log = (log2(self.mantissa) + self.exponent) * other
+        exponent = floor(log)
+        return BigNumber(2 ** (log - exponent), exponent)
+
+    def __radd__(self, other: float | int) -> BigNumber:
+        return self + other
+
+    def __rmul__(self, other: float | int) -> BigNumber:
+        return self * other
+
+    def __round__(self, ndigits: int | None = None) -> int | BigNumber:
+        # whole past the float range, and plain ints within it like rounded floats
+        if self.exponent > 1024:
+            return self
+        if ndigits is None:
+            return round(float(self))
+        return BigNumber(round(float(self), ndigits))
+
+    def __rsub__(self, other: float | int) -> BigNumber:
+        return -self + other
+
+    def __rtruediv__(self, other: float | int) -> BigNumber:
+        mantissa, exponent = _split_number(other)
+        return BigNumber(mantissa / self.mantissa, exponent - self.exponent)
+
+    def __str__(self) -> str:
+        return format(self, "")
+
+    def __sub__(self, other: float | int | BigNumber) -> BigNumber:
+        mantissa, exponent = _split_number(other)
+        return self + BigNumber(-mantissa, exponent)
+
+    def __truediv__(self, other: float | int | BigNumber) -> BigNumber:
+        mantissa, exponent = _split_number(other)
+        return BigNumber(self.mantissa / mantissa, self.exponent - exponent)
+
+    def narrow(self) -> float | BigNumber:
+        """
+        The number as a float if it fits in one, otherwise the number itself
+        """
+
+        return float(self) if self.exponent <= 1024 else self
+
+
 @dataclass(eq=False)
 class ChallengeSetup:
     initial_consumables: list[Consumable] = field(default_factory=list)
@@ -699,6 +901,86 @@ class ChallengeSetup:
     starting_money: int = 4
 
 
+@dataclass(eq=False)
+class HandPreview:
+    poker_hand: PokerHand
+    chips: float | BigNumber
+    mult: float | BigNumber
+    score: float | BigNumber
+
+
+@dataclass(eq=False)
+class Checkpoint:
+    run: Run
+    attributes: dict[str, object]
+
+    # the original contents of every container and the fields of every Joker and
+    # Consumable (the cards and the random state are shared with the run until it
+    # changes them, so they need no copy)
+    containers: list[tuple[list | set | dict, list | set | dict]]
+    items: list[tuple[BalatroJoker | Consumable, dict[str, object]]]
+
+
+@dataclass(eq=False)
+class LegalAction:
+    action: Action
+    args: tuple = ()
+
+    # the number of cards in hand to select, passed after args
+    min_cards: int = 0
+    max_cards: int = 0
+    forced_card_index: int | None = None
+
+
+@dataclass(eq=False)
+class LegalActionMask:
+    # whether each first index is legal (index 0 for actions without one)
+    indices: list[bool]
+    # for each first index, whether each second argument is legal with it (the new
+    # index of move_joker, or not using and using the card of buy_shop_card), empty
+    # for the actions without a second argument
+    second_args: list[list[bool]]
+
+    # for each first index, the number of cards in hand to select with it
+    min_cards: list[int]
+    max_cards: list[int]
+    forced_card_index: int | None = None
+
+
+@dataclass(frozen=True, eq=False)
+class Ruleset:
+    # the challenge setup, deck and stake of a run resolved into ready-made pools
+    ante_1_tags: tuple[Tag, ...]
+    boss_blinds: tuple[Blind, ...]
+    finisher_blinds: tuple[Blind, ...]
+    # read-only, rulesets are shared between a run and its clones
+    joker_types: MappingProxyType[Rarity, tuple[type[BalatroJoker], ...]]
+    planets: tuple[tuple[int, PokerHand, Planet], ...]
+    shop_packs: tuple[tuple[Pack, ...], tuple[float, ...]]
+    spectrals: tuple[Spectral, ...]
+    tags: tuple[Tag, ...]
+    tarots: tuple[Tarot, ...]
+    vouchers: frozenset[Voucher]
+
+    allow_black_hole: bool
+    allow_buffoon_pack: bool
+    allow_the_soul: bool
+    eternal_stickers: bool
+    perishable_stickers: bool
+    rental_stickers: bool
+    small_blind_reward: bool
+
+    ante_base_chips: tuple[float | BigNumber, ...]
+    base_reroll_cost: int
+    consumable_slots: int
+    discards_per_round: int
+    hand_size: int
+    hands_per_round: int
+    joker_slots: int
+    round_goal_scale: int
+    starting_money: int
+
+
 @dataclass(eq=False)
 class ChipsScalingJoker(BalatroJoker):
     chips: int = field(default=0, init=False, repr=False)
@@ -42,7 +42,7 @@ ANTE_BASE_CHIPS = [
         1.1e249,
         2.7e268,
         4.5e288,
-        4.8e309,
+        BigNumber(48 * 10**308),
     ],
     [
         100,
@@ -84,7 +84,7 @@ ANTE_BASE_CHIPS = [
         2.2e249,
         5.5e268,
         9.0e288,
-        9.6e309,
+        BigNumber(96 * 10**308),
     ],
     [
         100,
@@ -126,9 +126,10 @@ ANTE_BASE_CHIPS = [
         4.4e249,
         1.1e269,
         1.8e289,
-        1.9e310,
+        BigNumber(19 * 10**309),
     ],
 ]
+BEST_PLAYS_CACHE_SIZE = 32
 BLIND_COLORS = {
     Blind.SMALL_BLIND: "#324ba0",
     Blind.BIG_BLIND: "#db9832",
@@ -379,6 +380,29 @@ CHALLENGE_SETUPS = {
         joker_slots=0,
     ),
 }
+CONSUMABLE_SELECTED_CARDS = {
+    Tarot.THE_MAGICIAN: (1, 2),
+    Tarot.THE_EMPRESS: (1, 2),
+    Tarot.THE_HEIROPHANT: (1, 2),
+    Tarot.THE_LOVERS: (1, 1),
+    Tarot.THE_CHARIOT: (1, 1),
+    Tarot.JUSTICE: (1, 1),
+    Tarot.STRENGTH: (1, 2),
+    Tarot.THE_HANGED_MAN: (1, 2),
+    Tarot.DEATH: (2, 2),
+    Tarot.THE_DEVIL: (1, 1),
+    Tarot.THE_TOWER: (1, 1),
+    Tarot.THE_STAR: (1, 3),
+    Tarot.THE_MOON: (1, 3),
+    Tarot.THE_SUN: (1, 3),
+    Tarot.THE_WORLD: (1, 3),
+    Spectral.TALISMAN: (1, 1),
+    Spectral.AURA: (1, 1),
+    Spectral.DEJA_VU: (1, 1),
+    Spectral.TRANCE: (1, 1),
+    Spectral.MEDIUM: (1, 1),
+    Spectral.CRYPTID: (1, 1),
+}
 EDITION_COSTS = {
     Edition.BASE: 0,
     Edition.FOIL: 2,
@@ -781,6 +805,7 @@ NON_PERISHABLE_JOKERS = {
     Obelisk,
     WeeJoker,
 }
+PREVIEW_CHANCE_BRANCHES = 64
 PROHIBITED_ANTE_1_TAGS = {
     Tag.NEGATIVE,
     Tag.STANDARD,
@@ -792,6 +817,21 @@ PROHIBITED_ANTE_1_TAGS = {
     Tag.TOP_UP,
     Tag.ORBITAL,
 }
+RANK_ORDINALS = {rank: i for i, rank in enumerate(Rank)}
+# the parts of a run that actions mark as dirty, see Run.take_dirty_sections
+RUN_SECTIONS = frozenset(
+    {
+        "consumables",
+        "deck_cards_left",
+        "hand",
+        "jokers",
+        "pack_items",
+        "poker_hand_info",
+        "shop_cards",
+        "tags",
+        "vouchers",
+    }
+)
 SHOP_BASE_CARD_WEIGHTS = {BalatroJoker: 20, Tarot: 4, Planet: 4}
 SHOP_BASE_PACK_WEIGHTS = {
     Pack.ARCANA: 4,
@@ -810,6 +850,7 @@ SHOP_BASE_PACK_WEIGHTS = {
     Pack.JUMBO_BUFFOON: 0.6,
     Pack.MEGA_BUFFOON: 0.5,
 }
+SUIT_ORDINALS = {suit: i for i, suit in enumerate(Suit)}
 TAG_PACKS = {
     Tag.BUFFOON: Pack.MEGA_BUFFOON,
     Tag.CHARM: Pack.MEGA_ARCANA,
@@ -1279,3 +1279,29 @@ class State(Enum):
     OPENING_PACK = auto()
     PLAYING_BLIND = auto()
     SELECTING_BLIND = auto()
+
+
+class ChanceMode(Enum):
+    EXPECTED = auto()
+    SAMPLED = auto()
+    WORST = auto()
+
+
+class Action(Enum):
+    BUY_SHOP_CARD = "buy_shop_card"
+    CASH_OUT = "cash_out"
+    CHOOSE_PACK_ITEM = "choose_pack_item"
+    DISCARD = "discard"
+    MOVE_JOKER = "move_joker"
+    NEXT_ROUND = "next_round"
+    OPEN_SHOP_PACK = "open_shop_pack"
+    PLAY_HAND = "play_hand"
+    REDEEM_SHOP_VOUCHER = "redeem_shop_voucher"
+    REROLL = "reroll"
+    REROLL_BOSS_BLIND = "reroll_boss_blind"
+    SELECT_BLIND = "select_blind"
+    SELL_CONSUMABLE = "sell_consumable"
+    SELL_JOKER = "sell_joker"
+    SKIP_BLIND = "skip_blind"
+    SKIP_PACK = "skip_pack"
+    USE_CONSUMABLE = "use_consumable"
@@ -1,6 +1,5 @@
 from copy import copy
 from dataclasses import dataclass, field
-import random as r
 
 from .classes import *
 from .enums import *
@@ -87,12 +86,13 @@ class ToDoList(DynamicJoker):
     Earn $4 if poker hand is a [poker hand], poker hand changes at end of round
     """
 
-    poker_hand: PokerHand = field(
-        default_factory=lambda: r.choice(list(PokerHand)[3:]), init=False, repr=False
-    )
+    poker_hand: PokerHand | None = field(default=None, init=False, repr=False)
+
+    def _created_action(self) -> None:
+        self.poker_hand = self._run._random.choice(list(PokerHand)[3:])
 
     def _change_state(self) -> None:
-        self.poker_hand = r.choice(self._run._unlocked_poker_hands)
+        self.poker_hand = self._run._random.choice(self._run._unlocked_poker_hands)
 
     def _hand_played_ability(
         self,
@@ -120,6 +120,7 @@ class MidasMask(BalatroJoker):
             scored_card = played_cards[i]
             if self._run._is_face_card(scored_card):
                 scored_card.enhancement = Enhancement.GOLD
+                self._run._deck_counts_cache = None
 
 
 # ---- /on-played ---- #
@@ -440,7 +441,9 @@ class AncientJoker(DynamicJoker):
             self._run._mult *= 1.5
 
     def _change_state(self) -> None:
-        self.suit = r.choice([suit for suit in Suit if suit is not self.suit])
+        self.suit = self._run._random.choice(
+            [suit for suit in Suit if suit is not self.suit]
+        )
 
 
 @dataclass(eq=False)
@@ -656,7 +659,7 @@ class TheIdol(DynamicJoker):
             if not deck_card.is_stone_card
         ]
         if valid_deck_cards:
-            random_deck_card = r.choice(valid_deck_cards)
+            random_deck_card = self._run._random.choice(valid_deck_cards)
             self.card = Card(random_deck_card.rank, random_deck_card.suit)
         else:
             self.card = Card(Rank.ACE, Suit.SPADES)
@@ -1050,7 +1053,7 @@ class Misprint(BalatroJoker):
         scored_card_indices: list[int],
         poker_hands_played: list[PokerHand],
     ) -> None:
-        self._run._mult += r.randint(0, 23)
+        self._run._mult += self._run._random.randint(0, 23)
 
 
 @dataclass(eq=False)
@@ -1066,11 +1069,7 @@ class SteelJoker(BalatroJoker):
         poker_hands_played: list[PokerHand],
     ) -> None:
         self._run._mult *= 1.0 + (
-            0.2
-            * sum(
-                deck_card.enhancement is Enhancement.STEEL
-                for deck_card in self._run._deck_cards
-            )
+            0.2 * self._run._deck_counts["enhancements"][Enhancement.STEEL]
         )
 
 
@@ -1273,7 +1272,7 @@ class Madness(XMultScalingJoker):
                 if joker is not self and not joker.is_eternal
             ]
             if valid_destroys:
-                self._run._destroy_joker(r.choice(valid_destroys))
+                self._run._destroy_joker(self._run._random.choice(valid_destroys))
 
 
 @dataclass(eq=False)
@@ -1379,8 +1378,8 @@ class StoneJoker(BalatroJoker):
         scored_card_indices: list[int],
         poker_hands_played: list[PokerHand],
     ) -> None:
-        self._run._chips += 25 * sum(
-            deck_card.is_stone_card for deck_card in self._run._deck_cards
+        self._run._chips += (
+            25 * self._run._deck_counts["enhancements"][Enhancement.STONE]
         )
 
 
@@ -1681,9 +1680,7 @@ class DriversLicense(BalatroJoker):
         poker_hands_played: list[PokerHand],
     ) -> None:
         if (
-            sum(
-                deck_card.enhancement is not None for deck_card in self._run._deck_cards
-            )
+            len(self._run._deck_cards) - self._run._deck_counts["enhancements"][None]
             >= 16
         ):
             self._run._mult *= 3
@@ -1808,6 +1805,7 @@ class Vampire(XMultScalingJoker):
             if scored_card.enhancement is not None:
                 self.xmult += 0.1
                 scored_card.enhancement = None
+                self._run._deck_counts_cache = None
 
 
 @dataclass(eq=False)
@@ -1885,7 +1883,9 @@ class Castle(ChipsScalingJoker, DynamicJoker):
             for deck_card in self._run._deck_cards
             if not deck_card.is_stone_card
         ]
-        self.suit = r.choice(valid_suits) if valid_suits else Suit.SPADES
+        self.suit = (
+            self._run._random.choice(valid_suits) if valid_suits else Suit.SPADES
+        )
 
     def _discard_action(self, discarded_cards: list[Card]) -> None:
         self.chips += 3 * sum(
@@ -1993,7 +1993,7 @@ class MailInRebate(DynamicJoker):
             for deck_card in self._run._deck_cards
             if not deck_card.is_stone_card
         ]
-        self.rank = r.choice(valid_ranks) if valid_ranks else Rank.ACE
+        self.rank = self._run._random.choice(valid_ranks) if valid_ranks else Rank.ACE
 
     def _discard_ability(self, discarded_cards: list[Card]) -> None:
         self._run._money += 5 * discarded_cards.count(self.rank)
@@ -2162,7 +2162,7 @@ class CloudNine(BalatroJoker):
     """
 
     def _round_ended_money(self) -> int:
-        return self._run._deck_cards.count(Rank.NINE)
+        return self._run._deck_counts["ranks"][Rank.NINE]
 
 
 @dataclass(eq=False)
@@ -2213,6 +2213,7 @@ class TurtleBean(BalatroJoker):
 
     def _round_ended_action(self) -> None:
         self.hand_size_increase -= 1
+        self._run._stats_cache = None
         if self.hand_size_increase == 0:
             self._run._destroy_joker(self)
 
@@ -2296,7 +2297,7 @@ class Certificate(BalatroJoker):
 
     def _blind_selected_ability(self) -> None:
         added_card = self._run._get_random_card()
-        added_card.seal = r.choice(list(Seal))
+        added_card.seal = self._run._random.choice(list(Seal))
         self._run._add_card(added_card, draw_to_hand=True)
 
 
@@ -2344,7 +2345,7 @@ class InvisibleJoker(BalatroJoker):
 
     def _sold_action(self) -> None:
         if self.rounds_remaining == 0 and len(self._run._jokers) > 1:
-            duplicated_joker = copy(r.choice(self._run._jokers))
+            duplicated_joker = copy(self._run._random.choice(self._run._jokers))
 
             if duplicated_joker.edition is Edition.NEGATIVE:
                 duplicated_joker.edition = Edition.BASE
@@ -2400,7 +2401,7 @@ class Perkeo(BalatroJoker):
     """
 
     def _shop_exited_ability(self) -> None:
-        copied_consumable = copy(r.choice(self._run._consumables))
+        copied_consumable = copy(self._run._random.choice(self._run._consumables))
         copied_consumable.is_negative = True
         self._run._consumables.append(copied_consumable)
 
@@ -0,0 +1,218 @@
+from __future__ import annotations
+from itertools import combinations
+
+from .classes import *
+from .enums import *
+
+# ranks are bit positions, TWO = 0 through ACE = 12
+_RANK_BITS = {rank: 14 - i - 2 for i, rank in enumerate(Rank)}
+_ACE_BIT = _RANK_BITS[Rank.ACE]
+
+_SUIT_BITS = {suit: 1 << i for i, suit in enumerate(Suit)}
+_WILD_SUITS = 0b1111
+_SMEARED_SUITS = {
+    suit: (
+        _SUIT_BITS[Suit.HEARTS] | _SUIT_BITS[Suit.DIAMONDS]
+        if suit in (Suit.HEARTS, Suit.DIAMONDS)
+        else _SUIT_BITS[Suit.SPADES] | _SUIT_BITS[Suit.CLUBS]
+    )
+    for suit in Suit
+}
+_SUIT_MASK_BITS = tuple(
+    tuple(bit for bit in range(4) if suit_mask >> bit & 1) for suit_mask in range(16)
+)
+
+
+def _find_straight(rank_mask: int, straight_len: int, max_straight_gap: int) -> int:
+    ranks = [bit for bit in range(13) if rank_mask >> bit & 1]
+
+    # the first of the longest runs of ranks wins
+    longest_straight, cur_straight = [], []
+    for i, rank in enumerate(ranks):
+        cur_straight.append(rank)
+        if len(cur_straight) > len(longest_straight):
+            longest_straight = cur_straight
+        if i < len(ranks) - 1 and ranks[i + 1] - rank > max_straight_gap:
+            cur_straight = []
+
+    straight_mask = sum(1 << rank for rank in longest_straight)
+    if longest_straight[0] <= max_straight_gap - 1 and rank_mask >> _ACE_BIT & 1:
+        straight_mask |= 1 << _ACE_BIT
+
+    return straight_mask if straight_mask.bit_count() >= straight_len else 0
+
+
+def _find_rank_patterns(
+    rank_counts: tuple[int, ...],
+) -> list[tuple[PokerHand, bool, tuple[tuple[int, int], ...] | None]]:
+    # mirrors the rank-matching rules on rank groups instead of ranks, every entry is
+    # (poker hand, whether it needs a flush, (group, count) slices or None for all 5)
+    patterns = {}
+    for group, n in enumerate(rank_counts):
+        if n == 5:
+            patterns[PokerHand.FIVE_OF_A_KIND] = (False, None)
+            patterns[PokerHand.FLUSH_FIVE] = (True, None)
+        if n >= 4:
+            patterns[PokerHand.FOUR_OF_A_KIND] = (False, ((group, 4),))
+        if n >= 3:
+            patterns[PokerHand.THREE_OF_A_KIND] = (False, ((group, 3),))
+        if n >= 2:
+            if (
+                PokerHand.THREE_OF_A_KIND in patterns
+                and patterns[PokerHand.THREE_OF_A_KIND][1][0][0] != group
+            ):
+                patterns[PokerHand.FULL_HOUSE] = (False, None)
+                patterns[PokerHand.FLUSH_HOUSE] = (True, None)
+            if PokerHand.PAIR in patterns:
+                patterns[PokerHand.TWO_PAIR] = (
+                    False,
+                    patterns[PokerHand.PAIR][1] + ((group, 2),),
+                )
+            patterns[PokerHand.PAIR] = (False, ((group, 2),))
+
+    return [
+        (poker_hand, needs_flush, slices)
+        for poker_hand, (needs_flush, slices) in patterns.items()
+    ]
+
+
+def _rank_count_signatures(num_cards: int) -> list[tuple[int, ...]]:
+    if num_cards == 0:
+        return [()]
+    return [
+        (first, *rest)
+        for first in range(num_cards, 0, -1)
+        for rest in _rank_count_signatures(num_cards - first)
+        if not rest or rest[0] <= first
+    ]
+
+
+# keyed by (rank mask, four fingers, shortcut), only masks that a played hand of
+# up to 5 cards can reach are tabulated
+STRAIGHT_TABLE: dict[tuple[int, bool, bool], int] = {
+    (sum(1 << rank for rank in ranks), four_fingers, shortcut): _find_straight(
+        sum(1 << rank for rank in ranks), 4 if four_fingers else 5, 2 if shortcut else 1
+    )
+    for num_ranks in (4, 5)
+    for ranks in combinations(range(13), num_ranks)
+    for four_fingers in (False, True)
+    for shortcut in (False, True)
+}
+
+# keyed by the rank counts in most-common order, e.g. (3, 2) for a full house
+RANK_PATTERN_TABLE: dict[
+    tuple[int, ...], list[tuple[PokerHand, bool, tuple[tuple[int, int], ...] | None]]
+] = {
+    rank_counts: _find_rank_patterns(rank_counts)
+    for num_cards in range(6)
+    for rank_counts in _rank_count_signatures(num_cards)
+}
+
+
+def get_poker_hands(
+    played_cards: list[Card],
+    four_fingers: bool = False,
+    shortcut: bool = False,
+    smeared: bool = False,
+) -> dict[PokerHand, list[int]]:
+    """
+    Find every poker hand contained in the played cards, with the indices of the cards that make it up
+
+    Args:
+        played_cards (list[Card]): The played cards
+        four_fingers (bool, optional): Whether flushes and straights can be made with 4 cards
+        shortcut (bool, optional): Whether straights can skip a rank
+        smeared (bool, optional): Whether suits of the same color count as the same suit
+    """
+
+    poker_hands = {}
+    straight_len = 4 if four_fingers else 5
+
+    card_ranks = []
+    rank_indices = {}
+    rank_counts = {}
+    suit_counts = [0, 0, 0, 0]
+    suit_masks = []
+    suit_order = []
+    for i, card in enumerate(played_cards):
+        rank = _RANK_BITS[card.rank]
+        card_ranks.append(rank)
+        if rank in rank_indices:
+            rank_indices[rank].append(i)
+        else:
+            rank_indices[rank] = [i]
+
+        if card.enhancement is Enhancement.STONE:
+            suit_masks.append(0)
+            continue
+
+        rank_counts[rank] = rank_counts.get(rank, 0) + 1
+
+        if card.enhancement is Enhancement.WILD and not card.is_debuffed:
+            suit_mask = _WILD_SUITS
+        elif smeared:
+            suit_mask = _SMEARED_SUITS[card.suit]
+        else:
+            suit_mask = _SUIT_BITS[card.suit]
+        suit_masks.append(suit_mask)
+        for bit in _SUIT_MASK_BITS[suit_mask]:
+            if not suit_counts[bit]:
+                suit_order.append(bit)
+            suit_counts[bit] += 1
+
+    # flush check, ties go to the suit that appeared first
+    flush_bit = None
+    for bit in suit_order:
+        if flush_bit is None or suit_counts[bit] > suit_counts[flush_bit]:
+            flush_bit = bit
+    if flush_bit is not None and suit_counts[flush_bit] >= straight_len:  # flush
+        poker_hands[PokerHand.FLUSH] = [
+            i for i, suit_mask in enumerate(suit_masks) if suit_mask >> flush_bit & 1
+        ]
+
+    # straight check
+    if len(rank_counts) >= straight_len:
+        rank_mask = sum(1 << rank for rank in rank_counts)
+        key = (rank_mask, four_fingers, shortcut)
+        if key not in STRAIGHT_TABLE:
+            STRAIGHT_TABLE[key] = _find_straight(
+                rank_mask, straight_len, 2 if shortcut else 1
+            )
+        straight_mask = STRAIGHT_TABLE[key]
+
+        if straight_mask:  # straight
+            straight_indices = [
+                i for i, rank in enumerate(card_ranks) if straight_mask >> rank & 1
+            ]
+            if PokerHand.FLUSH in poker_hands:  # straight flush
+                poker_hands[PokerHand.STRAIGHT_FLUSH] = straight_indices
+            poker_hands[PokerHand.STRAIGHT] = straight_indices
+
+    # rank-matching checks, groups of equal count keep their order of appearance
+    rank_groups = sorted(rank_counts, key=rank_counts.__getitem__, reverse=True)
+    signature = tuple(rank_counts[rank] for rank in rank_groups)
+    if signature not in RANK_PATTERN_TABLE:
+        RANK_PATTERN_TABLE[signature] = _find_rank_patterns(signature)
+
+    is_flush = PokerHand.FLUSH in poker_hands
+    for poker_hand, needs_flush, slices in RANK_PATTERN_TABLE[signature]:
+        if needs_flush and not is_flush:
+            continue
+        if slices is None:
+            poker_hands[poker_hand] = list(range(5))
+        elif len(slices) == 1:
+            group, n = slices[0]
+            poker_hands[poker_hand] = rank_indices[rank_groups[group]][:n]
+        else:
+            poker_hands[poker_hand] = [
+                i for group, n in slices for i in rank_indices[rank_groups[group]][:n]
+            ]
+
+    # high card
+    if not rank_counts:
+        # (all stone cards - default to high card)
+        poker_hands[PokerHand.HIGH_CARD] = []
+    else:
+        poker_hands[PokerHand.HIGH_CARD] = rank_indices[max(rank_counts)][:1]
+
+    return poker_hands
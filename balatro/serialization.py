@@ -0,0 +1,504 @@
+from __future__ import annotations
+from dataclasses import fields
+from enum import Enum
+import random as r
+import struct
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from balatro import Run
+
+from . import jokers
+from .classes import *
+from .enums import *
+
+MAGIC = b"BLTR"
+VERSION = 2
+
+(
+    _NONE,
+    _FALSE,
+    _TRUE,
+    _INT8,
+    _INT32,
+    _BIG_INT,
+    _FLOAT,
+    _STR,
+    _ENUM,
+    _TYPE,
+    _LIST,
+    _TUPLE,
+    _SET,
+    _DICT,
+    _CARD,
+    _CARDS,
+    _OBJECT,
+    _REF,
+    _RUN,
+    _ENUM_LIST,
+    _INT_LIST,
+    _REF_LIST,
+    _BIG_NUMBER,
+) = range(23)
+
+_RUN_ATTRIBUTES = (
+    "_challenge",
+    "_deck",
+    "_stake",
+    "_money",
+    "_ante",
+    "_round",
+    "_poker_hand_info",
+    "_vouchers",
+    "_tags",
+    "_deck_cards",
+    "_jokers",
+    "_consumables",
+    "_num_played_hands",
+    "_first_hand",
+    "_first_discard",
+    "_round_poker_hands",
+    "_num_unused_discards",
+    "_num_blinds_skipped",
+    "_round_score",
+    "_round_goal",
+    "_chips",
+    "_mult",
+    "_hands",
+    "_discards",
+    "_hand",
+    "_deck_cards_left",
+    "_reroll_cost",
+    "_chaos_used",
+    "_shop_cards",
+    "_shop_packs",
+    "_opened_pack",
+    "_pack_items",
+    "_pack_choices_left",
+    "_unique_planet_cards_used",
+    "_boss_blind_pool",
+    "_finisher_blind_pool",
+    "_num_tarot_cards_used",
+    "_fool_next",
+    "_hand_size_penalty",
+    "_num_ectoplasms_used",
+    "_gros_michel_extinct",
+    "_boss_blind_disabled",
+    "_forced_selected_card_index",
+    "_ox_poker_hand",
+    "_cash_out",
+    "_inflation_amount",
+    "_ante_tags",
+    "_boss_blind",
+    "_shop_vouchers",
+    "_rerolled_boss_blind",
+    "_cards_played_ante",
+    "_blind",
+    "_state",
+    "_big_numbers",
+)
+_RUN_ATTRIBUTE_INDICES = {name: i for i, name in enumerate(_RUN_ATTRIBUTES)}
+
+# stored separately or rebuilt by the run after loading
+_SKIPPED_RUN_ATTRIBUTES = {
+    "_random",
+    "_joker_hooks",
+    "_joker_types",
+    "_stats_cache",
+    "_deck_counts_cache",
+    "_samplers_cache",
+    "_best_plays_cache",
+    "_ruleset",
+    "_copy_targets_cache",
+    "_dirty_sections",
+    "_is_shared",
+}
+
+_ENUMS = (
+    JokerType,
+    Voucher,
+    Tarot,
+    Planet,
+    Spectral,
+    Edition,
+    Enhancement,
+    Stake,
+    Tag,
+    Blind,
+    Deck,
+    Seal,
+    Pack,
+    Suit,
+    Rank,
+    PokerHand,
+    Rarity,
+    Challenge,
+    State,
+)
+_ENUM_INDICES = {enum: i for i, enum in enumerate(_ENUMS)}
+_ENUM_MEMBERS = tuple(tuple(enum) for enum in _ENUMS)
+_ENUM_MEMBER_INDICES = {
+    member: i for members in _ENUM_MEMBERS for i, member in enumerate(members)
+}
+
+_TYPES = (
+    Card,
+    Consumable,
+    BalatroJoker,
+    Tarot,
+    Planet,
+    Spectral,
+    *(getattr(jokers, joker_type.name) for joker_type in JokerType),
+)
+_TYPE_INDICES = {type_: i for i, type_ in enumerate(_TYPES)}
+_TYPE_FIELDS = {
+    type_: tuple(field.name for field in fields(type_))
+    for type_ in _TYPES
+    if issubclass(type_, (Consumable, BalatroJoker))
+}
+
+_RANKS = tuple(Rank)
+_SUITS = tuple(Suit)
+_ENHANCEMENTS = (None, *Enhancement)
+_SEALS = (None, *Seal)
+_EDITIONS = tuple(Edition)
+_RANK_INDICES = {rank: i for i, rank in enumerate(_RANKS)}
+_SUIT_INDICES = {suit: i for i, suit in enumerate(_SUITS)}
+_ENHANCEMENT_INDICES = {enhancement: i for i, enhancement in enumerate(_ENHANCEMENTS)}
+_SEAL_INDICES = {seal: i for i, seal in enumerate(_SEALS)}
+_EDITION_INDICES = {edition: i for i, edition in enumerate(_EDITIONS)}
+
+_HEADER = struct.Struct("<4sBBB")
+_CARD_STRUCT = struct.Struct("<Ii")
+_RANDOM_STATE = struct.Struct("<625I")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_I8 = struct.Struct("<b")
+_I32 = struct.Struct("<i")
+_F64 = struct.Struct("<d")
+_BIG_NUMBER_STRUCT = struct.Struct("<di")
+
+
+def _pack_card(card: Card) -> bytes:
+    return _CARD_STRUCT.pack(
+        _RANK_INDICES[card.rank]
+        | _SUIT_INDICES[card.suit] << 4
+        | _ENHANCEMENT_INDICES[card.enhancement] << 6
+        | _SEAL_INDICES[card.seal] << 10
+        | _EDITION_INDICES[card.edition] << 13
+        | card.is_debuffed << 16
+        | card.is_face_down << 17,
+        card.extra_chips,
+    )
+
+
+def _unpack_card(packed: int, extra_chips: int) -> Card:
+    card = object.__new__(Card)
+    card.rank = _RANKS[packed & 0xF]
+    card.suit = _SUITS[packed >> 4 & 0x3]
+    card.enhancement = _ENHANCEMENTS[packed >> 6 & 0xF]
+    card.seal = _SEALS[packed >> 10 & 0x7]
+    card.edition = _EDITIONS[packed >> 13 & 0x7]
+    card.extra_chips = extra_chips
+    card.is_debuffed = packed >> 16 & 1 == 1
+    card.is_face_down = packed >> 17 & 1 == 1
+    return card
+
+
+class _Writer:
+    def __init__(self, run: Run) -> None:
+        self.run = run
+        self.out = bytearray()
+        self.objects: dict[int, int] = {}
+
+    def write(self, value: object) -> None:
+        out = self.out
+
+        if value is None:
+            out.append(_NONE)
+        elif value is False:
+            out.append(_FALSE)
+        elif value is True:
+            out.append(_TRUE)
+        elif type(value) is int:
+            if -0x80 <= value < 0x80:
+                out.append(_INT8)
+                out += _I8.pack(value)
+            elif -0x80000000 <= value < 0x80000000:
+                out.append(_INT32)
+                out += _I32.pack(value)
+            else:
+                encoded = str(value).encode()
+                out.append(_BIG_INT)
+                out += _U8.pack(len(encoded))
+                out += encoded
+        elif type(value) is float:
+            out.append(_FLOAT)
+            out += _F64.pack(value)
+        elif type(value) is BigNumber:
+            out.append(_BIG_NUMBER)
+            out += _BIG_NUMBER_STRUCT.pack(value.mantissa, value.exponent)
+        elif isinstance(value, Enum):
+            out.append(_ENUM)
+            out.append(_ENUM_INDICES[type(value)])
+            out.append(_ENUM_MEMBER_INDICES[value])
+        elif isinstance(value, type):
+            out.append(_TYPE)
+            out += _U16.pack(_TYPE_INDICES[value])
+        elif type(value) is str:
+            encoded = value.encode()
+            out.append(_STR)
+            out += _U16.pack(len(encoded))
+            out += encoded
+        elif (
+            type(value) is list
+            and value
+            and all(isinstance(item, type(value[0])) for item in value)
+            and isinstance(value[0], Enum)
+        ):
+            out.append(_ENUM_LIST)
+            out.append(_ENUM_INDICES[type(value[0])])
+            out += _U16.pack(len(value))
+            out += bytes(_ENUM_MEMBER_INDICES[item] for item in value)
+        elif (
+            type(value) is list
+            and value
+            and all(
+                type(item) is int and -0x80000000 <= item < 0x80000000 for item in value
+            )
+        ):
+            out.append(_INT_LIST)
+            out += _U16.pack(len(value))
+            out += struct.pack(f"<{len(value)}i", *value)
+        elif (
+            type(value) is list
+            and value
+            and all(
+                type(item) is Card and id(item) not in self.objects for item in value
+            )
+        ):
+            out.append(_CARDS)
+            out += _U16.pack(len(value))
+            for card in value:
+                self.objects[id(card)] = len(self.objects)
+                out += _pack_card(card)
+        elif (
+            type(value) is list
+            and value
+            and all(id(item) in self.objects for item in value)
+        ):
+            out.append(_REF_LIST)
+            out += _U16.pack(len(value))
+            out += struct.pack(
+                f"<{len(value)}H", *(self.objects[id(item)] for item in value)
+            )
+        elif type(value) in (list, tuple, set):
+            out.append(
+                _LIST
+                if type(value) is list
+                else _TUPLE if type(value) is tuple else _SET
+            )
+            out += _U16.pack(len(value))
+            # set members are written in a canonical order, so equal runs serialize
+            # to equal bytes whatever order their sets iterate in
+            for item in (
+                sorted(value, key=self.set_order) if type(value) is set else value
+            ):
+                self.write(item)
+        elif type(value) is dict:
+            out.append(_DICT)
+            out += _U16.pack(len(value))
+            for key, item in value.items():
+                self.write(key)
+                self.write(item)
+        elif value is self.run:
+            out.append(_RUN)
+        elif id(value) in self.objects:
+            out.append(_REF)
+            out += _U16.pack(self.objects[id(value)])
+        elif type(value) is Card:
+            self.objects[id(value)] = len(self.objects)
+            out.append(_CARD)
+            out += _pack_card(value)
+        elif type(value) in _TYPE_FIELDS:
+            self.objects[id(value)] = len(self.objects)
+            out.append(_OBJECT)
+            out += _U16.pack(_TYPE_INDICES[type(value)])
+            for name in _TYPE_FIELDS[type(value)]:
+                self.write(getattr(value, name))
+        else:
+            raise TypeError(f"Cannot serialize {value!r}")
+
+    def set_order(self, item: object) -> tuple:
+        # objects already written sort by their index, new cards and objects by their
+        # packed contents, and plain values by their kind and value
+        if id(item) in self.objects:
+            return (0, self.objects[id(item)])
+        if type(item) is Card:
+            return (1, _pack_card(item))
+        if isinstance(item, Enum):
+            return (2, _ENUM_INDICES[type(item)], _ENUM_MEMBER_INDICES[item])
+        if isinstance(item, type):
+            return (3, _TYPE_INDICES[item])
+        return (4, type(item).__name__, repr(item))
+
+
+class _Reader:
+    def __init__(self, data: bytes, run: Run) -> None:
+        self.run = run
+        self.data = data
+        self.pos = _HEADER.size
+        self.objects: list[object] = []
+
+    def read(self) -> object:
+        data = self.data
+        tag = data[self.pos]
+        self.pos += 1
+
+        if tag == _ENUM:
+            value = _ENUM_MEMBERS[data[self.pos]][data[self.pos + 1]]
+            self.pos += 2
+            return value
+        if tag == _INT8:
+            value = _I8.unpack_from(data, self.pos)[0]
+            self.pos += 1
+            return value
+        if tag == _INT_LIST:
+            length = _U16.unpack_from(data, self.pos)[0]
+            value = list(struct.unpack_from(f"<{length}i", data, self.pos + 2))
+            self.pos += 2 + 4 * length
+            return value
+        if tag == _ENUM_LIST:
+            members = _ENUM_MEMBERS[data[self.pos]]
+            length = _U16.unpack_from(data, self.pos + 1)[0]
+            start = self.pos + 3
+            self.pos = start + length
+            return [members[i] for i in data[start : self.pos]]
+        if tag == _REF_LIST:
+            length = _U16.unpack_from(data, self.pos)[0]
+            indices = struct.unpack_from(f"<{length}H", data, self.pos + 2)
+            self.pos += 2 + 2 * length
+            objects = self.objects
+            return [objects[i] for i in indices]
+        if tag == _NONE:
+            return None
+        if tag == _FALSE:
+            return False
+        if tag == _TRUE:
+            return True
+        if tag == _REF:
+            value = self.objects[_U16.unpack_from(data, self.pos)[0]]
+            self.pos += 2
+            return value
+        if tag == _LIST or tag == _TUPLE or tag == _SET:
+            length = _U16.unpack_from(data, self.pos)[0]
+            self.pos += 2
+            items = [self.read() for _ in range(length)]
+            if tag == _LIST:
+                return items
+            return tuple(items) if tag == _TUPLE else set(items)
+        if tag == _DICT:
+            length = _U16.unpack_from(data, self.pos)[0]
+            self.pos += 2
+            return {self.read(): self.read() for _ in range(length)}
+        if tag == _INT32:
+            value = _I32.unpack_from(data, self.pos)[0]
+            self.pos += 4
+            return value
+        if tag == _FLOAT:
+            value = _F64.unpack_from(data, self.pos)[0]
+            self.pos += 8
+            return value
+        if tag == _CARDS:
+            length = _U16.unpack_from(data, self.pos)[0]
+            start = self.pos + 2
+            self.pos = start + length * _CARD_STRUCT.size
+            cards = [
+                _unpack_card(*packed)
+                for packed in _CARD_STRUCT.iter_unpack(data[start : self.pos])
+            ]
+            self.objects.extend(cards)
+            return cards
+        if tag == _CARD:
+            card = _unpack_card(*_CARD_STRUCT.unpack_from(data, self.pos))
+            self.pos += _CARD_STRUCT.size
+            self.objects.append(card)
+            return card
+        if tag == _OBJECT:
+            object_type = _TYPES[_U16.unpack_from(data, self.pos)[0]]
+            self.pos += 2
+            obj = object.__new__(object_type)
+            self.objects.append(obj)
+            for name in _TYPE_FIELDS[object_type]:
+                setattr(obj, name, self.read())
+            return obj
+        if tag == _RUN:
+            return self.run
+        if tag == _TYPE:
+            value = _TYPES[_U16.unpack_from(data, self.pos)[0]]
+            self.pos += 2
+            return value
+        if tag == _BIG_NUMBER:
+            value = BigNumber(*_BIG_NUMBER_STRUCT.unpack_from(data, self.pos))
+            self.pos += _BIG_NUMBER_STRUCT.size
+            return value
+        if tag == _BIG_INT:
+            length = data[self.pos]
+            value = int(data[self.pos + 1 : self.pos + 1 + length])
+            self.pos += 1 + length
+            return value
+        if tag == _STR:
+            length = _U16.unpack_from(data, self.pos)[0]
+            value = bytes(data[self.pos + 2 : self.pos + 2 + length]).decode()
+            self.pos += 2 + length
+            return value
+
+        raise ValueError(f"Unknown tag {tag} at offset {self.pos - 1}")
+
+
+def dump_run(run: Run) -> bytes:
+    writer = _Writer(run)
+    attributes = [
+        (name, value)
+        for name, value in vars(run).items()
+        if name not in _SKIPPED_RUN_ATTRIBUTES
+    ]
+    writer.out += _HEADER.pack(
+        MAGIC, VERSION, hasattr(run, "_challenge"), len(attributes)
+    )
+
+    for name, value in attributes:
+        writer.out.append(_RUN_ATTRIBUTE_INDICES[name])
+        writer.write(value)
+
+    _, state, gauss_next = run._random.getstate()
+    writer.out += _RANDOM_STATE.pack(*state)
+    writer.write(gauss_next)
+
+    return bytes(writer.out)
+
+
+def load_run(data: bytes, run_type: type[Run], challenge_run_type: type[Run]) -> Run:
+    magic, version, is_challenge, num_attributes = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Data is not a serialized run")
+    if version != VERSION:
+        raise ValueError(f"Expected serialization version {VERSION}, got {version}")
+
+    run = object.__new__(challenge_run_type if is_challenge else run_type)
+    reader = _Reader(data, run)
+
+    state = {}
+    for _ in range(num_attributes):
+        name = _RUN_ATTRIBUTES[data[reader.pos]]
+        reader.pos += 1
+        state[name] = reader.read()
+
+    random_state = _RANDOM_STATE.unpack_from(data, reader.pos)
+    reader.pos += _RANDOM_STATE.size
+    run._random = r.Random.__new__(r.Random)
+    run._random.setstate((3, random_state, reader.read()))
+
+    run.__dict__.update(state)
+
+    return run